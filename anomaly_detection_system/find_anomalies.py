@@ -1,11 +1,19 @@
 """Find events that should be flagged as anomalies based on physics rules"""
-import pandas as pd
+import os
+import sys
 
-# Load dataset
-df = pd.read_csv('../dataset/dark_matter_synthetic_dataset.csv')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_io
 
-# Filter to valid S2/S1 events
-df_valid = df[df['s2_over_s1_ratio'].notna()].copy()
+# Load only the columns used below, keeping events with valid S2/S1
+dataset_path = dataset_io.find_dataset('../dataset')
+if dataset_path is None:
+    sys.exit("Dataset not found in ../dataset - run main.py first")
+df_valid = dataset_io.load_dataset(
+    dataset_path,
+    columns=['event_id', 'label', 'recoil_energy_keV', 's2_over_s1_ratio', 'drift_time_us'],
+    filters=[('s2_over_s1_ratio', 'notna')],
+)
 
 print("="*80)
 print("SEARCHING FOR PHYSICS ANOMALIES IN DATASET")
@@ -39,8 +47,8 @@ if len(extreme_energy_high) > 0:
     print("\nHIGH ENERGY EVENTS (first 5):")
     print("-"*80)
     sample = extreme_energy_high.head(5)
-    for idx, event in sample.iterrows():
-        print(f"Event {idx}:")
+    for _, event in sample.iterrows():
+        print(f"Event {event['event_id']}:")
         print(f"  Energy: {event['recoil_energy_keV']:.2f} keV")
         print(f"  S2/S1:  {event['s2_over_s1_ratio']:.2f}")
         print(f"  Label:  {event.get('label', 'Unknown')}")
@@ -51,8 +59,8 @@ if len(extreme_s2s1_low) > 0:
     print("LOW S2/S1 EVENTS (first 5):")
     print("-"*80)
     sample = extreme_s2s1_low.head(5)
-    for idx, event in sample.iterrows():
-        print(f"Event {idx}:")
+    for _, event in sample.iterrows():
+        print(f"Event {event['event_id']}:")
         print(f"  Energy: {event['recoil_energy_keV']:.2f} keV")
         print(f"  S2/S1:  {event['s2_over_s1_ratio']:.2f}")
         print(f"  Label:  {event.get('label', 'Unknown')}")
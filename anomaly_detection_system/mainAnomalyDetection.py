@@ -13,9 +13,14 @@ from pathlib import Path
 from typing import Any, Dict, List
 
 import pandas as pd
-import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import dataset_io
+import detector_response
+import llm_cache
+import llm_gateway
+
 # Load environment variables
 load_dotenv(Path('../.env'))
 
@@ -32,11 +37,10 @@ if not API_KEY or API_KEY == "API KEY HERE":
     print("\n" + "="*80 + "\n")
     sys.exit(1)
 
-API_URL = "https://api.anthropic.com/v1/messages"
-MODEL_NAME = "claude-3-haiku-20240307"  # Verified working model
+PROMPT_VERSION = 1  # Bump when the prompt changes so cached responses are not reused
 
 # Paths
-CSV_PATH = Path('../dataset/dark_matter_synthetic_dataset.csv')
+DATASET_DIR = Path('../dataset')
 RESULTS_DIR = Path('results')
 ANOMALY_REPORTS_DIR = Path('anomaly_reports')
 
@@ -48,13 +52,19 @@ ANOMALY_REPORTS_DIR.mkdir(exist_ok=True)
 def classify_event_with_claude(event_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Classify a single event using Claude API
-    Returns classification and confidence
+    Returns classification and confidence (cached on disk per event features)
     """
+    cache_key, cached = llm_cache.lookup('anomaly_classification', llm_gateway.gateway().model, PROMPT_VERSION, event_data)
+    if cached is not None:
+        return cached
+
     # Extract data with correct column names
     energy = event_data.get('recoil_energy_keV', 'N/A')
     s2_s1 = event_data.get('s2_over_s1_ratio', 'N/A')
     s1_area = event_data.get('s1_area_PE', 'N/A')
     s2_area = event_data.get('s2_area_PE', 'N/A')
+    cs1 = event_data.get('cs1_PE', 'N/A')
+    cs2 = event_data.get('cs2_PE', 'N/A')
     pos_x = event_data.get('position_x_mm', 'N/A')
     pos_y = event_data.get('position_y_mm', 'N/A')
     drift = event_data.get('drift_time_us', 'N/A')
@@ -67,6 +77,7 @@ Event Data:
 - S2/S1 Ratio: {s2_s1}
 - S1 Signal: {s1_area} PE
 - S2 Signal: {s2_area} PE
+- Position-corrected S1 / S2: {cs1} / {cs2} PE
 - Position: ({pos_x}, {pos_y}) mm
 - Drift Time: {drift} μs
 - S1 Pulse Width: {s1_width} ns
@@ -86,26 +97,13 @@ Respond in JSON format:
 {{"classification": "...", "confidence": 0.0, "reasoning": "..."}}"""
 
     try:
-        headers = {
-            "x-api-key": API_KEY,
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
-        }
-        
-        data = {
-            "model": MODEL_NAME,
-            "max_tokens": 500,
-            "messages": [{
-                "role": "user",
-                "content": prompt
-            }]
-        }
-        
-        response = requests.post(API_URL, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        content = result['content'][0]['text']
+        # Pooled connection, throttled to the account's rate limits; 429/529 responses are retried
+        message = llm_gateway.gateway().create_message(
+            max_tokens=500,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=30
+        )
+        content = llm_gateway.message_text(message)
         
         # Extract JSON from response
         if '{' in content and '}' in content:
@@ -113,6 +111,7 @@ Respond in JSON format:
             end = content.rindex('}') + 1
             json_str = content[start:end]
             analysis = json.loads(json_str)
+            llm_cache.store(cache_key, analysis, 'anomaly_classification')
             return analysis
         else:
             return {
@@ -130,6 +129,22 @@ Respond in JSON format:
         }
 
 
+def add_position_corrections(df: pd.DataFrame, dataset_dir: Path = DATASET_DIR) -> pd.DataFrame:
+    """
+    Adds position-corrected signals cs1_PE and cs2_PE, using the detector
+    response maps the dataset was generated with
+    """
+    metadata = dataset_io.read_metadata(str(dataset_dir)) or {}
+    physics = metadata.get('physics_parameters', {})
+    detector = {'radius_mm': physics.get('detector_radius_mm', 500),
+                'height_mm': physics.get('detector_height_mm', 1000)}
+    maps = detector_response.dataset_maps(str(dataset_dir), detector)
+    df['cs1_PE'], df['cs2_PE'] = detector_response.correct_signals(
+        maps, df['s1_area_PE'], df['s2_area_PE'],
+        df['position_x_mm'], df['position_y_mm'], df['position_z_mm'])
+    return df
+
+
 def detect_anomalies_advanced(df: pd.DataFrame, use_claude: bool = True, 
                               max_events: int = None, threshold: float = 0.3) -> pd.DataFrame:
     """
@@ -171,6 +186,8 @@ def detect_anomalies_advanced(df: pd.DataFrame, use_claude: bool = True,
                 's2_over_s1_ratio': event.get('s2_over_s1_ratio', 0),
                 's1_area_PE': event.get('s1_area_PE', 0),
                 's2_area_PE': event.get('s2_area_PE', 0),
+                'cs1_PE': event.get('cs1_PE', 0),
+                'cs2_PE': event.get('cs2_PE', 0),
                 'position_x_mm': event.get('position_x_mm', 0),
                 'position_y_mm': event.get('position_y_mm', 0),
                 'drift_time_us': event.get('drift_time_us', 0),
@@ -271,6 +288,8 @@ def detect_anomalies_advanced(df: pd.DataFrame, use_claude: bool = True,
                 'Num_Flags': len(anomaly_flags),
                 'Energy_keV': energy,
                 'S2_S1_Ratio': ratio,
+                'cS1_PE': event.get('cs1_PE', float('nan')),
+                'cS2_PE': event.get('cs2_PE', float('nan')),
                 'Position_X': x_pos,
                 'Position_Y': y_pos,
                 'Drift_Time_us': drift_time
@@ -661,8 +680,24 @@ def main():
         default=0.3,
         help='Anomaly score threshold (default: 0.3)'
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignore cached Claude responses (fresh responses are still cached)'
+    )
+    parser.add_argument(
+        '--start',
+        default=None,
+        help='Only analyze events at or after this time (e.g. 2024-03-01)'
+    )
+    parser.add_argument(
+        '--end',
+        default=None,
+        help='Only analyze events before this time (e.g. 2024-04-01)'
+    )
     
     args = parser.parse_args()
+    llm_cache.shared_cache().bypass = args.no_cache
     
     print("\n" + "#"*80)
     print("DARK MATTER ANOMALY DETECTION SYSTEM")
@@ -670,20 +705,31 @@ def main():
     print("#"*80 + "\n")
     
     # Load dataset
-    print(f"Loading dataset from: {CSV_PATH}")
-    if not CSV_PATH.exists():
-        print(f"\nERROR: Dataset not found at {CSV_PATH}")
+    dataset_path = dataset_io.find_dataset(str(DATASET_DIR))
+    if dataset_path is None:
+        print(f"\nERROR: Dataset not found in {DATASET_DIR}")
         print("Please generate the dataset first:")
-        print("  cd ../Python_Files")
-        print("  python mainDatasetCreation.py")
+        print("  cd ..")
+        print("  python main.py")
         sys.exit(1)
+    print(f"Loading dataset from: {dataset_path}")
     
-    df = pd.read_csv(CSV_PATH)
-    print(f"✓ Loaded {len(df)} events")
+    period = dataset_io.period_filters(args.start, args.end)
+    if period:
+        total_events = len(dataset_io.load_dataset(dataset_path, columns=['event_id'], filters=period))
+        print(f"✓ Found {total_events} events between {args.start or 'start'} and {args.end or 'end'}")
+    else:
+        total_events = dataset_io.count_rows(dataset_path)
+        print(f"✓ Found {total_events} events")
+    if total_events == 0:
+        print("ERROR: No events in the requested period!")
+        sys.exit(1)
     
-    # Filter to only events with valid S2/S1 data for physics analysis
-    total_events = len(df)
-    df_valid = df[df['s2_over_s1_ratio'].notna()].copy()
+    # Only events with valid S2/S1 data in the requested period are used for
+    # physics analysis; the filters are applied while reading (and on a
+    # month-partitioned dataset only the matching partitions are opened)
+    df_valid = dataset_io.with_text_timestamps(
+        dataset_io.load_dataset(dataset_path, filters=period + [('s2_over_s1_ratio', 'notna')]))
     print(f"✓ Valid S2/S1 data: {len(df_valid)} events ({len(df_valid)/total_events*100:.1f}%)")
     print(f"⚠️  Filtered out: {total_events - len(df_valid)} events with missing S2/S1\n")
     
@@ -691,8 +737,8 @@ def main():
         print("ERROR: No valid events to analyze!")
         sys.exit(1)
     
-    # Use the filtered dataset
-    df = df_valid
+    # Use the filtered dataset, with S1/S2 corrected for the detector response
+    df = add_position_corrections(df_valid)
     
     # Run anomaly detection
     use_claude = not args.no_claude
@@ -737,6 +783,9 @@ def main():
     print(f"   Total Events Analyzed:  {len(df) if args.num_events is None else args.num_events}")
     print(f"   Anomalies Detected:     {len(anomalies_df)}")
     print(f"   Detection Rate:         {len(anomalies_df)/len(df)*100:.2f}%\n")
+    if use_claude:
+        print(f"   {llm_cache.shared_cache().summary()}")
+        print(f"   {llm_gateway.gateway().usage_summary()}\n")
     
     print(f"Severity Breakdown:")
     for severity in ['Critical', 'High', 'Medium']:
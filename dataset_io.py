@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+"""dataset_io.py - Shared reader/writer for the synthetic dark matter dataset.
+
+main.py writes the dataset as a directory of compressed Parquet part files
+(dataset/dark_matter_synthetic_dataset.parquet/part-*.parquet), with CSV and
+JSON Lines (one event object per line) kept as export options. Consumers load
+it through load_dataset(), which reads only the requested columns and pushes
+row filters down into the Parquet reader, so nothing has to be re-parsed from
+text. iter_dataset() streams the text formats chunk by chunk, and
+iter_batches() streams filtered rows of any format.
+"""
+import json
+import os
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DATASET_DIR = 'dataset'
+DATASET_NAME = 'dark_matter_synthetic_dataset'
+METADATA_NAME = 'dataset_metadata.json'
+# Sidecars inside the Parquet dataset directory (the '_' prefix keeps them out of scans)
+EVENT_INDEX_DIR = '_event_index'
+PARTITION_STATS_NAME = '_partitions.json'
+PARTITIONINGS = ('month',)
+PARQUET_COMPRESSION = 'zstd'
+ROW_GROUP_SIZE = 100_000
+
+# Column order of the generated dataset (wimp_mass_GeV is only set for WIMP events).
+# coincidence_group numbers groups of events within the coincidence window of
+# each other in time order; pile_up_flag marks the events of multi-event groups.
+# weight is the statistical weight of an event: 1.0 unless rare classes were
+# oversampled, in which case weighted sums reproduce the physical mixture.
+EVENT_COLUMNS = [
+    'event_id', 'recoil_energy_keV', 's1_light_yield', 's2_charge_yield',
+    'interaction_type', 'particle_source', 'label',
+    'position_x_mm', 'position_y_mm', 'position_z_mm', 'drift_time_us',
+    's1_width_ns', 's2_width_us', 's1_area_PE', 's2_area_PE',
+    's2_over_s1_ratio', 'log10_s2_over_s1', 'timestamp',
+    'detector_temp_K', 'gas_pressure_bar', 'electric_field_V_cm',
+    'event_quality', 'pile_up_flag', 'coincidence_group', 'wimp_mass_GeV', 'weight'
+]
+
+# Pulse quantities reconstructed by the optional waveform tier (waveforms.py),
+# present only in datasets generated with it
+RECO_COLUMNS = ['s1_area_reco_PE', 's1_width_reco_ns', 's2_area_reco_PE', 's2_width_reco_us']
+
+# Categories of the string columns; event blocks store small integer codes into these
+LABELS = ['Background', 'WIMP-like', 'Axion-like', 'Sterile-Neutrino', 'Novel-Anomaly']
+INTERACTION_TYPES = ['electronic_recoil', 'nuclear_recoil', 'axion_conversion',
+                     'sterile_neutrino_decay', 'black_hole_evaporation', 'boundary_region']
+PARTICLE_SOURCES = ['gamma_ray', 'beta_decay', 'cosmic_muon', 'WIMP', 'solar_axion',
+                    'sterile_neutrino', 'primordial_black_hole', 'unknown_anomaly']
+CATEGORICAL_COLUMNS = {
+    'label': LABELS,
+    'interaction_type': INTERACTION_TYPES,
+    'particle_source': PARTICLE_SOURCES,
+}
+
+# Canonical column types shared by the generator and the loaders. Physics
+# columns are float32 (~7 significant digits, far finer than the simulated
+# detector resolution); string columns are dictionary-encoded categoricals.
+EVENT_SCHEMA = {col: np.dtype('float32') for col in EVENT_COLUMNS + RECO_COLUMNS}
+EVENT_SCHEMA.update({
+    'event_id': np.dtype('int64'),
+    'timestamp': np.dtype('datetime64[us]'),
+    'pile_up_flag': np.dtype('uint8'),
+    'coincidence_group': np.dtype('int64'),
+    **{col: pd.CategoricalDtype(categories) for col, categories in CATEGORICAL_COLUMNS.items()},
+})
+
+# A filter is a (column, op, value) tuple; 'notna'/'isna' take no value
+Filter = Tuple[Any, ...]
+FILTER_OPS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'not in', 'notna', 'isna')
+
+
+def dataset_paths(directory: str = DATASET_DIR) -> dict:
+    """Returns the output path of every supported format inside `directory`."""
+    return {
+        'parquet': os.path.join(directory, f'{DATASET_NAME}.parquet'),
+        'csv': os.path.join(directory, f'{DATASET_NAME}.csv'),
+        'jsonl': os.path.join(directory, f'{DATASET_NAME}.jsonl'),
+    }
+
+
+def find_dataset(directory: str = DATASET_DIR) -> Optional[str]:
+    """Returns the Parquet dataset in `directory` if present, else the CSV, else the JSON Lines file, else None."""
+    paths = dataset_paths(directory)
+    if PARQUET_AVAILABLE and os.path.exists(paths['parquet']):
+        return paths['parquet']
+    for fmt in ('csv', 'jsonl'):
+        if os.path.exists(paths[fmt]):
+            return paths[fmt]
+    return None
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith('.parquet')
+
+
+def _is_jsonl(path: str) -> bool:
+    return path.endswith('.jsonl')
+
+
+def _partition_keys(df: pd.DataFrame, partition_by: Optional[str]) -> np.ndarray:
+    """Returns the partition directory name of every row ('' when not partitioned)."""
+    if partition_by is None:
+        return np.full(len(df), '', dtype=object)
+    if partition_by == 'month':
+        months = df['timestamp'].to_numpy(dtype='datetime64[us]').astype('datetime64[M]')
+        return np.char.add('month=', np.datetime_as_string(months, unit='M')).astype(object)
+    raise ValueError(f"Unsupported partitioning {partition_by!r}; expected one of {PARTITIONINGS}")
+
+
+def write_parquet_part(df: pd.DataFrame, directory: str, part_index: int,
+                       row_group_size: int = ROW_GROUP_SIZE,
+                       partition_by: Optional[str] = None) -> List[dict]:
+    """
+    Writes one chunk of events as compressed Parquet with fixed-size row groups.
+
+    With partition_by='month' the chunk is split into one file per month of
+    timestamp under month=YYYY-MM/ directories. Alongside the data an
+    event-index fragment (event_id -> file, row) is written to _event_index/.
+    Returns the statistics of each file written, for write_partition_stats().
+    """
+    os.makedirs(directory, exist_ok=True)
+    keys = _partition_keys(df, partition_by)
+    stats = []
+    index_parts = []
+    for key in sorted(set(keys)):
+        rows = np.flatnonzero(keys == key)
+        part = df.iloc[rows] if len(rows) < len(df) else df
+        relative = os.path.join(key, f'part-{part_index:05d}.parquet') if key else f'part-{part_index:05d}.parquet'
+        os.makedirs(os.path.join(directory, key), exist_ok=True)
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        pq.write_table(table, os.path.join(directory, relative),
+                       row_group_size=row_group_size, compression=PARQUET_COMPRESSION)
+        stats.append({
+            'file': relative,
+            'partition': key or None,
+            'num_rows': len(part),
+            'event_id_min': int(part['event_id'].min()),
+            'event_id_max': int(part['event_id'].max()),
+            'timestamp_min': str(part['timestamp'].min()),
+            'timestamp_max': str(part['timestamp'].max()),
+        })
+        index_parts.append(pd.DataFrame({
+            'event_id': part['event_id'].to_numpy(),
+            'file': relative,
+            'row': np.arange(len(part), dtype=np.int32),
+        }))
+    if index_parts:
+        index = pd.concat(index_parts, ignore_index=True).sort_values('event_id', kind='stable')
+        index['file'] = index['file'].astype('category')
+        os.makedirs(os.path.join(directory, EVENT_INDEX_DIR), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(index, preserve_index=False),
+                       os.path.join(directory, EVENT_INDEX_DIR, f'part-{part_index:05d}.parquet'),
+                       row_group_size=row_group_size, compression=PARQUET_COMPRESSION)
+    return stats
+
+
+def _part_files(directory: str) -> List[str]:
+    """Returns the data part files of a Parquet dataset, relative to its directory."""
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(('_', '.'))]
+        files += [os.path.relpath(os.path.join(root, name), directory) for name in names
+                  if name.startswith('part-') and name.endswith('.parquet')]
+    return sorted(files)
+
+
+def next_part_index(directory: str) -> int:
+    """Returns the index after the highest existing part file, for appending parts."""
+    if not os.path.isdir(directory):
+        return 0
+    indices = [int(os.path.basename(f)[len('part-'):-len('.parquet')]) for f in _part_files(directory)]
+    return max(indices) + 1 if indices else 0
+
+
+def read_partition_stats(directory: str) -> Optional[List[dict]]:
+    """Returns the per-file statistics of a Parquet dataset, or None if it has none."""
+    path = os.path.join(directory, PARTITION_STATS_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['files']
+
+
+def write_partition_stats(directory: str, stats: List[dict], append: bool = False) -> None:
+    """Writes (or extends, when appending) the per-file statistics sidecar atomically."""
+    if append:
+        stats = (read_partition_stats(directory) or []) + stats
+    path = os.path.join(directory, PARTITION_STATS_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'files': stats}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def read_metadata(directory: str = DATASET_DIR) -> Optional[dict]:
+    """Returns the dataset_metadata.json content of a dataset directory, or None."""
+    path = os.path.join(directory, METADATA_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_metadata(metadata: dict, directory: str = DATASET_DIR) -> str:
+    """Writes dataset_metadata.json atomically (temp file + rename) and returns its path."""
+    path = os.path.join(directory, METADATA_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def clear_parquet_dataset(directory: str) -> None:
+    """Removes the part files and sidecars of a previous run so a fresh dataset is not mixed with old parts."""
+    if not os.path.isdir(directory):
+        return
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.startswith('part-') and name.endswith('.parquet'):
+                os.remove(os.path.join(root, name))
+    if os.path.exists(os.path.join(directory, PARTITION_STATS_NAME)):
+        os.remove(os.path.join(directory, PARTITION_STATS_NAME))
+    for root, _, _ in os.walk(directory, topdown=False):
+        if root != directory and not os.listdir(root):
+            os.rmdir(root)
+
+
+def write_jsonl_chunk(df: pd.DataFrame, f) -> None:
+    """
+    Appends one chunk of events to an open JSON Lines file, one object per line.
+
+    Serialization is done column-wise by pandas: NaN becomes null and the
+    timestamp column is formatted to ISO 8601 strings with numpy in one call.
+    """
+    if not len(df):
+        return
+    df = df.copy(deep=False)
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            values = df[column].to_numpy(dtype='datetime64[us]')
+            text = np.datetime_as_string(values, unit='us').astype(object)
+            text[np.isnat(values)] = None
+            df[column] = text
+    body = df.to_json(orient='records', lines=True, force_ascii=False)
+    f.write(body if body.endswith('\n') else body + '\n')
+
+
+def iter_dataset(path: str, columns: Optional[Iterable[str]] = None,
+                 chunksize: int = ROW_GROUP_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Yields a CSV or JSON Lines dataset as DataFrames of at most `chunksize` rows,
+    so files larger than memory can be processed one chunk at a time.
+
+    Chunks are cast to EVENT_SCHEMA. CSV files without an event_id column get
+    one from the row position.
+    """
+    wanted = None if columns is None else list(columns)
+    if _is_jsonl(path):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize, dtype=False,
+                              convert_dates=False)
+    else:
+        file_columns = list(pd.read_csv(path, nrows=0).columns)
+        usecols = None if wanted is None else [c for c in file_columns if c in wanted]
+        reader = pd.read_csv(path, usecols=usecols, chunksize=chunksize)
+    offset = 0
+    with reader:
+        for chunk in reader:
+            if 'event_id' not in chunk.columns:
+                chunk.insert(0, 'event_id', np.arange(offset, offset + len(chunk)))
+            offset += len(chunk)
+            if wanted is not None:
+                chunk = chunk[[c for c in wanted if c in chunk.columns]]
+            yield enforce_schema(chunk)
+
+
+def period_filters(start: Optional[str] = None, end: Optional[str] = None) -> List[Filter]:
+    """Returns timestamp filters selecting start <= timestamp < end (either bound optional)."""
+    filters = []
+    if start:
+        filters.append(('timestamp', '>=', start))
+    if end:
+        filters.append(('timestamp', '<', end))
+    return filters
+
+
+def _normalize_filters(filters: Optional[Sequence[Filter]]) -> List[Filter]:
+    """Converts timestamp filter values (e.g. '2024-03-01') to pandas Timestamps."""
+    normalized = []
+    for column, op, *value in filters or []:
+        if column == 'timestamp' and value:
+            value = [[pd.Timestamp(v) for v in value[0]] if op in ('in', 'not in') else pd.Timestamp(value[0])]
+        normalized.append((column, op, *value))
+    return normalized
+
+
+def _arrow_filter(filters: Sequence[Filter]):
+    """Converts (column, op, value) filters into one pyarrow dataset expression."""
+    expression = None
+    for column, op, *value in filters:
+        field = pc.field(column)
+        value = value[0] if value else None
+        if op == 'notna':
+            term = field.is_valid()
+        elif op == 'isna':
+            term = field.is_null(nan_is_null=True)
+        elif op == '==':
+            term = field == value
+        elif op == '!=':
+            term = field != value
+        elif op == '<':
+            term = field < value
+        elif op == '<=':
+            term = field <= value
+        elif op == '>':
+            term = field > value
+        elif op == '>=':
+            term = field >= value
+        elif op == 'in':
+            term = field.isin(list(value))
+        elif op == 'not in':
+            term = ~field.isin(list(value))
+        else:
+            raise ValueError(f"Unsupported filter op {op!r}; expected one of {FILTER_OPS}")
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def _pandas_mask(df: pd.DataFrame, filters: Sequence[Filter]) -> np.ndarray:
+    """Evaluates (column, op, value) filters on an in-memory frame."""
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, *value in filters:
+        col = df[column]
+        value = value[0] if value else None
+        if op == 'notna':
+            term = col.notna()
+        elif op == 'isna':
+            term = col.isna()
+        elif op == '==':
+            term = col == value
+        elif op == '!=':
+            term = col != value
+        elif op == '<':
+            term = col < value
+        elif op == '<=':
+            term = col <= value
+        elif op == '>':
+            term = col > value
+        elif op == '>=':
+            term = col >= value
+        elif op == 'in':
+            term = col.isin(list(value))
+        elif op == 'not in':
+            term = ~col.isin(list(value))
+        else:
+            raise ValueError(f"Unsupported filter op {op!r}; expected one of {FILTER_OPS}")
+        mask &= np.asarray(term.fillna(False), dtype=bool)
+    return mask
+
+
+def filter_mask(df: pd.DataFrame, filters: Sequence[Filter]) -> np.ndarray:
+    """Boolean mask of the rows of an in-memory frame matching (column, op, value) filters."""
+    return _pandas_mask(df, _normalize_filters(filters))
+
+
+def iter_batches(path: str, columns: Optional[Iterable[str]] = None,
+                 filters: Optional[Sequence[Filter]] = None,
+                 batch_size: int = ROW_GROUP_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Streams the rows of a dataset matching `filters` as DataFrames of at most
+    `batch_size` rows, in any of the formats load_dataset() reads, holding one
+    batch in memory at a time. Parquet filters are pushed down into the reader.
+    """
+    filters = _normalize_filters(filters)
+    available = dataset_columns(path)
+    wanted = available if columns is None else [c for c in columns if c in available]
+
+    if _is_parquet(path):
+        dataset = _parquet_dataset(path, filters)
+        if dataset is None:
+            return
+        expression = _arrow_filter(filters) if filters else None
+        for batch in dataset.to_batches(columns=wanted, filter=expression, batch_size=batch_size):
+            if batch.num_rows:
+                yield enforce_schema(batch.to_pandas())
+        return
+
+    read_columns = wanted + [f[0] for f in filters if f[0] not in wanted]
+    for chunk in iter_dataset(path, columns=read_columns, chunksize=batch_size):
+        if filters:
+            chunk = chunk[_pandas_mask(chunk, filters)]
+        if len(chunk):
+            yield chunk[wanted]
+
+
+def dataset_columns(path: str) -> List[str]:
+    """Returns the column names of a dataset without reading any rows."""
+    if _is_parquet(path):
+        return list(ds.dataset(path, format='parquet').schema.names)
+    if _is_jsonl(path):
+        with open(path, encoding='utf-8') as f:
+            first = f.readline()
+        return list(json.loads(first)) if first.strip() else []
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    return columns if 'event_id' in columns else ['event_id'] + columns
+
+
+def count_rows(path: str) -> int:
+    """Returns the number of events in a dataset (from Parquet metadata when possible)."""
+    if _is_parquet(path):
+        return ds.dataset(path, format='parquet').count_rows()
+    header_lines = 0 if _is_jsonl(path) else 1
+    with open(path, 'rb') as f:
+        lines = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+    return max(lines - header_lines, 0)
+
+
+def enforce_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Casts the known event columns of `df` to EVENT_SCHEMA; other columns are left alone."""
+    for col in df.columns:
+        dtype = EVENT_SCHEMA.get(col)
+        if dtype is None or df[col].dtype == dtype:
+            continue
+        if col == 'weight':
+            df[col] = df[col].fillna(1.0).astype(dtype)
+        elif col == 'timestamp':
+            df[col] = pd.to_datetime(df[col], format='ISO8601').astype(dtype)
+        elif col == 'pile_up_flag':
+            df[col] = df[col].fillna(0).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def with_text_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+    """Formats a datetime `timestamp` column the way the CSV stores it, for JSON output."""
+    if 'timestamp' in df.columns and pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df = df.copy()
+        df['timestamp'] = df['timestamp'].astype(str)
+    return df
+
+
+def _stats_overlap(stats: dict, filters: Sequence[Filter]) -> bool:
+    """False when a file's min/max statistics rule out every row for the filters."""
+    for column, op, *value in filters:
+        if column not in ('event_id', 'timestamp') or not value:
+            continue
+        value = value[0]
+        if column == 'timestamp':
+            low, high = pd.Timestamp(stats['timestamp_min']), pd.Timestamp(stats['timestamp_max'])
+            convert = pd.Timestamp
+        else:
+            low, high = stats['event_id_min'], stats['event_id_max']
+            convert = int
+        if op == 'in':
+            if not any(low <= convert(v) <= high for v in value):
+                return False
+            continue
+        if op not in ('==', '<', '<=', '>', '>='):
+            continue
+        value = convert(value)
+        if ((op == '==' and not low <= value <= high) or (op == '<' and low >= value)
+                or (op == '<=' and low > value) or (op == '>' and high <= value)
+                or (op == '>=' and high < value)):
+            return False
+    return True
+
+
+def _parquet_dataset(path: str, filters: Sequence[Filter] = ()):
+    """
+    Opens a Parquet dataset, skipping files whose partition statistics cannot
+    match the event_id/timestamp filters. Returns None when no file can match.
+    """
+    stats = read_partition_stats(path) if os.path.isdir(path) and filters else None
+    if stats is None:
+        return ds.dataset(path, format='parquet')
+    files = [os.path.join(path, s['file']) for s in stats if _stats_overlap(s, filters)]
+    return ds.dataset(files, format='parquet') if files else None
+
+
+def get_events(path: str, event_ids: Iterable[int],
+               columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Looks up events by event_id.
+
+    On a Parquet dataset with an event index only the index fragments and the
+    row groups holding the requested events are read; otherwise the dataset is
+    scanned with an event_id filter. Rows come back in event_id order.
+    """
+    event_ids = sorted({int(e) for e in event_ids})
+    index_dir = os.path.join(path, EVENT_INDEX_DIR)
+    if not (_is_parquet(path) and os.path.isdir(index_dir)):
+        df = load_dataset(path, columns=columns, filters=[('event_id', 'in', event_ids)])
+        return df.sort_values('event_id', ignore_index=True)
+
+    index = ds.dataset(index_dir, format='parquet').to_table(
+        filter=pc.field('event_id').isin(event_ids)).to_pandas()
+    wanted = None if columns is None else [c for c in columns if c in dataset_columns(path)]
+    parts = []
+    for relative, rows in index.groupby('file', observed=True)['row']:
+        parquet_file = pq.ParquetFile(os.path.join(path, relative))
+        starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows
+                                  for i in range(parquet_file.num_row_groups)])
+        rows = rows.to_numpy()
+        row_groups = np.searchsorted(starts, rows, side='right') - 1
+        groups = np.unique(row_groups)
+        table = parquet_file.read_row_groups(groups.tolist(), columns=wanted)
+        # Position of each requested row within the row groups that were read
+        table_starts = np.cumsum([0] + [starts[g + 1] - starts[g] for g in groups])[:-1]
+        local = table_starts[np.searchsorted(groups, row_groups)] + rows - starts[row_groups]
+        parts.append(table.take(local).to_pandas())
+    if not parts:
+        return enforce_schema(pd.DataFrame(columns=wanted or dataset_columns(path)))
+    df = pd.concat(parts, ignore_index=True)
+    return enforce_schema(df.sort_values('event_id', ignore_index=True) if 'event_id' in df else df)
+
+
+def load_dataset(path: str, columns: Optional[Iterable[str]] = None,
+                 filters: Optional[Sequence[Filter]] = None,
+                 limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Loads the synthetic dataset from Parquet, CSV or JSON Lines.
+
+    Args:
+        path: Parquet dataset directory/file, CSV file or JSON Lines file
+        columns: Columns to read (default: all). Columns the dataset lacks are skipped.
+        filters: (column, op, value) tuples combined with AND, e.g.
+                 [('s2_over_s1_ratio', 'notna'), ('label', '!=', 'Background')].
+                 Timestamp bounds may be given as strings, e.g. ('timestamp', '>=', '2024-03-01');
+                 on a partitioned dataset only files whose statistics match are opened.
+        limit: Maximum number of rows to return
+
+    CSV files written before event_id existed get it from the row position,
+    which matches how the consumers numbered events before.
+    """
+    filters = _normalize_filters(filters)
+    available = dataset_columns(path)
+    wanted = available if columns is None else [c for c in columns if c in available]
+
+    if _is_parquet(path):
+        dataset = _parquet_dataset(path, filters)
+        if dataset is None:
+            return enforce_schema(pd.DataFrame(columns=wanted))
+        expression = _arrow_filter(filters) if filters else None
+        if limit is not None:
+            table = dataset.head(limit, columns=wanted, filter=expression)
+        else:
+            table = dataset.to_table(columns=wanted, filter=expression)
+        return enforce_schema(table.to_pandas())
+
+    read_columns = wanted + [f[0] for f in filters if f[0] not in wanted]
+    parts = []
+    for chunk in iter_dataset(path, columns=read_columns):
+        if filters:
+            chunk = chunk[_pandas_mask(chunk, filters)]
+        parts.append(chunk[wanted])
+        if limit is not None and sum(len(p) for p in parts) >= limit:
+            break
+    df = pd.concat(parts, ignore_index=True) if parts else enforce_schema(pd.DataFrame(columns=wanted))
+    return df.head(limit) if limit is not None else df
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""detector_response.py - Position-dependent detector response maps.
+
+The generator's position effects (S1 light collection and S2 charge
+collection) are looked up in gridded response maps instead of closed-form
+expressions, and the same maps are used to correct observed signals back to
+the detector centre:
+
+    s1_rz: S1 light collection efficiency over (r, z)
+    s2_rz: S2 charge collection efficiency over (r, z)
+    s2_xy: S2 gain over (x, y), e.g. from extraction field non-uniformity
+
+build_default_maps() reproduces the historical closed-form model on a grid;
+measured maps can be saved to / loaded from an .npz file with the same layout.
+Every map is a regular grid evaluated by vectorized bilinear interpolation,
+so a lookup costs a handful of array operations per event block.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+RESPONSE_MAPS_NAME = 'detector_response.npz'
+MAP_NAMES = ('s1_rz', 's2_rz', 's2_xy')
+
+# Grid nodes of the default maps along each axis
+DEFAULT_GRID_NODES = 51
+
+
+@dataclass
+class ResponseMap:
+    """A response map sampled on a regular 2D grid.
+
+    values[i, j] is the response at (origin[0] + i*step[0], origin[1] + j*step[1]).
+    Lookups outside the grid use the nearest edge value; NaN coordinates give NaN.
+    """
+    values: np.ndarray
+    origin: Tuple[float, float]
+    step: Tuple[float, float]
+    axes: Tuple[str, str]
+
+    def __call__(self, u, v) -> np.ndarray:
+        """Bilinearly interpolates the map at coordinates (u, v)."""
+        values = np.ascontiguousarray(self.values, dtype=np.float32)
+        nu, nv = values.shape
+        fu = (np.asarray(u, dtype=np.float32) - np.float32(self.origin[0])) / np.float32(self.step[0])
+        fv = (np.asarray(v, dtype=np.float32) - np.float32(self.origin[1])) / np.float32(self.step[1])
+        invalid = np.isnan(fu) | np.isnan(fv)
+        # Clipping maps NaN to the grid too; those rows are reset to NaN below
+        fu = np.clip(np.nan_to_num(fu), 0, nu - 1)
+        fv = np.clip(np.nan_to_num(fv), 0, nv - 1)
+        i = np.minimum(fu.astype(np.intp), nu - 2)
+        j = np.minimum(fv.astype(np.intp), nv - 2)
+        tu = fu - i
+        tv = fv - j
+
+        flat = values.ravel()
+        k = i * nv + j
+        low = flat[k] + tv * (flat[k + 1] - flat[k])
+        high = flat[k + nv] + tv * (flat[k + nv + 1] - flat[k + nv])
+        result = low + tu * (high - low)
+        result[invalid] = np.nan
+        return result
+
+
+def _grid_map(func, u_range, v_range, axes, nodes=DEFAULT_GRID_NODES) -> ResponseMap:
+    """Samples func(u, v) on a regular nodes x nodes grid."""
+    u = np.linspace(*u_range, nodes)
+    v = np.linspace(*v_range, nodes)
+    uu, vv = np.meshgrid(u, v, indexing='ij')
+    values = np.broadcast_to(func(uu, vv), uu.shape).astype(np.float32)
+    return ResponseMap(values, (u_range[0], v_range[0]), (u[1] - u[0], v[1] - v[0]), axes)
+
+
+def build_default_maps(detector: dict) -> Dict[str, ResponseMap]:
+    """
+    Builds the default maps for a detector of the given radius and height.
+
+    S1 light collection drops linearly to 70% at the wall, S2 charge
+    collection rises linearly from 80% at the cathode to 100% at the top, and
+    the S2 (x, y) gain is flat.
+    """
+    radius, height = detector['radius_mm'], detector['height_mm']
+    r_range, z_range, xy_range = (0.0, radius), (-height/2, height/2), (-radius, radius)
+    return {
+        's1_rz': _grid_map(lambda r, z: 1.0 - 0.3 * r / radius, r_range, z_range, ('r_mm', 'z_mm')),
+        's2_rz': _grid_map(lambda r, z: 0.8 + 0.2 * (z + height/2) / height, r_range, z_range, ('r_mm', 'z_mm')),
+        's2_xy': _grid_map(lambda x, y: 1.0, xy_range, xy_range, ('x_mm', 'y_mm')),
+    }
+
+
+def save_maps(maps: Dict[str, ResponseMap], path: str) -> str:
+    """Writes the maps to an .npz file readable by load_maps()."""
+    arrays = {}
+    for name, response in maps.items():
+        arrays[f'{name}_values'] = response.values
+        arrays[f'{name}_origin'] = np.asarray(response.origin, dtype=np.float64)
+        arrays[f'{name}_step'] = np.asarray(response.step, dtype=np.float64)
+        arrays[f'{name}_axes'] = np.asarray(response.axes)
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    return path
+
+
+def load_maps(path: str) -> Dict[str, ResponseMap]:
+    """Reads maps written by save_maps(); raises ValueError if one of MAP_NAMES is missing."""
+    with np.load(path) as data:
+        missing = [name for name in MAP_NAMES if f'{name}_values' not in data]
+        if missing:
+            raise ValueError(f"Response map file {path} lacks map(s): {', '.join(missing)}")
+        return {name: ResponseMap(data[f'{name}_values'].astype(np.float32),
+                                  tuple(data[f'{name}_origin'].tolist()),
+                                  tuple(data[f'{name}_step'].tolist()),
+                                  tuple(data[f'{name}_axes'].tolist()))
+                for name in MAP_NAMES}
+
+
+def dataset_maps(directory: str, detector: Optional[dict] = None) -> Dict[str, ResponseMap]:
+    """
+    Returns the maps a dataset was generated with.
+
+    Uses <directory>/detector_response.npz when present, otherwise builds the
+    default maps for `detector` (radius_mm, height_mm).
+    """
+    path = os.path.join(directory, RESPONSE_MAPS_NAME)
+    if os.path.exists(path):
+        return load_maps(path)
+    if detector is None:
+        raise ValueError(f"No {RESPONSE_MAPS_NAME} in {directory} and no detector geometry given")
+    return build_default_maps(detector)
+
+
+def s1_response(maps: Dict[str, ResponseMap], x, y, z) -> np.ndarray:
+    """Relative S1 response at the given positions."""
+    return maps['s1_rz'](np.hypot(x, y), z)
+
+
+def s2_response(maps: Dict[str, ResponseMap], x, y, z) -> np.ndarray:
+    """Relative S2 response at the given positions."""
+    return maps['s2_rz'](np.hypot(x, y), z) * maps['s2_xy'](x, y)
+
+
+def correct_signals(maps: Dict[str, ResponseMap], s1, s2, x, y, z) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns position-corrected (cS1, cS2): the signals the event would have
+    given at full response. Events without a reconstructed position give NaN.
+    """
+    return np.asarray(s1) / s1_response(maps, x, y, z), np.asarray(s2) / s2_response(maps, x, y, z)
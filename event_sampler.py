@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""event_sampler.py - Single-pass stratified sampling of event streams.
+
+StratifiedSampler draws a fixed number of events per stratum (a label, class
+or any (column, op, value) filter from dataset_io) from a stream of DataFrame
+chunks, holding only the current reservoirs in memory, so balanced samples can
+be drawn from datasets far larger than memory:
+
+    sampler = StratifiedSampler([Stratum('signal', 50, [('label', '!=', 'Background')]),
+                                 Stratum('background', 50, [('label', '==', 'Background')])])
+    for chunk in dataset_io.iter_batches(path):
+        sampler.update(chunk)
+    sample = sampler.sample()
+
+Each event gets a pseudo-random key hashed from its event_id and the seed, and
+a stratum keeps the events with the smallest keys (bottom-k sampling). This is
+a uniform sample without replacement like a classic reservoir, but it depends
+only on which events are in the stream, not on their order or on how the
+stream is chunked: the same dataset and seed give the same sample at any
+chunk size.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import dataset_io
+
+DEFAULT_SEED = 42
+
+
+@dataclass
+class Stratum:
+    """A named subset of the events and how many of them to sample.
+
+    filters are (column, op, value) tuples combined with AND, as in
+    dataset_io.load_dataset(). A quota of None takes whatever the sample's
+    total leaves after the strata before it (a stratum that tops up a short one).
+    Strata are expected to be disjoint.
+    """
+    name: str
+    quota: Optional[int]
+    filters: List[dataset_io.Filter] = field(default_factory=list)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: a bijective hash spreading consecutive ids over uint64."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def sample_keys(ids: np.ndarray, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """Uniform keys in [0, 1) determined by each id and the seed."""
+    salt = _mix64(np.array([seed], dtype=np.uint64))[0]
+    hashed = _mix64(np.asarray(ids).astype(np.int64).view(np.uint64) ^ salt)
+    return (hashed >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+class StratifiedSampler:
+    """Per-stratum bottom-k reservoirs over a stream of event chunks."""
+
+    def __init__(self, strata: Iterable[Stratum], total: Optional[int] = None,
+                 seed: int = DEFAULT_SEED, id_column: str = 'event_id'):
+        self.strata = list(strata)
+        if total is None and any(s.quota is None for s in self.strata):
+            raise ValueError("A stratum without a quota needs the sample's total")
+        self.total = total
+        self.seed = seed
+        self.id_column = id_column
+        self.seen: Dict[str, int] = {s.name: 0 for s in self.strata}
+        self._reservoirs: Dict[str, Optional[pd.DataFrame]] = {s.name: None for s in self.strata}
+        self._rows = 0
+
+    def _capacity(self, stratum: Stratum) -> int:
+        return stratum.quota if stratum.quota is not None else self.total
+
+    def _ids(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Event ids of a chunk; the stream position when there is no id column."""
+        if self.id_column in chunk.columns:
+            return chunk[self.id_column].to_numpy(dtype=np.int64)
+        return np.arange(self._rows, self._rows + len(chunk), dtype=np.int64)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Offers every event of `chunk` to the reservoirs of the strata it belongs to."""
+        if chunk.empty:
+            return
+        ids = self._ids(chunk)
+        self._rows += len(chunk)
+        keys = sample_keys(ids, self.seed)
+        for stratum in self.strata:
+            capacity = self._capacity(stratum)
+            mask = dataset_io.filter_mask(chunk, stratum.filters) if stratum.filters else np.ones(len(chunk), bool)
+            self.seen[stratum.name] += int(mask.sum())
+            reservoir = self._reservoirs[stratum.name]
+            # A full reservoir only takes events that beat its largest key
+            if reservoir is not None and len(reservoir) >= capacity:
+                mask &= keys < reservoir['_sample_key'].iat[-1]
+            if capacity <= 0 or not mask.any():
+                continue
+            candidates = chunk[mask].assign(_sample_key=keys[mask], _sample_id=ids[mask])
+            pool = candidates if reservoir is None else pd.concat([reservoir, candidates])
+            order = np.lexsort((pool['_sample_id'].to_numpy(), pool['_sample_key'].to_numpy()))
+            self._reservoirs[stratum.name] = pool.iloc[order[:capacity]]
+
+    def counts(self) -> Dict[str, int]:
+        """Events drawn per stratum, honouring the quotas and the total."""
+        counts, taken = {}, 0
+        for stratum in self.strata:
+            quota = stratum.quota if stratum.quota is not None else self.total - taken
+            if self.total is not None:
+                quota = min(quota, self.total - taken)
+            reservoir = self._reservoirs[stratum.name]
+            counts[stratum.name] = max(min(quota, 0 if reservoir is None else len(reservoir)), 0)
+            taken += counts[stratum.name]
+        return counts
+
+    def sample(self) -> pd.DataFrame:
+        """The sampled events of all strata, shuffled (ordered by sample key)."""
+        parts = [self._reservoirs[name].head(n) for name, n in self.counts().items() if n]
+        if not parts:
+            return pd.DataFrame()
+        sample = pd.concat(parts)
+        order = np.lexsort((sample['_sample_id'].to_numpy(), sample['_sample_key'].to_numpy()))
+        return sample.iloc[order].drop(columns=['_sample_key', '_sample_id']).reset_index(drop=True)
+
+
+def stratified_sample(chunks: Iterable[pd.DataFrame], strata: Iterable[Stratum],
+                      total: Optional[int] = None, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Runs a StratifiedSampler over `chunks` in one pass and returns the sample."""
+    sampler = StratifiedSampler(strata, total=total, seed=seed)
+    for chunk in chunks:
+        sampler.update(chunk)
+    return sampler.sample()
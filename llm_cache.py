@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""llm_cache.py - Persistent cache of Claude responses.
+
+Classification and hypothesis responses are stored in a SQLite file, keyed by
+a SHA-256 hash of the request kind, model name, prompt template version and
+the normalized feature dict the prompt was built from. Re-running an analysis
+over the same events, or asking the webapp about the same event again, is
+answered from disk without an API call.
+
+Normalization rounds floats to 6 significant digits and maps NaN to None, so
+the same event read from Parquet, CSV or a JSON request gives the same key.
+Bumping a prompt's template version invalidates its entries.
+
+Entries older than max_age_days are dropped and the least recently used ones
+beyond max_entries are evicted. With bypass set (--no-cache, or
+LLM_CACHE_BYPASS=1) lookups always miss but fresh responses are still stored.
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'llm_responses.sqlite')
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_AGE_DAYS = 90.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+
+def normalize(value: Any) -> Any:
+    """Returns a JSON-stable form of a feature value (numpy scalars, NaN and float noise removed)."""
+    if hasattr(value, 'item') and not isinstance(value, (list, dict, str)):
+        value = value.item()
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, bool) or value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else float(f'{value:.6g}')
+    return str(value).strip()
+
+
+def cache_key(kind: str, model: str, template_version: int, features: Dict[str, Any]) -> str:
+    """Hash of everything that determines a response."""
+    payload = json.dumps([kind, model, template_version, normalize(features)], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with age/size eviction and hit/miss counters."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS, bypass: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_s = max_age_days * 86400
+        self.bypass = bypass
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by the webapp's request threads, serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(_SCHEMA)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached response for `key`, or None on a miss (always with bypass)."""
+        if self.bypass:
+            self.stats['misses'] += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] > self.max_age_s:
+                self.stats['misses'] += 1
+                return None
+            self._db.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self.stats['hits'] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any], kind: str = '') -> None:
+        """Stores a response and evicts expired / least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                             (key, kind, json.dumps(value, ensure_ascii=False), now, now))
+            self.stats['writes'] += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        expired = self._db.execute('DELETE FROM responses WHERE created < ?', (now - self.max_age_s,)).rowcount
+        excess = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute('DELETE FROM responses WHERE key IN '
+                             '(SELECT key FROM responses ORDER BY last_access LIMIT ?)', (excess,))
+        self.stats['evicted'] += expired + max(excess, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def summary(self) -> str:
+        lookups = self.stats['hits'] + self.stats['misses']
+        rate = self.stats['hits'] / lookups * 100 if lookups else 0.0
+        return (f"LLM cache: {self.stats['hits']} hits, {self.stats['misses']} misses ({rate:.0f}% hit rate), "
+                f"{self.stats['writes']} stored, {len(self)} entries in {self.path}")
+
+
+def lookup(kind: str, model: str, template_version: int,
+           features: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Returns (key, cached response or None) from the shared cache."""
+    key = cache_key(kind, model, template_version, features)
+    return key, shared_cache().get(key)
+
+
+def store(key: str, response: Dict[str, Any], kind: str = '') -> None:
+    """Caches a successful response in the shared cache; error responses are not stored."""
+    if 'error' not in response:
+        shared_cache().put(key, response, kind)
+
+
+_shared_cache: Optional[LLMCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> LLMCache:
+    """Returns the process-wide cache (LLM_CACHE_PATH / LLM_CACHE_BYPASS from the environment)."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMCache(os.getenv('LLM_CACHE_PATH') or DEFAULT_CACHE_PATH,
+                                     bypass=os.getenv('LLM_CACHE_BYPASS', '').lower() in ('1', 'true', 'yes'))
+        return _shared_cache
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""llm_gateway.py - The one way this project talks to the Claude API.
+
+LLMGateway owns a long-lived Anthropic client on a pooled, keep-alive HTTP
+connection pool, so TLS and connection setup happen once per process rather
+than once per call. It holds the shared request defaults (model, max_tokens,
+temperature, timeout) and sends every request through the shared rate limiter,
+which also retries throttled (429/529) and transient (5xx, connection,
+timeout) failures. Call sites only pass what differs:
+
+    message = llm_gateway.gateway().create_message(
+        messages=[{"role": "user", "content": prompt}], max_tokens=500)
+
+Async pipelines open an AsyncAnthropic client for the duration of a run with
+async_session(), as its connection pool is tied to the running event loop.
+
+create_structured() forces the model to answer through a tool whose input is
+the response schema, validates the input and, if it does not conform, sends
+the errors back as a tool result so the model corrects that response.
+
+Static prompt prefixes (instructions, schemas) are passed as cacheable()
+system blocks so the API can serve them from its prompt cache; the gateway
+totals the usage of every response, including cache reads and writes, for
+usage_summary().
+Configuration comes from the environment when the gateway is first used:
+ANTHROPIC_API_KEY or CLAUDE_API_KEY, and optionally LLM_MODEL,
+LLM_MAX_CONNECTIONS and LLM_TIMEOUT_S.
+"""
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import anthropic
+
+import rate_limiter
+import structured_output
+
+DEFAULT_MODEL = "claude-3-haiku-20240307"
+DEFAULT_MAX_TOKENS = 1024
+DEFAULT_TEMPERATURE = 0.0
+DEFAULT_TIMEOUT_S = 60.0
+DEFAULT_MAX_CONNECTIONS = 20
+
+# Corrective follow-ups after a response that fails schema validation
+MAX_REPAIR_ATTEMPTS = 2
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+
+class LLMGateway:
+    """Pooled Claude client plus shared request defaults; rate limiting and retries are the limiter's."""
+
+    def __init__(self, api_key: Optional[str] = None, model: str = DEFAULT_MODEL,
+                 max_tokens: int = DEFAULT_MAX_TOKENS, temperature: float = DEFAULT_TEMPERATURE,
+                 timeout_s: float = DEFAULT_TIMEOUT_S, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 limiter: Optional[rate_limiter.RateLimiter] = None):
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY") or os.getenv("CLAUDE_API_KEY")
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout_s = timeout_s
+        self.max_connections = max_connections
+        self.limiter = limiter or rate_limiter.shared_limiter()
+        self._client: Optional[anthropic.Anthropic] = None
+        self._lock = threading.Lock()
+        self.usage = {'requests': 0, **{field: 0 for field in USAGE_FIELDS}}
+
+    def _limits(self) -> Any:
+        # The SDK's own Limits type, so the HTTP library the installed SDK uses is not imported here
+        return type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections, keepalive_expiry=60.0)
+
+    @property
+    def client(self) -> anthropic.Anthropic:
+        """The process-wide sync client (created on first use; safe to share across threads)."""
+        with self._lock:
+            if self._client is None:
+                # The rate limiter retries throttling and transient errors, so every attempt is rate limited
+                self._client = anthropic.Anthropic(
+                    api_key=self.api_key, max_retries=0, timeout=self.timeout_s,
+                    http_client=anthropic.DefaultHttpxClient(limits=self._limits(), timeout=self.timeout_s))
+            return self._client
+
+    def request(self, **overrides) -> Dict[str, Any]:
+        """Returns messages.create() arguments: the shared defaults updated with `overrides`."""
+        return {"model": self.model, "max_tokens": self.max_tokens,
+                "temperature": self.temperature, **overrides}
+
+    def record_usage(self, message: Any) -> None:
+        """Adds a response's token usage to the running totals."""
+        usage = getattr(message, 'usage', None)
+        with self._lock:
+            self.usage['requests'] += 1
+            for field in USAGE_FIELDS:
+                self.usage[field] += getattr(usage, field, None) or 0
+
+    def usage_summary(self) -> str:
+        usage = self.usage
+        prompt_tokens = usage['input_tokens'] + usage['cache_read_input_tokens'] + usage['cache_creation_input_tokens']
+        cached = usage['cache_read_input_tokens'] / prompt_tokens * 100 if prompt_tokens else 0.0
+        return (f"LLM usage: {usage['requests']} requests, {prompt_tokens} prompt tokens "
+                f"({usage['cache_read_input_tokens']} cache reads, {usage['cache_creation_input_tokens']} cache writes, "
+                f"{cached:.0f}% read from cache), {usage['output_tokens']} output tokens")
+
+    def create_message(self, **overrides) -> Any:
+        """Sends one messages request on the pooled client, within the rate limits."""
+        message = self.limiter.create_message(self.client, **self.request(**overrides))
+        self.record_usage(message)
+        return message
+
+    async def create_message_async(self, client: anthropic.AsyncAnthropic, **overrides) -> Any:
+        """create_message() on a client from async_session()."""
+        message = await self.limiter.create_message_async(client, **self.request(**overrides))
+        self.record_usage(message)
+        return message
+
+    def create_structured(self, tool_def: Dict[str, Any], **overrides) -> Dict[str, Any]:
+        """
+        Sends a request that must be answered by calling `tool_def`; returns the
+        validated tool input. Invalid input is sent back with its validation
+        errors, up to MAX_REPAIR_ATTEMPTS times, before StructuredOutputError
+        is raised.
+        """
+        messages = list(overrides.pop('messages'))
+        request = {**overrides, **structured_output.forced(tool_def)}
+        for _ in range(MAX_REPAIR_ATTEMPTS + 1):
+            message = self.create_message(messages=messages, **request)
+            result, errors, messages = _checked(tool_def, message, messages)
+            if not errors:
+                return result
+        raise structured_output.StructuredOutputError(f"{tool_def['name']}: {'; '.join(errors[:5])}")
+
+    async def create_structured_async(self, client: anthropic.AsyncAnthropic, tool_def: Dict[str, Any],
+                                      **overrides) -> Dict[str, Any]:
+        """create_structured() on a client from async_session()."""
+        messages = list(overrides.pop('messages'))
+        request = {**overrides, **structured_output.forced(tool_def)}
+        for _ in range(MAX_REPAIR_ATTEMPTS + 1):
+            message = await self.create_message_async(client, messages=messages, **request)
+            result, errors, messages = _checked(tool_def, message, messages)
+            if not errors:
+                return result
+        raise structured_output.StructuredOutputError(f"{tool_def['name']}: {'; '.join(errors[:5])}")
+
+    @asynccontextmanager
+    async def async_session(self) -> AsyncIterator[anthropic.AsyncAnthropic]:
+        """An AsyncAnthropic client sharing one connection pool for the length of the block."""
+        client = anthropic.AsyncAnthropic(
+            api_key=self.api_key, max_retries=0, timeout=self.timeout_s,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=self._limits(), timeout=self.timeout_s))
+        async with client:
+            yield client
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+def _checked(tool_def: Dict[str, Any], message: Any, messages: List[Dict[str, Any]]):
+    """
+    Validates the tool call in `message`. Returns (tool input, errors, messages
+    for the next attempt): on failure the call and an error tool result
+    listing what to fix are appended to the conversation.
+    """
+    call = structured_output.tool_call(message, tool_def['name'])
+    if call is None:
+        return None, [f"no call to {tool_def['name']} (stop reason: {getattr(message, 'stop_reason', None)})"], messages
+    errors = structured_output.validate(call.input, tool_def['input_schema'])
+    if not errors:
+        return call.input, [], messages
+    feedback = ("The tool input does not match its schema:\n- " + "\n- ".join(errors) +
+                f"\nCall {tool_def['name']} again with a complete, corrected input.")
+    return None, errors, messages + [
+        {"role": "assistant",
+         "content": [{"type": "tool_use", "id": call.id, "name": call.name, "input": call.input}]},
+        {"role": "user",
+         "content": [{"type": "tool_result", "tool_use_id": call.id, "is_error": True, "content": feedback}]},
+    ]
+
+
+def cacheable(text: str) -> List[Dict[str, Any]]:
+    """
+    A system prompt whose text is marked as a prompt cache breakpoint: later
+    requests starting with the same text read it from the cache. Prefixes
+    shorter than the model's minimum (1024 tokens, 2048 for Haiku models) are
+    processed normally, uncached.
+    """
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def message_text(message: Any) -> str:
+    """Text of the first content block of a response ('' if there is none)."""
+    return message.content[0].text if message.content else ''
+
+
+_shared_gateway: Optional[LLMGateway] = None
+_shared_lock = threading.Lock()
+
+
+def gateway() -> LLMGateway:
+    """Returns the process-wide gateway, configured from the environment on first use."""
+    global _shared_gateway
+    with _shared_lock:
+        if _shared_gateway is None:
+            _shared_gateway = LLMGateway(
+                model=os.getenv("LLM_MODEL") or DEFAULT_MODEL,
+                timeout_s=float(os.getenv("LLM_TIMEOUT_S", DEFAULT_TIMEOUT_S)),
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)))
+        return _shared_gateway
@@ -1,396 +1,1050 @@
+import argparse
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
-
-def generate_event(event_type, detector_depth_m=1400):
-    """Generates a single particle event with realistic detector features."""
-    
-    event = {}
-    
-    # Common detector parameters
-    detector_radius_mm = 500  # Typical xenon detector size
-    detector_height_mm = 1000
-    drift_velocity_mm_us = 1.33  # Typical for liquid xenon
-    
+
+import coincidence
+import dataset_io
+import detector_response
+import waveforms as waveform_tier
+from dataset_io import (CATEGORICAL_COLUMNS, EVENT_COLUMNS, INTERACTION_TYPES, LABELS,
+                        PARTICLE_SOURCES)
+
+OUTPUT_FORMATS = ('parquet', 'csv', 'jsonl')
+
+# Common detector parameters
+DETECTOR_RADIUS_MM = 500  # Typical xenon detector size
+DETECTOR_HEIGHT_MM = 1000
+DRIFT_VELOCITY_MM_US = 1.33  # Typical for liquid xenon
+
+DEFAULT_DETECTOR_PARAMS = {
+    'radius_mm': DETECTOR_RADIUS_MM,
+    'height_mm': DETECTOR_HEIGHT_MM,
+    'drift_velocity_mm_us': DRIFT_VELOCITY_MM_US,
+}
+
+# Data taking starts at RUN_START; by default the events are spread over a year
+RUN_START = np.datetime64('2024-01-01T00:00:00', 'us')
+SECONDS_PER_YEAR = 365 * 86400
+DEFAULT_TRIGGER_RATE_HZ = 50000 / SECONDS_PER_YEAR
+
+# Event distribution (physics-based realistic rates)
+DEFAULT_CLASS_FRACTIONS = {
+    'background_ER': 0.93,          # 93% background electronic recoils (S2/S1 > 5.0)
+    'wimp_NR': 0.04,               # 4% WIMP candidates (S2/S1: 2.0-4.0)
+    'axion-like': 0.015,           # 1.5% axion-like events (S2/S1 < 2.0)
+    'sterile_neutrino': 0.005,     # 0.5% sterile neutrino candidates (S2/S1 < 2.0)
+    'novel_anomaly': 0.01          # 1% boundary region events (S2/S1: 4.0-5.0)
+}
+EVENT_TYPES = ('background_ER', 'wimp_NR', 'axion-like', 'sterile_neutrino', 'primordial_BH', 'novel_anomaly')
+
+# Allowed S2/S1 band per label: (low, high, resample_low, resample_high)
+S2_S1_BANDS = {
+    'Background': (5.0, np.inf, 5.0, 8.0),
+    'WIMP-like': (2.0, 4.0, 2.0, 4.0),
+    'Axion-like': (-np.inf, 2.0, 0.5, 1.9),
+    'Sterile-Neutrino': (-np.inf, 2.0, 0.5, 1.9),
+    'Novel-Anomaly': (4.0, 5.0, 4.0, 5.0),
+}
+
+
+# The same bands indexed by label code, for lookups on a whole column at once
+_BAND_TABLE = np.array([S2_S1_BANDS[label] for label in LABELS])
+_BAND_UPPER_EXCLUSIVE = np.array([label in ('Axion-like', 'Sterile-Neutrino') for label in LABELS])
+
+
+def _in_band(ratio, label):
+    """Returns a mask of ratios inside the S2/S1 band of the given label."""
+    low, high = S2_S1_BANDS[label][:2]
+    if label in ('Axion-like', 'Sterile-Neutrino'):
+        return ratio < high  # Axion/Sterile: S2/S1 < 2.0 (upper edge exclusive)
+    return (ratio >= low) & (ratio <= high)
+
+
+def _out_of_band(ratio, label_codes):
+    """Returns a mask of measured ratios outside the S2/S1 band of each event's label."""
+    low, high = _BAND_TABLE[label_codes, 0], _BAND_TABLE[label_codes, 1]
+    above = np.where(_BAND_UPPER_EXCLUSIVE[label_codes], ratio >= high, ratio > high)
+    return (ratio < low) | above  # NaN ratios compare False and are left alone
+
+
+def _codes(n, categories, value):
+    """Returns n copies of the category code of `value`."""
+    return np.full(n, categories.index(value), dtype=np.int8)
+
+
+def generate_event_block(event_type, n, rng=np.random, detector=DEFAULT_DETECTOR_PARAMS):
+    """Generates n particle events of one type as a dict of column arrays.
+
+    Every feature is drawn with whole-array NumPy sampling, so the cost per
+    event is a handful of vectorized operations instead of dozens of scalar
+    np.random calls. `rng` may be the np.random module or a np.random.Generator.
+    """
+    block = {}
+    radius, height = detector['radius_mm'], detector['height_mm']
+
     if event_type == 'background_ER':
         # Electronic Recoils (ER) - HIGH S2/S1 ratio (> 5.0) from gamma rays, beta particles
-        event['recoil_energy_keV'] = np.random.exponential(scale=5.0)  # Exponential energy spectrum
-        event['recoil_energy_keV'] = np.clip(event['recoil_energy_keV'], 1, 100)
-        
-        # S1 signal (prompt light) - moderate for ER
-        event['s1_light_yield'] = event['recoil_energy_keV'] * np.random.normal(2.5, 0.3)  # ~2.5 PE/keV for ER
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 1, None)
-        
-        # S2 signal (delayed charge) - MUCH larger for ER to achieve S2/S1 > 5.0
-        # Target S2/S1 ratio: 5.0 to 20.0 (high background signature)
-        target_s2_s1_ratio = np.random.uniform(5.0, 20.0)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s2_charge_yield'] = np.clip(event['s2_charge_yield'], 10, None)
-        
-        event['interaction_type'] = 'electronic_recoil'
-        event['particle_source'] = np.random.choice(['gamma_ray', 'beta_decay', 'cosmic_muon'], 
-                                                   p=[0.6, 0.3, 0.1])
-        event['label'] = 'Background'
+        energy = np.clip(rng.exponential(scale=5.0, size=n), 1, 100)  # Exponential energy spectrum
+        # S1 signal (prompt light) - moderate for ER, ~2.5 PE/keV
+        s1 = np.clip(energy * rng.normal(2.5, 0.3, size=n), 1, None)
+        # S2 signal (delayed charge) - target S2/S1 ratio: 5.0 to 20.0 (high background signature)
+        s2 = np.clip(s1 * rng.uniform(5.0, 20.0, size=n), 10, None)
+        block['interaction_type'] = _codes(n, INTERACTION_TYPES, 'electronic_recoil')
+        block['particle_source'] = rng.choice(np.array([0, 1, 2], dtype=np.int8),  # gamma_ray, beta_decay, cosmic_muon
+                                              size=n, p=[0.6, 0.3, 0.1])
+        block['label'] = _codes(n, LABELS, 'Background')
 
     elif event_type == 'wimp_NR':
         # WIMP-like Nuclear Recoils (NR) - MEDIUM S2/S1 ratio (2.0 to 4.0)
         # WIMPs expected to have exponential spectrum with cutoff
-        event['recoil_energy_keV'] = np.random.exponential(scale=8.0)
-        event['recoil_energy_keV'] = np.clip(event['recoil_energy_keV'], 5, 50)
-        
+        energy = np.clip(rng.exponential(scale=8.0, size=n), 5, 50)
         # Nuclear recoils have lower light yield than ER
-        event['s1_light_yield'] = event['recoil_energy_keV'] * np.random.normal(1.0, 0.2)  # Higher than before for correct ratio
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 0.5, None)
-        
+        s1 = np.clip(energy * rng.normal(1.0, 0.2, size=n), 0.5, None)
         # S2 signal - calibrated for MEDIUM S2/S1 ratio (2.0 to 4.0)
-        target_s2_s1_ratio = np.random.uniform(2.0, 4.0)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s2_charge_yield'] = np.clip(event['s2_charge_yield'], 1, None)
-        
-        event['interaction_type'] = 'nuclear_recoil'
-        event['particle_source'] = 'WIMP'
-        event['wimp_mass_GeV'] = np.random.uniform(10, 1000)  # WIMP mass hypothesis
-        event['label'] = 'WIMP-like'
-        
+        s2 = np.clip(s1 * rng.uniform(2.0, 4.0, size=n), 1, None)
+        block['interaction_type'] = _codes(n, INTERACTION_TYPES, 'nuclear_recoil')
+        block['particle_source'] = _codes(n, PARTICLE_SOURCES, 'WIMP')
+        block['wimp_mass_GeV'] = rng.uniform(10, 1000, size=n)  # WIMP mass hypothesis
+        block['label'] = _codes(n, LABELS, 'WIMP-like')
+
     elif event_type == 'axion-like':
         # Axions - LOW S2/S1 ratio (< 2.0) - Ultra-low energy exotic ER
-        event['recoil_energy_keV'] = np.random.normal(loc=3.5, scale=0.3)  # Lower energy for axions
-        event['recoil_energy_keV'] = np.clip(event['recoil_energy_keV'], 1, 8)
-        
+        energy = np.clip(rng.normal(loc=3.5, scale=0.3, size=n), 1, 8)
         # Lower light yield for exotic low-energy interactions
-        event['s1_light_yield'] = event['recoil_energy_keV'] * np.random.normal(1.5, 0.2)
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 0.5, None)
-        
+        s1 = np.clip(energy * rng.normal(1.5, 0.2, size=n), 0.5, None)
         # S2 signal - LOW ratio (< 2.0) for axion signature
-        target_s2_s1_ratio = np.random.uniform(0.5, 1.9)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s2_charge_yield'] = np.clip(event['s2_charge_yield'], 0.5, None)
-        
-        event['interaction_type'] = 'axion_conversion'
-        event['particle_source'] = 'solar_axion'
-        event['label'] = 'Axion-like'
-        
+        s2 = np.clip(s1 * rng.uniform(0.5, 1.9, size=n), 0.5, None)
+        block['interaction_type'] = _codes(n, INTERACTION_TYPES, 'axion_conversion')
+        block['particle_source'] = _codes(n, PARTICLE_SOURCES, 'solar_axion')
+        block['label'] = _codes(n, LABELS, 'Axion-like')
+
     elif event_type == 'sterile_neutrino':
         # Sterile neutrinos - similar to axions but slightly different energy
-        event['recoil_energy_keV'] = np.random.normal(loc=2.5, scale=0.2)  # Even lower energy
-        event['recoil_energy_keV'] = np.clip(event['recoil_energy_keV'], 1, 6)
-        
-        event['s1_light_yield'] = event['recoil_energy_keV'] * np.random.normal(1.2, 0.2)
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 0.3, None)
-        
-        # LOW S2/S1 ratio similar to axions
-        target_s2_s1_ratio = np.random.uniform(0.3, 1.8)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 0.3, None)
-        
+        energy = np.clip(rng.normal(loc=2.5, scale=0.2, size=n), 1, 6)
+        s1 = np.clip(energy * rng.normal(1.2, 0.2, size=n), 0.3, None)
         # LOW S2/S1 ratio similar to axions
-        target_s2_s1_ratio = np.random.uniform(0.3, 1.8)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s2_charge_yield'] = np.clip(event['s2_charge_yield'], 0.3, None)
-        
-        event['interaction_type'] = 'sterile_neutrino_decay'
-        event['particle_source'] = 'sterile_neutrino'
-        event['label'] = 'Sterile-Neutrino'
-        
+        s2 = np.clip(s1 * rng.uniform(0.3, 1.8, size=n), 0.3, None)
+        block['interaction_type'] = _codes(n, INTERACTION_TYPES, 'sterile_neutrino_decay')
+        block['particle_source'] = _codes(n, PARTICLE_SOURCES, 'sterile_neutrino')
+        block['label'] = _codes(n, LABELS, 'Sterile-Neutrino')
+
     elif event_type == 'primordial_BH':
         # Primordial black hole evaporation - high energy with boundary region S2/S1 (4.0-5.0)
-        event['recoil_energy_keV'] = np.random.gamma(shape=2, scale=15)  # Higher energy events
-        event['recoil_energy_keV'] = np.clip(event['recoil_energy_keV'], 10, 200)
-        
+        energy = np.clip(rng.gamma(shape=2, scale=15, size=n), 10, 200)
         # Mixed signature - falls in boundary region (Novel Anomaly)
-        event['s1_light_yield'] = event['recoil_energy_keV'] * np.random.normal(2.0, 0.3)
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 1, None)
-        
-        # S2/S1 in boundary region (4.0 to 5.0) - Novel Anomaly territory
-        target_s2_s1_ratio = np.random.uniform(4.0, 5.0)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s2_charge_yield'] = np.clip(event['s2_charge_yield'], 4, None)
-        
-        event['interaction_type'] = 'black_hole_evaporation'
-        event['particle_source'] = 'primordial_black_hole'
-        event['label'] = 'Novel-Anomaly'  # Changed label to reflect boundary region
-        
+        s1 = np.clip(energy * rng.normal(2.0, 0.3, size=n), 1, None)
+        s2 = np.clip(s1 * rng.uniform(4.0, 5.0, size=n), 4, None)
+        block['interaction_type'] = _codes(n, INTERACTION_TYPES, 'black_hole_evaporation')
+        block['particle_source'] = _codes(n, PARTICLE_SOURCES, 'primordial_black_hole')
+        block['label'] = _codes(n, LABELS, 'Novel-Anomaly')
+
     elif event_type == 'novel_anomaly':
         # Boundary region events - S2/S1 ratio 4.0 to 5.0 (ambiguous territory)
-        event['recoil_energy_keV'] = np.random.uniform(5, 30)  # Variable energy
-        
-        event['s1_light_yield'] = event['recoil_energy_keV'] * np.random.normal(1.8, 0.2)
-        event['s1_light_yield'] = np.clip(event['s1_light_yield'], 1, None)
-        
+        energy = rng.uniform(5, 30, size=n)  # Variable energy
+        s1 = np.clip(energy * rng.normal(1.8, 0.2, size=n), 1, None)
         # Boundary S2/S1 ratio (4.0 to 5.0) - the uncertain region
-        target_s2_s1_ratio = np.random.uniform(4.0, 5.0)
-        event['s2_charge_yield'] = event['s1_light_yield'] * target_s2_s1_ratio
-        event['s2_charge_yield'] = np.clip(event['s2_charge_yield'], 4, None)
-        
-        event['interaction_type'] = 'boundary_region'
-        event['particle_source'] = 'unknown_anomaly'
-        event['label'] = 'Novel-Anomaly'
-
-    # Add realistic detector position (cylindrical coordinates)
-    # Uniform distribution in volume
-    r_max = detector_radius_mm
-    theta = np.random.uniform(0, 2*np.pi)
-    r = r_max * np.sqrt(np.random.uniform(0, 1))  # Uniform in area
-    
-    event['position_x_mm'] = r * np.cos(theta)
-    event['position_y_mm'] = r * np.sin(theta)
-    event['position_z_mm'] = np.random.uniform(-detector_height_mm/2, detector_height_mm/2)
-    
+        s2 = np.clip(s1 * rng.uniform(4.0, 5.0, size=n), 4, None)
+        block['interaction_type'] = _codes(n, INTERACTION_TYPES, 'boundary_region')
+        block['particle_source'] = _codes(n, PARTICLE_SOURCES, 'unknown_anomaly')
+        block['label'] = _codes(n, LABELS, 'Novel-Anomaly')
+
+    else:
+        raise ValueError(f"Unknown event type: {event_type}")
+
+    block['recoil_energy_keV'] = energy
+    block['s1_light_yield'] = s1
+    block['s2_charge_yield'] = s2
+    label = LABELS[block['label'][0]] if n else None
+
+    # Add realistic detector position (cylindrical coordinates, uniform in volume)
+    theta = rng.uniform(0, 2*np.pi, size=n)
+    r = radius * np.sqrt(rng.uniform(0, 1, size=n))  # Uniform in area
+    block['position_x_mm'] = r * np.cos(theta)
+    block['position_y_mm'] = r * np.sin(theta)
+    block['position_z_mm'] = rng.uniform(-height/2, height/2, size=n)
+
     # Calculate drift time from Z position
-    drift_distance = abs(event['position_z_mm'] + detector_height_mm/2)
-    event['drift_time_us'] = drift_distance / drift_velocity_mm_us
-    
+    block['drift_time_us'] = np.abs(block['position_z_mm'] + height/2) / detector['drift_velocity_mm_us']
+
     # Add detector response features
-    event['s1_width_ns'] = np.random.normal(50, 10)  # S1 pulse width
-    event['s2_width_us'] = np.random.normal(2.5, 0.5)  # S2 pulse width
-    
+    block['s1_width_ns'] = rng.normal(50, 10, size=n)  # S1 pulse width
+    block['s2_width_us'] = rng.normal(2.5, 0.5, size=n)  # S2 pulse width
+
     # Energy resolution effects with controlled S2/S1 ratio preservation
-    event['s1_area_PE'] = event['s1_light_yield'] * np.random.normal(1.0, 0.05)  # Reduced noise
-    event['s2_area_PE'] = event['s2_charge_yield'] * np.random.normal(1.0, 0.03)  # Reduced noise
-    
+    s1_area = s1 * rng.normal(1.0, 0.05, size=n)  # Reduced noise
+    s2_area = s2 * rng.normal(1.0, 0.03, size=n)  # Reduced noise
+
     # Ensure S2/S1 ratios stay within target ranges after noise
-    calculated_ratio = event['s2_area_PE'] / max(event['s1_area_PE'], 0.1)
-    
-    # Apply range constraints based on event type to maintain physics accuracy
-    if 'Background' in str(event.get('label', '')):
-        # Background: S2/S1 > 5.0
-        if calculated_ratio < 5.0:
-            event['s2_area_PE'] = event['s1_area_PE'] * np.random.uniform(5.0, 8.0)
-    elif 'WIMP' in str(event.get('label', '')):
-        # WIMP: S2/S1 between 2.0 and 4.0
-        if calculated_ratio < 2.0 or calculated_ratio > 4.0:
-            event['s2_area_PE'] = event['s1_area_PE'] * np.random.uniform(2.0, 4.0)
-    elif 'Axion' in str(event.get('label', '')) or 'Sterile' in str(event.get('label', '')):
-        # Axion/Sterile: S2/S1 < 2.0
-        if calculated_ratio >= 2.0:
-            event['s2_area_PE'] = event['s1_area_PE'] * np.random.uniform(0.5, 1.9)
-    elif 'Novel' in str(event.get('label', '')):
-        # Novel Anomaly: S2/S1 between 4.0 and 5.0
-        if calculated_ratio < 4.0 or calculated_ratio > 5.0:
-            event['s2_area_PE'] = event['s1_area_PE'] * np.random.uniform(4.0, 5.0)
-    
-    # Calculate derived quantities
-    event['s2_over_s1_ratio'] = event['s2_area_PE'] / max(event['s1_area_PE'], 0.1)
-    event['log10_s2_over_s1'] = np.log10(event['s2_over_s1_ratio'])
-    
-    # Add timestamp (events distributed over a year)
-    base_time = datetime(2024, 1, 1)
-    random_days = np.random.uniform(0, 365)
-    event['timestamp'] = base_time + timedelta(days=random_days)
-    
+    if n:
+        calculated_ratio = s2_area / np.maximum(s1_area, 0.1)
+        resample_low, resample_high = S2_S1_BANDS[label][2:]
+        resample = rng.uniform(resample_low, resample_high, size=n)
+        s2_area = np.where(_in_band(calculated_ratio, label), s2_area, s1_area * resample)
+    block['s1_area_PE'] = s1_area
+    block['s2_area_PE'] = s2_area
+    # s2_over_s1_ratio and log10_s2_over_s1 are derived once, after detector effects
+
+    # Timestamps are drawn per shard (event_timestamps), pile-up flags by the coincidence stage
+
     # Add detector conditions (temperature, pressure variations)
-    event['detector_temp_K'] = np.random.normal(175, 1)  # Liquid xenon temperature
-    event['gas_pressure_bar'] = np.random.normal(2.0, 0.1)  # Gas phase pressure
-    event['electric_field_V_cm'] = np.random.normal(200, 20)  # Drift field
-    
+    block['detector_temp_K'] = rng.normal(175, 1, size=n)  # Liquid xenon temperature
+    block['gas_pressure_bar'] = rng.normal(2.0, 0.1, size=n)  # Gas phase pressure
+    block['electric_field_V_cm'] = rng.normal(200, 20, size=n)  # Drift field
+
     # Quality metrics
-    event['event_quality'] = np.random.beta(8, 2)  # Most events high quality
-    event['pile_up_flag'] = np.random.choice([0, 1], p=[0.98, 0.02])  # 2% pile-up events
-    
-    return event
+    block['event_quality'] = rng.beta(8, 2, size=n)  # Most events high quality
 
-# --- Generate the full dataset ---
-np.random.seed(42)  # For reproducibility
-random.seed(42)
+    block.setdefault('wimp_mass_GeV', np.full(n, np.nan))
+    return block
 
-num_events = 50000  # Increased dataset size
-events_list = []
 
-# Define event distribution (physics-based realistic rates)
-event_types = {
-    'background_ER': 0.93,          # 93% background electronic recoils (S2/S1 > 5.0)
-    'wimp_NR': 0.04,               # 4% WIMP candidates (S2/S1: 2.0-4.0)
-    'axion-like': 0.015,           # 1.5% axion-like events (S2/S1 < 2.0)
-    'sterile_neutrino': 0.005,     # 0.5% sterile neutrino candidates (S2/S1 < 2.0)
-    'novel_anomaly': 0.01          # 1% boundary region events (S2/S1: 4.0-5.0)
-}
+def event_timestamps(num_events, first_event_id, trigger_rate_hz, rng=np.random):
+    """Draws the sorted trigger times of consecutively numbered events.
 
-print("Generating synthetic dark matter detection dataset...")
-print(f"Total events: {num_events}")
-
-for i in range(num_events):
-    # Select event type based on realistic probabilities
-    rand_val = np.random.random()
-    cumulative_prob = 0
-    
-    for event_type, prob in event_types.items():
-        cumulative_prob += prob
-        if rand_val <= cumulative_prob:
-            selected_type = event_type
-            break
-    
-    events_list.append(generate_event(selected_type))
-    
-    if (i + 1) % 10000 == 0:
-        print(f"Generated {i + 1} events...")
-
-# Convert to DataFrame
-dataset = pd.DataFrame(events_list)
-
-print("\nDataset Head:")
-print(dataset.head())
-print("\nEvent Type Distribution:")
-print(dataset['label'].value_counts())
-print("\nDataset Shape:", dataset.shape)
-print("\nColumn Names:")
-print(list(dataset.columns))
-# Add realistic detector effects and systematic uncertainties
-print("\nAdding detector effects and systematic uncertainties...")
-
-# Energy-dependent noise
-energy_noise = np.random.normal(0, 0.1 * np.sqrt(dataset['recoil_energy_keV']), size=len(dataset))
-dataset['recoil_energy_keV'] = np.clip(dataset['recoil_energy_keV'] + energy_noise, 0.1, None)
-
-# Position-dependent light collection efficiency
-r_detector = np.sqrt(dataset['position_x_mm']**2 + dataset['position_y_mm']**2)
-light_collection_eff = 1.0 - 0.3 * (r_detector / 500.0)  # Reduced efficiency at edges
-dataset['s1_area_PE'] *= light_collection_eff
-
-# Depth-dependent charge collection (field non-uniformity)
-z_normalized = (dataset['position_z_mm'] + 500) / 1000  # Normalize to [0,1]
-charge_collection_eff = 0.8 + 0.2 * z_normalized  # Better collection at bottom
-dataset['s2_area_PE'] *= charge_collection_eff
-
-# Introduce realistic missing values
-print("Introducing realistic data quality issues...")
-
-# Missing S1 signals (threshold effects) - more likely for low energy events
-s1_threshold_prob = 1.0 / (1.0 + np.exp(5 * (dataset['s1_area_PE'] - 3)))  # Sigmoid
-s1_missing_mask = np.random.random(len(dataset)) < s1_threshold_prob
-dataset.loc[s1_missing_mask, ['s1_light_yield', 's1_area_PE', 's1_width_ns']] = np.nan
-
-# Missing S2 signals (rare but happens)
-s2_missing_indices = dataset.sample(frac=0.001).index  # 0.1% missing S2
-dataset.loc[s2_missing_indices, ['s2_charge_yield', 's2_area_PE', 's2_width_us']] = np.nan
-
-# Position reconstruction failures
-position_fail_indices = dataset.sample(frac=0.005).index  # 0.5% position failures
-dataset.loc[position_fail_indices, ['position_x_mm', 'position_y_mm']] = np.nan
-
-# Recalculate derived quantities with NaN handling
-dataset['s2_over_s1_ratio'] = dataset['s2_area_PE'] / np.maximum(dataset['s1_area_PE'], 0.1)
-dataset['log10_s2_over_s1'] = np.log10(dataset['s2_over_s1_ratio'])
-
-# Final physics-based S2/S1 ratio correction to ensure strict adherence
-print("Applying final physics-based S2/S1 ratio corrections...")
-
-# Background: ensure S2/S1 >= 5.0
-background_mask = dataset['label'] == 'Background'
-low_bg_ratio = background_mask & (dataset['s2_over_s1_ratio'] < 5.0)
-dataset.loc[low_bg_ratio, 's2_area_PE'] = dataset.loc[low_bg_ratio, 's1_area_PE'] * np.random.uniform(5.0, 8.0, size=low_bg_ratio.sum())
-
-# WIMP: ensure 2.0 <= S2/S1 <= 4.0
-wimp_mask = dataset['label'] == 'WIMP-like'
-bad_wimp_ratio = wimp_mask & ((dataset['s2_over_s1_ratio'] < 2.0) | (dataset['s2_over_s1_ratio'] > 4.0))
-dataset.loc[bad_wimp_ratio, 's2_area_PE'] = dataset.loc[bad_wimp_ratio, 's1_area_PE'] * np.random.uniform(2.0, 4.0, size=bad_wimp_ratio.sum())
-
-# Axion/Sterile: ensure S2/S1 < 2.0
-axion_mask = (dataset['label'] == 'Axion-like') | (dataset['label'] == 'Sterile-Neutrino')
-high_axion_ratio = axion_mask & (dataset['s2_over_s1_ratio'] >= 2.0)
-dataset.loc[high_axion_ratio, 's2_area_PE'] = dataset.loc[high_axion_ratio, 's1_area_PE'] * np.random.uniform(0.5, 1.9, size=high_axion_ratio.sum())
-
-# Novel Anomaly: ensure 4.0 <= S2/S1 <= 5.0
-anomaly_mask = dataset['label'] == 'Novel-Anomaly'
-bad_anomaly_ratio = anomaly_mask & ((dataset['s2_over_s1_ratio'] < 4.0) | (dataset['s2_over_s1_ratio'] > 5.0))
-dataset.loc[bad_anomaly_ratio, 's2_area_PE'] = dataset.loc[bad_anomaly_ratio, 's1_area_PE'] * np.random.uniform(4.0, 5.0, size=bad_anomaly_ratio.sum())
-
-# Recalculate ratios after corrections
-dataset['s2_over_s1_ratio'] = dataset['s2_area_PE'] / np.maximum(dataset['s1_area_PE'], 0.1)
-dataset['log10_s2_over_s1'] = np.log10(dataset['s2_over_s1_ratio'])
-
-print("\nFinal Dataset Summary:")
-print(f"Total events: {len(dataset)}")
-print(f"Features per event: {len(dataset.columns)}")
-print(f"Missing values per column:")
-for col in dataset.columns:
-    missing_count = dataset[col].isna().sum()
-    if missing_count > 0:
-        print(f"  {col}: {missing_count} ({missing_count/len(dataset)*100:.2f}%)")
-
-# Display physics-based feature statistics
-print("\nKey Physics Features Summary:")
-print(f"Energy range: {dataset['recoil_energy_keV'].min():.2f} - {dataset['recoil_energy_keV'].max():.2f} keV")
-print(f"S2/S1 ratio range: {dataset['s2_over_s1_ratio'].min():.2f} - {dataset['s2_over_s1_ratio'].max():.2f}")
-print(f"Log10(S2/S1) range: {dataset['log10_s2_over_s1'].min():.2f} - {dataset['log10_s2_over_s1'].max():.2f}")
-
-# Show discrimination power between signal and background
-print("\nPhysics-Based S2/S1 Ratio Validation:")
-background_data = dataset[dataset['label'] == 'Background']
-wimp_data = dataset[dataset['label'] == 'WIMP-like']
-axion_data = dataset[dataset['label'] == 'Axion-like']
-anomaly_data = dataset[dataset['label'] == 'Novel-Anomaly']
-
-print(f"Background (ER) S2/S1 range: {background_data['s2_over_s1_ratio'].min():.2f} - {background_data['s2_over_s1_ratio'].max():.2f} (target: > 5.0)")
-print(f"WIMP (NR) S2/S1 range: {wimp_data['s2_over_s1_ratio'].min():.2f} - {wimp_data['s2_over_s1_ratio'].max():.2f} (target: 2.0-4.0)")
-print(f"Axion S2/S1 range: {axion_data['s2_over_s1_ratio'].min():.2f} - {axion_data['s2_over_s1_ratio'].max():.2f} (target: < 2.0)")
-if len(anomaly_data) > 0:
-    print(f"Novel Anomaly S2/S1 range: {anomaly_data['s2_over_s1_ratio'].min():.2f} - {anomaly_data['s2_over_s1_ratio'].max():.2f} (target: 4.0-5.0)")
-
-print(f"\nEnergy Ranges:")
-print(f"Background energy median: {background_data['recoil_energy_keV'].median():.2f} keV")
-print(f"WIMP energy median: {wimp_data['recoil_energy_keV'].median():.2f} keV")
-print(f"Axion energy median: {axion_data['recoil_energy_keV'].median():.2f} keV")
-
-# Save the enhanced dataset
-print("\nSaving enhanced synthetic dark matter dataset...")
-
-# Ensure dataset directory exists
-import os
-os.makedirs('dataset', exist_ok=True)
-
-# Save to CSV with proper formatting
-dataset.to_csv('dataset/dark_matter_synthetic_dataset.csv', index=False, float_format='%.6f')
-
-# Save to JSON with proper formatting
-dataset_json = dataset.copy()
-# Convert timestamps to ISO format for JSON (safe conversion)
-dataset_json['timestamp'] = dataset_json['timestamp'].apply(lambda t: t.isoformat() if hasattr(t, 'isoformat') else str(t))
-# Replace NaN/NaT with None so json.dump doesn't choke
-dataset_json = dataset_json.where(pd.notnull(dataset_json), None)
-import json
-with open('dataset/dark_matter_synthetic_dataset.json', 'w', encoding='utf-8') as f:
-    json.dump(dataset_json.to_dict(orient='records'), f, indent=2, ensure_ascii=False)
-
-# Create a metadata file with dataset information
-metadata = {
-    "dataset_name": "Synthetic Dark Matter Detection Dataset",
-    "creation_date": datetime.now().isoformat(),
-    "total_events": int(len(dataset)),
-    "event_types": {k: int(v) for k, v in dataset['label'].value_counts().items()},
-    "features": {
-        "energy_features": ["recoil_energy_keV"],
-        "light_features": ["s1_light_yield", "s1_area_PE", "s1_width_ns"],
-        "charge_features": ["s2_charge_yield", "s2_area_PE", "s2_width_us"],
-        "position_features": ["position_x_mm", "position_y_mm", "position_z_mm"],
-        "derived_features": ["s2_over_s1_ratio", "log10_s2_over_s1", "drift_time_us"],
-        "detector_features": ["detector_temp_K", "gas_pressure_bar", "electric_field_V_cm"],
-        "quality_features": ["event_quality", "pile_up_flag"]
-    },
-    "physics_parameters": {
-        "detector_radius_mm": 500,
-        "detector_height_mm": 1000,
-        "drift_velocity_mm_us": 1.33,
-        "er_light_yield_pe_kev": 2.5,
-        "nr_light_yield_pe_kev": 0.1,
-        "er_charge_yield_e_kev": 50,
-        "nr_charge_yield_e_kev": 2
-    },
-    "data_quality": {
-        "missing_s1_events": int(dataset['s1_area_PE'].isna().sum()),
-        "missing_s2_events": int(dataset['s2_area_PE'].isna().sum()),
-        "missing_position_events": int(dataset['position_x_mm'].isna().sum()),
-        "pile_up_events": int(dataset['pile_up_flag'].sum())
+    Triggers form a Poisson process at trigger_rate_hz: given its event count,
+    the window of event first_event_id onwards, starting at first_event_id /
+    rate seconds and lasting num_events / rate seconds, holds sorted uniform
+    times. Shards therefore tile the run in event_id order.
+    """
+    start_us = first_event_id / trigger_rate_hz * 1e6
+    duration_us = num_events / trigger_rate_hz * 1e6
+    offsets = np.sort(rng.uniform(start_us, start_us + duration_us, size=num_events))
+    return RUN_START + offsets.astype('timedelta64[us]')
+
+
+def generate_events(num_events, event_types, rng=np.random, first_event_id=0,
+                    detector=DEFAULT_DETECTOR_PARAMS, weights=None, class_counts=None,
+                    trigger_rate_hz=DEFAULT_TRIGGER_RATE_HZ):
+    """Generates a mixed set of raw events with one multinomial draw for the class counts.
+
+    Each class is generated as a single vectorized block and scattered into
+    random rows, so the event types stay interleaved as in a real data stream.
+    Events are numbered consecutively from first_event_id. Returns a dict of
+    column arrays (string columns as category codes) for apply_detector_effects().
+
+    class_counts fixes the number of events per type instead of drawing it,
+    and weights gives each type's statistical weight (default 1.0). Event
+    times follow event_id at trigger_rate_hz; pile_up_flag and
+    coincidence_group are left for the coincidence stage.
+    """
+    if class_counts is None:
+        class_counts = rng.multinomial(num_events, list(event_types.values()))
+    rows = np.split(rng.permutation(num_events), np.cumsum(class_counts)[:-1])
+
+    columns = {'event_id': np.arange(first_event_id, first_event_id + num_events, dtype=np.int64),
+               'weight': np.ones(num_events),
+               'timestamp': event_timestamps(num_events, first_event_id, trigger_rate_hz, rng),
+               'pile_up_flag': np.zeros(num_events, dtype=np.uint8),
+               'coincidence_group': np.full(num_events, -1, dtype=np.int64)}
+    for event_type, count, block_rows in zip(event_types, class_counts, rows):
+        block = generate_event_block(event_type, count, rng, detector)
+        for col, values in block.items():
+            if col not in columns:
+                columns[col] = np.empty(num_events, dtype=values.dtype)
+            columns[col][block_rows] = values
+        if weights is not None:
+            columns['weight'][block_rows] = weights[event_type]
+    return columns
+
+
+def events_to_frame(columns):
+    """Builds the dataset DataFrame in the compact dataset_io.EVENT_SCHEMA.
+
+    Physics columns are computed in float64 and stored as float32; string
+    columns become categoricals over their fixed category lists.
+    """
+    columns = dict(columns)
+    names = EVENT_COLUMNS + [col for col in dataset_io.RECO_COLUMNS if col in columns]
+    for col in names:
+        dtype = dataset_io.EVENT_SCHEMA[col]
+        if col in CATEGORICAL_COLUMNS:
+            columns[col] = pd.Categorical.from_codes(columns[col], dtype=dtype)
+        else:
+            columns[col] = columns[col].astype(dtype, copy=False)
+    return pd.DataFrame(columns, columns=names, copy=False)
+
+
+def apply_detector_effects(columns, rng=np.random, detector=DEFAULT_DETECTOR_PARAMS, response_maps=None):
+    """Adds detector effects, data quality issues and final S2/S1 corrections in place.
+
+    Works on the column arrays of one event block in a single pass: each
+    correction touches only the affected rows, and s2_over_s1_ratio and
+    log10_s2_over_s1 are computed once at the end. Position effects come from
+    response_maps (default: detector_response.build_default_maps(detector)).
+    """
+    n = len(columns['event_id'])
+    maps = response_maps or detector_response.build_default_maps(detector)
+    x, y, z = columns['position_x_mm'], columns['position_y_mm'], columns['position_z_mm']
+    energy = columns['recoil_energy_keV']
+    s1, s2 = columns['s1_area_PE'], columns['s2_area_PE']
+
+    # Energy-dependent noise
+    energy += rng.normal(0, 0.1 * np.sqrt(energy), size=n)
+    np.clip(energy, 0.1, None, out=energy)
+
+    # Position-dependent light collection (reduced at the edges) and charge
+    # collection (field non-uniformity), looked up in the response maps
+    s1 *= detector_response.s1_response(maps, x, y, z)
+    s2 *= detector_response.s2_response(maps, x, y, z)
+
+    # Introduce realistic missing values
+    # Missing S1 signals (threshold effects) - more likely for low energy events
+    with np.errstate(over='ignore'):
+        s1_threshold_prob = 1.0 / (1.0 + np.exp(5 * (s1 - 3)))  # Sigmoid
+    s1_missing = rng.random(n) < s1_threshold_prob
+    for col in ('s1_light_yield', 's1_area_PE', 's1_width_ns'):
+        columns[col][s1_missing] = np.nan
+
+    # Missing S2 signals (rare but happens): 0.1% of events
+    s2_missing = rng.choice(n, size=round(0.001 * n), replace=False)
+    for col in ('s2_charge_yield', 's2_area_PE', 's2_width_us'):
+        columns[col][s2_missing] = np.nan
+
+    # Position reconstruction failures: 0.5% of events
+    position_fail = rng.choice(n, size=round(0.005 * n), replace=False)
+    x[position_fail] = np.nan
+    y[position_fail] = np.nan
+
+    # Final physics-based S2/S1 correction: events outside their label's band
+    # are resampled inside it (background >= 5, WIMP 2-4, axion/sterile < 2,
+    # novel anomaly 4-5); events with a missing S1 or S2 keep their NaN ratio
+    ratio = s2 / np.maximum(s1, 0.1)
+    bad = np.flatnonzero(_out_of_band(ratio, columns['label']))
+    bands = _BAND_TABLE[columns['label'][bad]]
+    s2[bad] = s1[bad] * rng.uniform(bands[:, 2], bands[:, 3])
+    ratio[bad] = s2[bad] / np.maximum(s1[bad], 0.1)
+
+    columns['s2_over_s1_ratio'] = ratio
+    columns['log10_s2_over_s1'] = np.log10(ratio)
+    return columns
+
+
+def shard_seed(seed, shard_index):
+    """Returns the SeedSequence of one shard: the shard_index-th child of SeedSequence(seed)."""
+    return np.random.SeedSequence(seed, spawn_key=(shard_index,))
+
+
+def apply_waveform_tier(columns, rng, waveform_dir=None, part_index=0):
+    """Adds the S1/S2 areas and widths reconstructed from simulated traces.
+
+    The traces are stored under waveform_dir when given (see waveforms.py).
+    The reconstructed values go to the dataset_io.RECO_COLUMNS; the generated
+    areas, widths and S2/S1 ratio, whose class bands the labels rely on, are
+    left unchanged.
+    """
+    waveform_tier.simulate_and_reduce(columns, rng, waveform_dir, part_index)
+    return columns
+
+
+def generate_shard(num_events, seed_sequence, event_types, first_event_id=0,
+                   detector=DEFAULT_DETECTOR_PARAMS, weights=None, class_counts=None,
+                   waveforms=False, waveform_dir=None, part_index=0, response_maps=None,
+                   trigger_rate_hz=DEFAULT_TRIGGER_RATE_HZ):
+    """Generates one shard, detector effects included, from its own independent Generator.
+
+    With waveforms the shard also goes through the waveform tier, its traces
+    stored as part part_index under waveform_dir.
+    """
+    rng = np.random.Generator(np.random.PCG64(seed_sequence))
+    events = generate_events(num_events, event_types, rng, first_event_id, detector,
+                             weights, class_counts, trigger_rate_hz)
+    events = apply_detector_effects(events, rng, detector, response_maps)
+    if waveforms:
+        events = apply_waveform_tier(events, rng, waveform_dir, part_index)
+    return events_to_frame(events)
+
+
+def shard_sizes(num_events, num_shards):
+    """Splits num_events into num_shards near-equal shard sizes."""
+    return [num_events // num_shards + (i < num_events % num_shards) for i in range(num_shards)]
+
+
+def split_class_counts(class_totals, num_shards):
+    """Splits exact per-type totals across shards; returns one count list per shard."""
+    per_type = [shard_sizes(total, num_shards) for total in class_totals]
+    return [list(counts) for counts in zip(*per_type)]
+
+
+def iter_shards(sizes, event_types, seed=42, workers=1, detector=DEFAULT_DETECTOR_PARAMS,
+                weights=None, class_counts=None, first_shard=0, first_event_id=0,
+                waveforms=False, waveform_dir=None, response_maps=None,
+                trigger_rate_hz=DEFAULT_TRIGGER_RATE_HZ):
+    """Yields generated shards in shard order.
+
+    With several workers at most 2 * workers shards are in flight at a time,
+    so memory stays bounded by the shard size rather than the event count.
+    class_counts optionally fixes the per-type counts of each shard. Shards
+    are numbered from first_shard and events from first_event_id, so a run
+    can continue the seed streams and numbering of an earlier one.
+    waveforms runs every shard through the waveform tier; response_maps
+    replaces the default detector response maps. Shards cover consecutive
+    time windows of the run at trigger_rate_hz.
+    """
+    first_ids = first_event_id + np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(int)
+    shard_counts = class_counts or [None] * len(sizes)
+    if workers <= 1 or len(sizes) <= 1:
+        for i, size in enumerate(sizes):
+            yield generate_shard(size, shard_seed(seed, first_shard + i), event_types, first_ids[i],
+                                 detector, weights, shard_counts[i], waveforms, waveform_dir,
+                                 first_shard + i, response_maps, trigger_rate_hz)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for i, size in enumerate(sizes):
+            pending.append(pool.submit(generate_shard, size, shard_seed(seed, first_shard + i), event_types,
+                                       first_ids[i], detector, weights, shard_counts[i], waveforms,
+                                       waveform_dir, first_shard + i, response_maps, trigger_rate_hz))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_events_sharded(num_events, event_types, seed=42, num_shards=1, workers=1,
+                            detector=DEFAULT_DETECTOR_PARAMS,
+                            coincidence_window_us=coincidence.DEFAULT_WINDOW_US):
+    """Splits the event count across shards and generates them on a process pool.
+
+    Shard i always draws from shard_seed(seed, i) and the shards are merged in
+    shard order, so a given seed and shard count give byte-identical output
+    no matter how many worker processes are used. The events are spread over
+    a year and run through the coincidence stage.
+    """
+    shards = iter_shards(shard_sizes(num_events, num_shards), event_types, seed, workers, detector,
+                         trigger_rate_hz=num_events / SECONDS_PER_YEAR)
+    return coincidence.apply_coincidences(pd.concat(list(shards), ignore_index=True),
+                                          coincidence_window_us)
+
+
+class DatasetWriter:
+    """Writes the requested output formats chunk by chunk.
+
+    Parquet gets one compressed part file per chunk, while CSV and JSON Lines
+    are appended to, so no format needs the whole dataset in memory. With
+    append=True existing files are extended: new Parquet parts are numbered
+    after the existing ones and nothing already written is touched.
+    partition_by='month' splits the Parquet output into month=YYYY-MM/
+    directories; the event index and per-file statistics are kept up to date.
+    """
+
+    def __init__(self, paths, formats, append=False, partition_by=None):
+        self.paths = paths
+        self.formats = formats
+        self.append = append
+        self.partition_by = partition_by
+        self.partition_stats = []
+        self.num_events = 0
+        self.num_parts = 0
+        if 'parquet' in formats:
+            if append:
+                self.num_parts = dataset_io.next_part_index(paths['parquet'])
+            else:
+                dataset_io.clear_parquet_dataset(paths['parquet'])
+        if 'jsonl' in formats:
+            self._jsonl = open(paths['jsonl'], 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, chunk):
+        if 'parquet' in self.formats:
+            self.partition_stats += dataset_io.write_parquet_part(
+                chunk, self.paths['parquet'], self.num_parts, partition_by=self.partition_by)
+        if 'csv' in self.formats:
+            first_write = self.num_events == 0 and not self.append
+            chunk.to_csv(self.paths['csv'], mode='w' if first_write else 'a',
+                         header=first_write, index=False, float_format='%.6f')
+        if 'jsonl' in self.formats:
+            dataset_io.write_jsonl_chunk(chunk, self._jsonl)
+        self.num_events += len(chunk)
+        self.num_parts += 1
+
+    def close(self):
+        if 'parquet' in self.formats:
+            dataset_io.write_partition_stats(self.paths['parquet'], self.partition_stats, self.append)
+        if 'jsonl' in self.formats:
+            self._jsonl.close()
+
+
+def new_event_counts():
+    """Returns empty counters for the dataset_metadata.json event and quality counts."""
+    return {
+        "total_events": 0,
+        "event_types": Counter(),
+        "physical_event_types": Counter(),
+        "data_quality": Counter({
+            "missing_s1_events": 0,
+            "missing_s2_events": 0,
+            "missing_position_events": 0,
+            "pile_up_events": 0
+        })
     }
-}
 
-import json
-with open('dataset/dataset_metadata.json', 'w') as f:
-    json.dump(metadata, f, indent=2)
 
-print("Dataset saved successfully!")
-print(f"Files created in dataset/ folder:")
-print(f"  - dataset/dark_matter_synthetic_dataset.csv ({len(dataset)} events)")
-print(f"  - dataset/dark_matter_synthetic_dataset.json ({len(dataset)} events)")
-print(f"  - dataset/dataset_metadata.json (dataset information)")
-print(f"\nDataset ready for machine learning analysis!")
\ No newline at end of file
+def counts_from_metadata(metadata):
+    """Rebuilds the running counters from an existing dataset_metadata.json."""
+    counts = new_event_counts()
+    counts["total_events"] = metadata["total_events"]
+    counts["event_types"].update(metadata.get("event_types", {}))
+    counts["physical_event_types"].update(
+        metadata.get("physical_event_types", metadata.get("event_types", {})))
+    counts["data_quality"].update(metadata.get("data_quality", {}))
+    return counts
+
+
+def update_event_counts(counts, chunk):
+    """Adds the event and data quality counts of one chunk to the running counters."""
+    counts["total_events"] += len(chunk)
+    counts["event_types"].update({k: int(v) for k, v in chunk['label'].value_counts().items() if v > 0})
+    weighted = chunk.groupby('label', observed=True)['weight'].sum(min_count=1)
+    counts["physical_event_types"].update({k: float(v) for k, v in weighted.items()})
+    counts["data_quality"].update({
+        "missing_s1_events": int(chunk['s1_area_PE'].isna().sum()),
+        "missing_s2_events": int(chunk['s2_area_PE'].isna().sum()),
+        "missing_position_events": int(chunk['position_x_mm'].isna().sum()),
+        "pile_up_events": int(chunk['pile_up_flag'].sum())
+    })
+    if 's1_area_reco_PE' in chunk.columns:
+        # Pulses the waveform tier's pulse finder did not find (see waveforms.py)
+        counts["data_quality"].update({
+            "missing_s1_reco_events": int(chunk['s1_area_reco_PE'].isna().sum()),
+            "missing_s2_reco_events": int(chunk['s2_area_reco_PE'].isna().sum()),
+        })
+    return counts
+
+
+def build_metadata(counts, generation, detector=DEFAULT_DETECTOR_PARAMS):
+    """Creates the dataset_metadata.json content from accumulated counts."""
+    return {
+        "dataset_name": "Synthetic Dark Matter Detection Dataset",
+        "creation_date": datetime.now().isoformat(),
+        "total_events": counts["total_events"],
+        "event_types": dict(counts["event_types"].most_common()),
+        # Sums of the weight column: the class mixture the events represent
+        "physical_event_types": {k: round(v, 2) for k, v in counts["physical_event_types"].most_common()},
+        "features": {
+            "energy_features": ["recoil_energy_keV"],
+            "light_features": ["s1_light_yield", "s1_area_PE", "s1_width_ns"],
+            "charge_features": ["s2_charge_yield", "s2_area_PE", "s2_width_us"],
+            "position_features": ["position_x_mm", "position_y_mm", "position_z_mm"],
+            "derived_features": ["s2_over_s1_ratio", "log10_s2_over_s1", "drift_time_us"],
+            "detector_features": ["detector_temp_K", "gas_pressure_bar", "electric_field_V_cm"],
+            "quality_features": ["event_quality", "pile_up_flag"],
+            "weight_features": ["weight"]
+        },
+        "physics_parameters": {
+            "detector_radius_mm": detector['radius_mm'],
+            "detector_height_mm": detector['height_mm'],
+            "drift_velocity_mm_us": detector['drift_velocity_mm_us'],
+            "er_light_yield_pe_kev": 2.5,
+            "nr_light_yield_pe_kev": 0.1,
+            "er_charge_yield_e_kev": 50,
+            "nr_charge_yield_e_kev": 2
+        },
+        "generation": generation,
+        "data_quality": dict(counts["data_quality"])
+    }
+
+
+def print_dataset_summary(dataset):
+    """Prints the in-memory dataset summary and S2/S1 band validation."""
+    print("\nDataset Head:")
+    print(dataset.head())
+    print("\nEvent Type Distribution:")
+    print(dataset['label'].value_counts())
+    print("\nDataset Shape:", dataset.shape)
+    print("\nColumn Names:")
+    print(list(dataset.columns))
+
+    print("\nFinal Dataset Summary:")
+    print(f"Total events: {len(dataset)}")
+    print(f"Features per event: {len(dataset.columns)}")
+    print(f"Missing values per column:")
+    for col in dataset.columns:
+        missing_count = dataset[col].isna().sum()
+        if missing_count > 0:
+            print(f"  {col}: {missing_count} ({missing_count/len(dataset)*100:.2f}%)")
+
+    # Display physics-based feature statistics
+    print("\nKey Physics Features Summary:")
+    print(f"Energy range: {dataset['recoil_energy_keV'].min():.2f} - {dataset['recoil_energy_keV'].max():.2f} keV")
+    print(f"S2/S1 ratio range: {dataset['s2_over_s1_ratio'].min():.2f} - {dataset['s2_over_s1_ratio'].max():.2f}")
+    print(f"Log10(S2/S1) range: {dataset['log10_s2_over_s1'].min():.2f} - {dataset['log10_s2_over_s1'].max():.2f}")
+
+    # Show discrimination power between signal and background
+    print("\nPhysics-Based S2/S1 Ratio Validation:")
+    background_data = dataset[dataset['label'] == 'Background']
+    wimp_data = dataset[dataset['label'] == 'WIMP-like']
+    axion_data = dataset[dataset['label'] == 'Axion-like']
+    anomaly_data = dataset[dataset['label'] == 'Novel-Anomaly']
+
+    print(f"Background (ER) S2/S1 range: {background_data['s2_over_s1_ratio'].min():.2f} - {background_data['s2_over_s1_ratio'].max():.2f} (target: > 5.0)")
+    print(f"WIMP (NR) S2/S1 range: {wimp_data['s2_over_s1_ratio'].min():.2f} - {wimp_data['s2_over_s1_ratio'].max():.2f} (target: 2.0-4.0)")
+    print(f"Axion S2/S1 range: {axion_data['s2_over_s1_ratio'].min():.2f} - {axion_data['s2_over_s1_ratio'].max():.2f} (target: < 2.0)")
+    if len(anomaly_data) > 0:
+        print(f"Novel Anomaly S2/S1 range: {anomaly_data['s2_over_s1_ratio'].min():.2f} - {anomaly_data['s2_over_s1_ratio'].max():.2f} (target: 4.0-5.0)")
+
+    print(f"\nEnergy Ranges:")
+    print(f"Background energy median: {background_data['recoil_energy_keV'].median():.2f} keV")
+    print(f"WIMP energy median: {wimp_data['recoil_energy_keV'].median():.2f} keV")
+    print(f"Axion energy median: {axion_data['recoil_energy_keV'].median():.2f} keV")
+
+
+@dataclass
+class GenerationResult:
+    """What generate_dataset() produced.
+
+    events is None when the dataset was streamed to disk in chunks; paths
+    lists the files written (empty when no output directory was given).
+    """
+    events: Optional[pd.DataFrame]
+    metadata: dict
+    paths: Dict[str, str] = field(default_factory=dict)
+
+
+def count_coincidence_groups(output):
+    """Number of coincidence groups in an existing dataset (for metadata that lacks the count)."""
+    path = dataset_io.find_dataset(output)
+    if path is None or 'coincidence_group' not in dataset_io.dataset_columns(path):
+        raise ValueError(f"The dataset in {output} predates coincidence groups; "
+                         "regenerate it with main.py before appending")
+    groups = dataset_io.load_dataset(path, columns=['coincidence_group'])['coincidence_group']
+    return int(groups.max()) + 1 if len(groups) else 0
+
+
+def resolve_class_fractions(class_fractions=None):
+    """Validates event type fractions and normalizes them to sum to 1."""
+    fractions = dict(DEFAULT_CLASS_FRACTIONS if class_fractions is None else class_fractions)
+    unknown = set(fractions) - set(EVENT_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown event type(s): {', '.join(sorted(unknown))}; expected {EVENT_TYPES}")
+    total = sum(fractions.values())
+    if total <= 0 or any(f < 0 for f in fractions.values()):
+        raise ValueError("Class fractions must be non-negative and not all zero")
+    return {event_type: f / total for event_type, f in fractions.items()}
+
+
+def _apportion(total, fractions):
+    """Splits an integer total in proportion to fractions (largest remainder)."""
+    raw = np.asarray(fractions, dtype=float) / sum(fractions) * total
+    counts = np.floor(raw).astype(int)
+    counts[np.argsort(counts - raw)[:total - counts.sum()]] += 1
+    return [int(c) for c in counts]
+
+
+def plan_sampling(n_events, fractions, enrichment=None, class_targets=None):
+    """
+    Chooses how many events of each type to generate when rare classes are oversampled.
+
+    Args:
+        n_events: Total number of events to generate
+        fractions: Physical event type fractions (summing to 1)
+        enrichment: Event type -> factor its sampling fraction is multiplied by
+        class_targets: Event type -> exact number of events; the remaining
+                       events are shared by the other types in physical proportion
+
+    Returns (sampling_fractions, weights, class_totals). weights maps each type
+    to physical / sampled fraction (None when sampling is physical), and
+    class_totals lists the exact per-type totals when targets were given.
+    """
+    if enrichment and class_targets:
+        raise ValueError("Use either enrichment factors or class targets, not both")
+    for name, values in (('enrichment factor', enrichment), ('class target', class_targets)):
+        unknown = set(values or {}) - set(fractions)
+        if unknown:
+            raise ValueError(f"{name.capitalize()} for event type(s) not in the class fractions: "
+                             f"{', '.join(sorted(unknown))}")
+        if any(v < 0 for v in (values or {}).values()):
+            raise ValueError(f"Each {name} must be non-negative")
+
+    class_totals = None
+    if class_targets:
+        remaining = n_events - sum(class_targets.values())
+        others = [t for t in fractions if t not in class_targets]
+        if remaining < 0 or (remaining and not sum(fractions[t] for t in others)):
+            raise ValueError(f"Class targets sum to {sum(class_targets.values())}, "
+                             f"which cannot be reconciled with {n_events} events")
+        shared = _apportion(remaining, [fractions[t] for t in others]) if remaining else [0] * len(others)
+        totals = {**dict(zip(others, shared)), **class_targets}
+        class_totals = [int(totals[t]) for t in fractions]
+        sampling = {t: c / n_events for t, c in zip(fractions, class_totals)}
+    elif enrichment:
+        scaled = {t: f * enrichment.get(t, 1.0) for t, f in fractions.items()}
+        sampling = {t: f / sum(scaled.values()) for t, f in scaled.items()}
+    else:
+        return fractions, None, None
+
+    weights = {t: fractions[t] / sampling[t] if sampling[t] else 0.0 for t in fractions}
+    return sampling, weights, class_totals
+
+
+def resolve_detector_params(detector_params=None):
+    """Fills in missing detector parameters from DEFAULT_DETECTOR_PARAMS."""
+    unknown = set(detector_params or {}) - set(DEFAULT_DETECTOR_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown detector parameter(s): {', '.join(sorted(unknown))}")
+    return {**DEFAULT_DETECTOR_PARAMS, **(detector_params or {})}
+
+
+def _same_fractions(a, b):
+    return set(a) == set(b) and all(np.isclose(a[t], b[t]) for t in a)
+
+
+def inherited_settings(previous, n_events, class_fractions=None, detector_params=None,
+                     enrichment=None, class_targets=None):
+    """
+    Takes the class fractions, detector and sampling plan of an existing dataset for an append.
+
+    Returns (class_fractions, detector_params, sampling) from the dataset
+    metadata, where sampling is its {"mode", "sampled_fractions", "weights"}
+    entry. Values passed by the caller must agree with the dataset: a batch
+    with another mixture or detector would silently change what the weights
+    and the physics parameters in the metadata describe.
+    """
+    generation = previous['generation']
+    fractions = resolve_class_fractions(generation.get('class_fractions'))
+    physics = previous.get('physics_parameters', {})
+    detector = resolve_detector_params({
+        param: physics[key] for param, key in (('radius_mm', 'detector_radius_mm'),
+                                               ('height_mm', 'detector_height_mm'),
+                                               ('drift_velocity_mm_us', 'drift_velocity_mm_us'))
+        if key in physics})
+    sampling = generation.get('sampling') or {'mode': 'physical', 'sampled_fractions': fractions,
+                                              'weights': {t: 1.0 for t in fractions}}
+
+    if class_fractions is not None and not _same_fractions(resolve_class_fractions(class_fractions), fractions):
+        raise ValueError("The class fractions differ from those of the dataset being appended to")
+    if detector_params is not None and resolve_detector_params(detector_params) != detector:
+        raise ValueError("The detector parameters differ from those of the dataset being appended to")
+    if enrichment or class_targets:
+        planned = plan_sampling(n_events, fractions, enrichment, class_targets)[0]
+        if not _same_fractions(planned, sampling['sampled_fractions']):
+            raise ValueError(f"The {'class targets' if class_targets else 'enrichment'} would change the "
+                             f"sampling plan of the dataset being appended to ({sampling['mode']} sampling)")
+    return fractions, detector, sampling
+
+
+def resolve_formats(formats):
+    """Validates output formats, falling back to CSV when pyarrow is missing."""
+    formats = [f.strip() for f in formats if f.strip()]
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {', '.join(sorted(unknown))}")
+    if 'parquet' in formats and not dataset_io.PARQUET_AVAILABLE:
+        print("Warning: pyarrow is not installed, writing CSV instead of Parquet")
+        formats = ['csv' if f == 'parquet' else f for f in formats]
+    return list(dict.fromkeys(formats))
+
+
+def generate_dataset(n_events: int = 50000, seed: int = 42,
+                     class_fractions: Optional[Dict[str, float]] = None,
+                     detector_params: Optional[Dict[str, float]] = None,
+                     output: Optional[str] = None,
+                     formats: Iterable[str] = ('parquet', 'jsonl'),
+                     num_shards: int = 1, chunk_size: Optional[int] = None,
+                     workers: int = 1, verbose: bool = False,
+                     enrichment: Optional[Dict[str, float]] = None,
+                     class_targets: Optional[Dict[str, int]] = None,
+                     append: bool = False,
+                     partition_by: Optional[str] = None,
+                     waveforms: bool = False,
+                     response_maps: Optional[str] = None,
+                     trigger_rate_hz: Optional[float] = None,
+                     coincidence_window_us: float = coincidence.DEFAULT_WINDOW_US) -> GenerationResult:
+    """
+    Generates the synthetic dataset in memory and optionally writes it to disk.
+
+    Args:
+        n_events: Number of events to generate
+        seed: Master seed; shard i draws from shard_seed(seed, i)
+        class_fractions: Event type -> fraction (default: DEFAULT_CLASS_FRACTIONS),
+                         normalized to sum to 1
+        detector_params: Overrides of DEFAULT_DETECTOR_PARAMS
+        output: Directory to write the dataset and dataset_metadata.json to
+                (default: nothing is written)
+        formats: Output formats when writing, any of OUTPUT_FORMATS
+        num_shards: Number of independently seeded shards
+        chunk_size: With an output directory, generate and write chunks of this
+                    size one at a time instead of holding the whole dataset
+        workers: Worker processes used to generate shards
+        verbose: Print progress while streaming
+        enrichment: Oversample event types by these factors (see plan_sampling)
+        class_targets: Generate exactly this many events of the given types
+        append: Add n_events to the dataset already in `output` instead of
+                replacing it (see below)
+        partition_by: 'month' to partition the Parquet output by month of timestamp
+        waveforms: Derive the S1/S2 areas and widths from simulated pulse
+                   traces (see waveforms.py); with an output directory the
+                   traces are kept as .npy memory maps in <output>/waveforms/
+        response_maps: .npz file of measured detector response maps (see
+                       detector_response.py; default: maps built from the
+                       detector geometry). The maps used are saved as
+                       <output>/detector_response.npz for the consumers.
+        trigger_rate_hz: Mean event rate; event times form a Poisson process
+                         from RUN_START at this rate (default: n_events
+                         spread over a year; a detector-like 10 Hz gives
+                         about 2% pile-up)
+        coincidence_window_us: Events closer in time than this share a
+                               coincidence_group and get pile_up_flag set
+
+    The same seed, class fractions, detector parameters and shard layout
+    always give the same events, whatever the number of workers. When rare
+    types are oversampled, the weight column carries physical / sampled
+    fraction per event, so weighted counts reproduce the physical mixture.
+
+    In append mode the seed, formats, partitioning, waveform tier, response maps,
+    trigger rate, coincidence window, class fractions, sampling plan, detector
+    parameters and shard/event numbering come from the existing
+    dataset_metadata.json (see inherited_settings; class fractions, enrichment,
+    class targets or detector parameters that disagree with it raise
+    ValueError): the new shards continue its seed streams,
+    new events continue its event_ids, new Parquet parts are added next to
+    the old ones and the metadata counters are merged. Only the new events
+    are generated (and returned in events).
+    """
+    previous = None
+    first_shard = first_event_id = first_group = 0
+    if append:
+        if output is None:
+            raise ValueError("Appending needs the output directory of an existing dataset")
+        previous = dataset_io.read_metadata(output)
+        if previous is None or 'generation' not in previous:
+            raise ValueError(f"No dataset metadata with generation settings in {output}; "
+                             "generate the dataset with main.py before appending")
+        seed = previous['generation']['seed']
+        formats = previous['generation']['formats']
+        partition_by = previous['generation'].get('partition_by')
+        waveforms = previous['generation'].get('waveforms') is not None
+        response_maps = os.path.join(output, detector_response.RESPONSE_MAPS_NAME)
+        trigger_rate_hz = previous['generation'].get('trigger_rate_hz') or DEFAULT_TRIGGER_RATE_HZ
+        previous_coincidence = previous['generation'].get('coincidence') or {}
+        coincidence_window_us = previous_coincidence.get('window_us', coincidence_window_us)
+        first_shard = previous['generation']['num_shards']
+        first_event_id = previous['total_events']
+        first_group = previous_coincidence.get('num_groups')
+        if first_group is None:
+            first_group = count_coincidence_groups(output)
+        class_fractions, detector_params, inherited_sampling = inherited_settings(
+            previous, n_events, class_fractions, detector_params, enrichment, class_targets)
+
+    if partition_by is not None and partition_by not in dataset_io.PARTITIONINGS:
+        raise ValueError(f"Unknown partitioning {partition_by!r}; expected one of {dataset_io.PARTITIONINGS}")
+    if trigger_rate_hz is None:
+        trigger_rate_hz = n_events / SECONDS_PER_YEAR
+    if trigger_rate_hz <= 0:
+        raise ValueError("The trigger rate must be positive")
+    event_types = resolve_class_fractions(class_fractions)
+    detector = resolve_detector_params(detector_params)
+    if response_maps is not None and os.path.exists(response_maps):
+        maps = detector_response.load_maps(response_maps)
+    elif response_maps is not None and not append:
+        raise ValueError(f"Response map file {response_maps} not found")
+    else:
+        maps = detector_response.build_default_maps(detector)
+    if append:
+        sampling_mode = inherited_sampling['mode']
+        sampling = inherited_sampling['sampled_fractions']
+        weights = inherited_sampling['weights'] if sampling_mode != 'physical' else None
+        # Exact class targets keep their proportions in the new batch
+        class_totals = (_apportion(n_events, [sampling[t] for t in event_types])
+                        if sampling_mode == 'targets' else None)
+    else:
+        sampling_mode = "targets" if class_targets else "enriched" if enrichment else "physical"
+        sampling, weights, class_totals = plan_sampling(n_events, event_types, enrichment, class_targets)
+
+    # In streaming mode every chunk is one shard, generated and written in turn
+    if chunk_size:
+        sizes = [min(chunk_size, n_events - start) for start in range(0, n_events, chunk_size)]
+    else:
+        sizes = shard_sizes(n_events, num_shards)
+    shard_counts = None
+    if class_totals is not None:
+        shard_counts = split_class_counts(class_totals, len(sizes))
+        sizes = [sum(counts) for counts in shard_counts]
+
+    counts = counts_from_metadata(previous) if previous else new_event_counts()
+    paths = {}
+    events = None
+    writer = None
+    waveform_dir = None
+    if output is not None:
+        formats = resolve_formats(formats)
+        os.makedirs(output, exist_ok=True)
+        paths = {fmt: path for fmt, path in dataset_io.dataset_paths(output).items() if fmt in formats}
+        writer = DatasetWriter(paths, formats, append, partition_by)
+        if not append:
+            waveform_tier.clear_waveforms(os.path.join(output, waveform_tier.WAVEFORM_DIR))
+        paths['response_maps'] = detector_response.save_maps(
+            maps, os.path.join(output, detector_response.RESPONSE_MAPS_NAME))
+        if waveforms:
+            waveform_dir = os.path.join(output, waveform_tier.WAVEFORM_DIR)
+            paths['waveforms'] = waveform_dir
+    else:
+        formats = []
+    shards = iter_shards(sizes, sampling, seed, workers, detector, weights, shard_counts,
+                         first_shard, first_event_id, waveforms, waveform_dir, maps, trigger_rate_hz)
+
+    # Shards tile the run in time order, so the coincidence stage can sweep
+    # them one at a time (holding back groups that span a shard boundary)
+    if writer is not None and chunk_size:
+        sweep = coincidence.CoincidenceSweep(coincidence_window_us, first_group)
+        for chunk in sweep.process(shards):
+            if chunk is None or chunk.empty:
+                continue
+            writer.write(chunk)
+            update_event_counts(counts, chunk)
+            if verbose:
+                print(f"Generated and saved {counts['total_events']} events...")
+        num_groups = sweep.next_group
+    else:
+        events = coincidence.apply_coincidences(pd.concat(list(shards), ignore_index=True),
+                                                coincidence_window_us, first_group)
+        num_groups = first_group + int(events['coincidence_group'].nunique())
+        update_event_counts(counts, events)
+        if writer is not None:
+            writer.write(events)
+    if writer is not None:
+        writer.close()
+
+    batch = {
+        "first_event_id": first_event_id,
+        "num_events": sum(sizes),
+        "first_shard": first_shard,
+        "num_shards": len(sizes)
+    }
+    generation = {
+        "seed": seed,
+        "num_shards": first_shard + len(sizes),
+        "chunk_size": chunk_size,
+        "formats": formats,
+        "partition_by": partition_by,
+        "waveforms": waveform_tier.waveform_settings() if waveforms else None,
+        "trigger_rate_hz": trigger_rate_hz,
+        "coincidence": {"window_us": coincidence_window_us, "num_groups": num_groups},
+        "response_maps": (previous['generation'].get('response_maps', 'default') if previous
+                          else response_maps or 'default'),
+        "class_fractions": event_types,
+        "sampling": {
+            "mode": sampling_mode,
+            "sampled_fractions": sampling,
+            "weights": weights or {t: 1.0 for t in event_types}
+        },
+        "batches": (previous['generation'].get('batches', []) if previous else []) + [batch]
+    }
+    metadata = build_metadata(counts, generation, detector)
+    if previous:
+        metadata["creation_date"] = previous.get("creation_date", metadata["creation_date"])
+        metadata["last_append_date"] = datetime.now().isoformat()
+    if output is not None:
+        paths['metadata'] = dataset_io.write_metadata(metadata, output)
+    return GenerationResult(events, metadata, paths)
+
+
+def _type_values(cast):
+    """argparse type for EVENT_TYPE=VALUE options."""
+    def parse(text):
+        event_type, sep, value = text.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"expected EVENT_TYPE=VALUE, got {text!r}")
+        try:
+            return event_type.strip(), cast(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid value in {text!r}")
+    return parse
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description='Generate the synthetic dark matter detection dataset')
+    p.add_argument('--num-events', type=int, default=50000, help='Number of events to generate')
+    p.add_argument('--seed', type=int, default=42, help='Master seed of the per-shard random streams')
+    p.add_argument('--shards', type=int, default=1, help='Number of independently seeded shards')
+    p.add_argument('--chunk-size', type=int, default=None,
+                   help='Stream fixed-size chunks to disk instead of building the dataset in memory')
+    p.add_argument('--workers', type=int, default=None, help='Worker processes (default: min(shards, CPU count))')
+    p.add_argument('--format', default='parquet,jsonl',
+                   help='Comma-separated output formats: parquet, csv, jsonl (default: parquet,jsonl)')
+    p.add_argument('--output', default=dataset_io.DATASET_DIR, help='Output directory (default: dataset)')
+    p.add_argument('--partition', choices=dataset_io.PARTITIONINGS, default=None,
+                   help='Partition the Parquet output by month of timestamp')
+    p.add_argument('--append', action='store_true',
+                   help='Add --num-events events to the existing dataset in --output, continuing its '
+                        'seed streams and event numbering (seed and formats are taken from its metadata)')
+    p.add_argument('--enrich', type=_type_values(float), action='append', default=[], metavar='TYPE=FACTOR',
+                   help='Oversample an event type by FACTOR, e.g. sterile_neutrino=50 (repeatable)')
+    p.add_argument('--target', type=_type_values(int), action='append', default=[], metavar='TYPE=COUNT',
+                   help='Generate exactly COUNT events of an event type (repeatable); '
+                        'the other types share the rest of --num-events')
+    p.add_argument('--trigger-rate', type=float, default=None, metavar='HZ',
+                   help='Mean event rate in Hz (default: --num-events spread over a year; '
+                        'a detector-like 10 gives about 2%% pile-up)')
+    p.add_argument('--coincidence-window', type=float, default=coincidence.DEFAULT_WINDOW_US, metavar='US',
+                   help='Events closer than this many microseconds are flagged as pile-up '
+                        f'(default: {coincidence.DEFAULT_WINDOW_US:g})')
+    p.add_argument('--response-maps', default=None, metavar='FILE.npz',
+                   help='Detector response maps to apply (see detector_response.py; '
+                        'default: maps built from the detector geometry)')
+    p.add_argument('--waveforms', action='store_true',
+                   help='Reconstruct S1/S2 areas and widths from simulated pulse traces, '
+                        'stored in <output>/waveforms/')
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.chunk_size:
+        num_shards = -(-args.num_events // args.chunk_size)
+    else:
+        num_shards = args.shards
+    workers = args.workers or min(num_shards, os.cpu_count() or 1)
+
+    if args.append:
+        print(f"Appending to the synthetic dark matter detection dataset in {args.output}/...")
+        print(f"New events: {args.num_events} ({num_shards} shard(s), {workers} worker(s))")
+    else:
+        print("Generating synthetic dark matter detection dataset...")
+        print(f"Total events: {args.num_events} (seed {args.seed}, {num_shards} shard(s), {workers} worker(s))")
+    print("Adding detector effects, data quality issues and S2/S1 ratio corrections per shard...")
+    if args.waveforms:
+        print("Reconstructing S1/S2 areas and widths from simulated waveforms...")
+
+    try:
+        result = generate_dataset(args.num_events, seed=args.seed, output=args.output,
+                                  formats=args.format.split(','), num_shards=args.shards,
+                                  chunk_size=args.chunk_size, workers=workers, verbose=True,
+                                  enrichment=dict(args.enrich) or None,
+                                  class_targets=dict(args.target) or None,
+                                  append=args.append, partition_by=args.partition,
+                                  waveforms=args.waveforms, response_maps=args.response_maps,
+                                  trigger_rate_hz=args.trigger_rate,
+                                  coincidence_window_us=args.coincidence_window)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    if result.events is not None:
+        print_dataset_summary(result.events)
+    if result.metadata['generation']['sampling']['mode'] != 'physical':
+        print("\nWeighted (physical) event type distribution:")
+        for label, weighted in result.metadata['physical_event_types'].items():
+            print(f"  {label}: {weighted:.1f} (generated: {result.metadata['event_types'].get(label, 0)})")
+
+    print("\nDataset saved successfully!")
+    print(f"Files created in {args.output}/ folder:")
+    for fmt, path in result.paths.items():
+        if fmt == 'metadata':
+            print(f"  - {path} (dataset information)")
+        elif fmt == 'response_maps':
+            print(f"  - {path} (detector response maps)")
+        elif fmt == 'waveforms':
+            print(f"  - {path}/ (S1/S2 traces, .npy memory maps)")
+        else:
+            print(f"  - {path} ({result.metadata['total_events']} events)")
+    print(f"\nDataset ready for machine learning analysis!")
+
+
+if __name__ == '__main__':
+    main()
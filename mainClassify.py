@@ -6,19 +6,27 @@ and calls the specified LLM (Gemini/Claude) for detailed classification and
 scientific reasoning. This minimizes token usage by only analyzing selected events.
 """
 import argparse
+import asyncio
+import contextlib
+import heapq
 import json
 import os
 import sys
 import time
-import re
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 
 import pandas as pd
-# Use the Python 'requests' library for the HTTP API call
-import requests
 from dotenv import load_dotenv
 import anthropic
 
+import dataset_io
+import event_sampler
+import llm_cache
+import llm_gateway
+import results_log
+import rule_classifier
+import structured_output
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -28,26 +36,110 @@ API_KEY = os.getenv("CLAUDE_API_KEY")
 if not API_KEY:
     raise ValueError("CLAUDE_API_KEY not found in environment variables. Please set it in .env file.")
 
-MODEL_NAME = "claude-3-haiku-20240307"  # Claude Haiku model
+DATASET_DIR = 'dataset'
+RESULTS_PATH = os.path.join(DATASET_DIR, 'claude_classified_results_detailed.json')
+# Every result is appended here as it arrives; RESULTS_PATH is compacted from it
+RESULTS_LOG_PATH = os.path.join(DATASET_DIR, 'claude_classified_results.log.jsonl')
+
+# Bump when a prompt changes so cached responses to the old prompt are not reused
+CLASSIFICATION_PROMPT_VERSION = 6
+HYPOTHESIS_PROMPT_VERSION = 5
+
+# Concurrent API calls and per-event time budget of the async pipeline
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT_S = 120.0
+
+# Events per packed classification request (1 sends one request per event).
+# Packed results keep their text fields brief, about PACKED_TOKENS_PER_EVENT
+# output tokens per event, so at most MAX_PACK_SIZE events fit in one reply
+# within the model's output limit
+DEFAULT_PACK_SIZE = 1
+PACKED_TOKENS_PER_EVENT = 600
+MAX_OUTPUT_TOKENS = 4096
+MAX_PACK_SIZE = MAX_OUTPUT_TOKENS // PACKED_TOKENS_PER_EVENT
 
-CSV = 'dataset/dark_matter_synthetic_dataset.csv'
+# Background events are sampled from clear electronic recoils only
+BACKGROUND_MIN_S2_S1 = 500
+
+# Per-event hypothesis files and the run summary are written here. Classified
+# events scoring at least ANOMALY_THRESHOLD get hypotheses from a pool of
+# DEFAULT_HYPOTHESIS_WORKERS concurrent requests while classification continues.
+ANOMALY_DIR = 'anomaly_analysis'
+ANOMALY_THRESHOLD = 0.3
+DEFAULT_HYPOTHESIS_WORKERS = 2
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description='Classify candidate events using Gemini/Claude API')
     p.add_argument('--num-events', type=int, default=10, help='Number of events to classify using the API')
     p.add_argument('--generate-hypotheses', action='store_true', help='Generate physics hypotheses for anomalous events')
-    p.add_argument('--top-anomalies', type=int, default=10, help='Number of top anomalies to analyze')
+    p.add_argument('--top-anomalies', type=int, default=10,
+                   help='Maximum number of anomalies to generate hypotheses for (default: 10)')
+    p.add_argument('--hypothesis-workers', type=int, default=DEFAULT_HYPOTHESIS_WORKERS,
+                   help='Concurrent hypothesis requests running alongside classification '
+                        f'(default: {DEFAULT_HYPOTHESIS_WORKERS})')
+    p.add_argument('--exact-top-anomalies', action='store_true',
+                   help='Analyze exactly the run\'s --top-anomalies highest-scoring anomalies; hypotheses '
+                        'then only start near the end of classification')
+    p.add_argument('--start', default=None, help='Only sample events at or after this time (e.g. 2024-03-01)')
+    p.add_argument('--end', default=None, help='Only sample events before this time (e.g. 2024-04-01)')
+    p.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                   help=f'Maximum number of concurrent API calls (default: {DEFAULT_CONCURRENCY})')
+    p.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_S,
+                   help=f'Per-request API timeout in seconds (default: {DEFAULT_TIMEOUT_S:g})')
+    p.add_argument('--pack-size', type=int, default=DEFAULT_PACK_SIZE,
+                   help='Classify up to this many events per API request, sharing one copy of the '
+                        f'system prompt and schema, with brief analyses (default: {DEFAULT_PACK_SIZE}, '
+                        f'at most {MAX_PACK_SIZE})')
+    p.add_argument('--no-cache', action='store_true',
+                   help='Ignore cached API responses (fresh responses are still cached)')
+    p.add_argument('--resume', action='store_true',
+                   help='Continue an interrupted run: skip events that already have a result in the results log')
+    p.add_argument('--all-events', action='store_true',
+                   help='Classify every loaded event instead of a balanced sample of --num-events')
+    p.add_argument('--no-rules', action='store_true',
+                   help='Send every event to Claude instead of only those the local S2/S1 rules cannot settle')
+    p.add_argument('--min-rule-confidence', type=float, default=rule_classifier.DEFAULT_MIN_CONFIDENCE,
+                   help='Escalate events whose S2/S1 band confidence is below this '
+                        f'(default: {rule_classifier.DEFAULT_MIN_CONFIDENCE})')
+    p.add_argument('--seed', type=int, default=event_sampler.DEFAULT_SEED,
+                   help=f'Seed of the event sample (default: {event_sampler.DEFAULT_SEED})')
     return p.parse_args()
 
 
-def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
+# Analysis steps shared by the single-event and packed prompts
+ANALYSIS_INSTRUCTIONS = (
+    "**ANALYSIS STEPS:**\n"
+    "1. Calculate and evaluate S2/S1 ratio against classification bands\n"
+    "2. Assess recoil energy in context of WIMP search (1-50 keV optimal)\n"
+    "3. Check fiducial volume position (x,y,z) - reject if near boundaries\n"
+    "4. Analyze pulse characteristics (widths, drift time consistency)\n"
+    "5. Evaluate event quality and pile-up indicators\n"
+    "6. Compare against known detector response and published results\n"
+    "7. Identify any anomalies or unusual features\n\n"
+    
+    "**CLASSIFICATION OPTIONS:**\n"
+    "- 'Background (ER)' - Electronic recoil from gamma/beta radiation\n"
+    "- 'WIMP-like (NR)' - Nuclear recoil consistent with dark matter\n"
+    "- 'Axion-like (ER)' - Exotic signal with very low S2/S1\n"
+    "- 'Novel Anomaly' - Unusual event requiring further investigation\n\n"
+    
+    "Provide comprehensive, multi-paragraph scientific reasoning with specific numerical references.\n\n"
+)
+
+# Responses are recorded through these tools, whose input schemas enforce the response format
+CLASSIFICATION_TOOL = 'record_classification'
+PACKED_CLASSIFICATION_TOOL = 'record_classifications'
+HYPOTHESIS_TOOL = 'record_hypotheses'
+
+# The classification options, enforced as an enum of the response schema
+CLASSIFICATIONS = ['Background (ER)', 'WIMP-like (NR)', 'Axion-like (ER)', 'Novel Anomaly']
+
+
+def classification_features(event_data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Creates a detailed, structured prompt and JSON schema to guide the LLM's reasoning
-    based on the updated S2/S1 classification bands with enhanced physics-based analysis.
+    Selects only the most relevant physics features to minimize input tokens.
     """
-    
-    # Select only the most relevant physics features to minimize input tokens
-    features = {
+    return {
         'event_id': event_data.get('event_id'),
         'recoil_energy_keV': event_data.get('recoil_energy_keV'),
         's1_area_PE': event_data.get('s1_area_PE'),
@@ -65,6 +157,61 @@ def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
         'interaction_type': event_data.get('interaction_type'),
     }
 
+
+def classification_cache_lookup(event_data: Dict[str, Any]) -> tuple:
+    """
+    Returns (cache key, cached analysis or None) for an event. The key covers
+    the prompt's physics features but not the event_id, so identical events
+    (e.g. repeated webapp requests) share one response.
+    """
+    features = classification_features(event_data)
+    features.pop('event_id')
+    return llm_cache.lookup('classification', llm_gateway.gateway().model, CLASSIFICATION_PROMPT_VERSION, features)
+
+
+# Physics notes on each class for the prompt; the S2/S1 bands come from rule_classifier.BANDS
+CLASS_PHYSICS = {
+    'Background (ER)': ("Electronic Recoil", [
+        "Caused by gamma rays, beta decays, Compton scattering",
+        "Higher ionization yield, more free electrons escape recombination",
+        "Typical sources: Kr-85, Rn-222, detector materials",
+    ]),
+    'Novel Anomaly': ("Boundary Region", [
+        "Between the NR and ER bands; fits neither population cleanly",
+        "May indicate new physics, a mis-reconstructed event or a detector effect",
+        "Requires additional investigation",
+    ]),
+    'WIMP-like (NR)': ("Nuclear Recoil", [
+        "Characteristic of WIMP-nucleus elastic scattering",
+        "Lower ionization yield due to denser ionization tracks",
+        "Energy typically 1-50 keV (WIMP search window)",
+        "Must be single-scatter event in fiducial volume",
+    ]),
+    'Axion-like (ER)': ("Axion or Other Exotic Signal", [
+        "Potentially axion-electron coupling or other exotic physics",
+        "May show energy peaks at specific values (e.g., 14.4 keV for axions)",
+        "Requires careful verification against detector artifacts",
+    ]),
+}
+
+
+def classification_rules() -> str:
+    """The prompt's numbered S2/S1 rules, highest band first, built from rule_classifier.BANDS."""
+    rules = []
+    for number, (name, low, high) in enumerate(reversed(rule_classifier.BANDS), 1):
+        title, notes = CLASS_PHYSICS[name]
+        band = rule_classifier.band_description(low, high)
+        rules.append(f"{number}. **{band}:** {name} - {title}\n" + "".join(f"   - {note}\n" for note in notes))
+    return "\n".join(rules) + "\n"
+
+
+def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
+    """
+    Creates a detailed, structured prompt and JSON schema to guide the LLM's reasoning
+    based on the updated S2/S1 classification bands with enhanced physics-based analysis.
+    """
+    features = classification_features(event_data)
+
     # System instruction for persona and structured output - ENHANCED WITH DETAILED PHYSICS
     system_prompt = (
         "You are a senior particle physicist at the XENONnT dark matter detection experiment. "
@@ -72,25 +219,11 @@ def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
         "and statistical analysis of rare event searches.\n\n"
         
         "**CLASSIFICATION RULES (S2/S1 Ratio-Based):**\n"
-        "1. **High S2/S1 (>200):** Background (Electronic Recoil - ER)\n"
-        "   - Caused by gamma rays, beta decays, Compton scattering\n"
-        "   - Higher ionization yield, more free electrons escape recombination\n"
-        "   - Typical sources: Kr-85, Rn-222, detector materials\n\n"
-        
-        "2. **Medium S2/S1 (10-50):** WIMP-like (Nuclear Recoil - NR)\n"
-        "   - Characteristic of WIMP-nucleus elastic scattering\n"
-        "   - Lower ionization yield due to denser ionization tracks\n"
-        "   - Energy typically 1-50 keV (WIMP search window)\n"
-        "   - Must be single-scatter event in fiducial volume\n\n"
-        
-        "3. **Very Low S2/S1 (<10):** Axion-like or Exotic Signal\n"
-        "   - Potentially axion-electron coupling or other exotic physics\n"
-        "   - May show energy peaks at specific values (e.g., 14.4 keV for axions)\n"
-        "   - Requires careful verification against detector artifacts\n\n"
+        f"{classification_rules()}"
         
         "**ADDITIONAL ANALYSIS FACTORS:**\n"
         "- **Energy Range:** WIMPs expected at 1-50 keV; backgrounds across full spectrum\n"
-        "- **Position (Fiducialization):** Events near detector walls (z<50mm or z>1300mm) likely background\n"
+        "- **Position (Fiducialization):** Events near detector walls (r>450mm or |z|>450mm) likely background\n"
         "- **Pulse Shape:** S1 width and S2 width can indicate event type\n"
         "- **Event Quality:** Quality <0.5 suggests detector noise or artifacts\n"
         "- **Pile-up Flag:** Multiple interactions increase background probability\n"
@@ -107,35 +240,13 @@ def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
         "7. Reference to relevant physics principles (recombination, quenching factors, etc.)"
     )
 
-    # User query - ENHANCED WITH DETAILED INSTRUCTIONS FOR CLAUDE
+    # User query - only the event changes between calls; the analysis steps,
+    # formatting rules and schema go in the cached system prompt
     user_query = (
         f"**PARTICLE EVENT ANALYSIS REQUEST**\n\n"
         f"Analyze this dark matter detector event with rigorous scientific reasoning.\n\n"
         f"**EVENT DATA:**\n{json.dumps(features, indent=2)}\n\n"
-        
-        f"**ANALYSIS STEPS:**\n"
-        f"1. Calculate and evaluate S2/S1 ratio against classification bands\n"
-        f"2. Assess recoil energy in context of WIMP search (1-50 keV optimal)\n"
-        f"3. Check fiducial volume position (x,y,z) - reject if near boundaries\n"
-        f"4. Analyze pulse characteristics (widths, drift time consistency)\n"
-        f"5. Evaluate event quality and pile-up indicators\n"
-        f"6. Compare against known detector response and published results\n"
-        f"7. Identify any anomalies or unusual features\n\n"
-        
-        f"**CLASSIFICATION OPTIONS:**\n"
-        f"- 'Background (ER)' - Electronic recoil from gamma/beta radiation\n"
-        f"- 'WIMP-like (NR)' - Nuclear recoil consistent with dark matter\n"
-        f"- 'Axion-like (ER)' - Exotic signal with very low S2/S1\n"
-        f"- 'Novel Anomaly' - Unusual event requiring further investigation\n\n"
-        
-        f"Provide comprehensive, multi-paragraph scientific reasoning with specific numerical references.\n\n"
-        f"**CRITICAL FORMATTING REQUIREMENTS:**\n"
-        f"- Your response must be ONLY a valid JSON object\n"
-        f"- No markdown formatting, no code blocks, no extra text\n"
-        f"- Use only printable ASCII characters in all text fields\n"
-        f"- Escape any quotes within string values properly\n"
-        f"- Do not use newlines or tabs within JSON string values\n"
-        f"- Start your response with {{ and end with }}\n"
+        f"Follow the analysis steps and record your analysis with the {CLASSIFICATION_TOOL} tool."
     )
     
     # JSON Schema definition for forced structured output - ENHANCED
@@ -144,10 +255,13 @@ def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
         "properties": {
             "classification": {
                 "type": "STRING", 
+                "enum": CLASSIFICATIONS,
                 "description": "The determined event type: 'Background (ER)', 'WIMP-like (NR)', 'Axion-like (ER)', or 'Novel Anomaly'"
             },
             "confidence": {
                 "type": "NUMBER", 
+                "minimum": 0.0,
+                "maximum": 1.0,
                 "description": "Confidence score from 0.0 to 1.0 based on how well event matches classification criteria"
             },
             "s2_s1_analysis": {
@@ -198,223 +312,517 @@ def create_api_prompt_and_schema(event_data: Dict[str, Any]) -> tuple:
     return system_prompt, user_query, response_schema
 
 
+def classification_system(system_prompt: str, packed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Returns the static part of a classification request as a cacheable system
+    prompt: persona and rules, then the analysis steps. Together with the tool
+    definition before it, it is identical for every event (and every pack), so
+    after the first call it is read from the prompt cache on models whose cache
+    minimum it exceeds.
+    """
+    if packed:
+        response_format = (f"Call the {PACKED_CLASSIFICATION_TOOL} tool once, with one result per event "
+                           f"in the order given, each including the event's event_id. Keep every text "
+                           f"field brief (one or two sentences with the key numbers) so that all "
+                           f"results fit in one reply.")
+    else:
+        response_format = f"Call the {CLASSIFICATION_TOOL} tool with your analysis."
+    return llm_gateway.cacheable(f"{system_prompt}\n\n{ANALYSIS_INSTRUCTIONS}**RESPONSE FORMAT:**\n"
+                                 f"{response_format} Use only printable ASCII characters in text fields.")
+
+
+def classification_tool(response_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The tool a single-event analysis is recorded with."""
+    return structured_output.tool(CLASSIFICATION_TOOL, "Record the classification and analysis of one event.",
+                                  response_schema)
+
+
+def build_classification_request(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the request arguments of the classification call for one event;
+    the gateway adds the model and the forced tool call.
+    """
+    system_prompt, user_query, _ = create_api_prompt_and_schema(event_data)
+    return {
+        "max_tokens": 4000,
+        "temperature": 0.0,
+        "system": classification_system(system_prompt),
+        "messages": [{"role": "user", "content": user_query}]
+    }
+
+
 def classify_event_api(event_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Performs the API call to the Claude model for classification and reasoning.
+    Responses are cached on disk, so repeated events cost no API call.
     """
-    system_prompt, user_query, response_schema = create_api_prompt_and_schema(event_data)
-    
+    cache_key, cached = classification_cache_lookup(event_data)
+    if cached is not None:
+        return cached
+    _, _, response_schema = create_api_prompt_and_schema(event_data)
     try:
-        # Initialize the Anthropic client
-        client = anthropic.Anthropic(api_key=API_KEY)
-        
-        # Create the message using Claude's official client
-        message = client.messages.create(
-            model=MODEL_NAME,
-            max_tokens=4000,
-            temperature=0.0,
-            system=system_prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"{user_query}\n\nPlease respond with a valid JSON object that matches this schema: {json.dumps(response_schema)}"
-                }
-            ]
-        )
-        
-        # Extract the response text
-        if message.content and len(message.content) > 0:
-            json_text = message.content[0].text
-            
-            # Clean the JSON text to remove control characters and fix formatting
-            json_text = json_text.strip()
-            
-            # Remove any markdown code block formatting if present
-            if json_text.startswith('```json'):
-                json_text = json_text[7:]
-            if json_text.startswith('```'):
-                json_text = json_text[3:]
-            if json_text.endswith('```'):
-                json_text = json_text[:-3]
-            
-            # Remove control characters and clean the text
-            import re
-            json_text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', json_text)
-            json_text = json_text.strip()
-            
-            # Try to parse the cleaned JSON
-            try:
-                return json.loads(json_text)
-            except json.JSONDecodeError as e:
-                # If JSON parsing fails, try to extract just the content between braces
-                brace_start = json_text.find('{')
-                brace_end = json_text.rfind('}')
-                if brace_start != -1 and brace_end != -1 and brace_end > brace_start:
-                    clean_json = json_text[brace_start:brace_end+1]
-                    try:
-                        return json.loads(clean_json)
-                    except json.JSONDecodeError:
-                        pass
-                
-                # If all parsing fails, return a structured error response
-                return {
-                    "error": f"JSON parsing failed: {str(e)}",
-                    "raw_text": json_text[:500] + "..." if len(json_text) > 500 else json_text,
-                    "classification": "Background (ER)",  # Default classification
-                    "confidence": 0.1,
-                    "s2_s1_analysis": "Error in API response parsing",
-                    "energy_analysis": "Error in API response parsing",
-                    "position_analysis": "Error in API response parsing",
-                    "pulse_characteristics": "Error in API response parsing",
-                    "physics_interpretation": "Error in API response parsing",
-                    "comparison_with_literature": "Error in API response parsing",
-                    "alternative_interpretations": "Error in API response parsing",
-                    "confidence_factors": "Error in API response parsing",
-                    "follow_up_recommendations": "Review API response format"
-                }
-        
-        # Handle cases where the model returns an error or empty content
-        return {"error": "API response missing content.", "raw_response": str(message)}
+        # Sent on the gateway's pooled client, within the account's rate limits; the
+        # answer is a validated tool call, corrected by the model if it fails validation
+        api_analysis = llm_gateway.gateway().create_structured(
+            classification_tool(response_schema), **build_classification_request(event_data))
+        llm_cache.store(cache_key, api_analysis, 'classification')
+        return api_analysis
 
+    except structured_output.StructuredOutputError as e:
+        return {"error": f"Invalid structured response: {e}"}
     except anthropic.APIError as e:
         return {"error": f"Claude API Error: {e}"}
     except Exception as e:
         return {"error": f"Unexpected error: {e}"}
-    except json.JSONDecodeError as e:
-        # If decoding the main response fails, return what we have
-        return {"error": f"JSON Decode Error in primary response: {e}", "raw_text": json_text if 'json_text' in locals() else 'No text available'}
 
 
-def select_and_sample_events(df: pd.DataFrame, num_events: int) -> pd.DataFrame:
+async def classify_event_api_async(client: "anthropic.AsyncAnthropic", event_data: Dict[str, Any],
+                                   semaphore: asyncio.Semaphore,
+                                   timeout: float = DEFAULT_TIMEOUT_S) -> Dict[str, Any]:
+    """
+    Async version of classify_event_api() sharing one client; at most as many
+    calls as the semaphore allows are in flight, and each event gets `timeout`
+    seconds (client retries included) before it is recorded as an error.
+    Cached events return at once without taking a slot.
+    """
+    cache_key, cached = classification_cache_lookup(event_data)
+    if cached is not None:
+        return cached
+    _, _, response_schema = create_api_prompt_and_schema(event_data)
+    async with semaphore:
+        try:
+            api_analysis = await asyncio.wait_for(
+                llm_gateway.gateway().create_structured_async(
+                    client, classification_tool(response_schema), **build_classification_request(event_data)),
+                timeout)
+            llm_cache.store(cache_key, api_analysis, 'classification')
+            return api_analysis
+        except structured_output.StructuredOutputError as e:
+            return {"error": f"Invalid structured response: {e}"}
+        except asyncio.TimeoutError:
+            return {"error": f"Claude API Error: no response within {timeout:g} s"}
+        except anthropic.APIError as e:
+            return {"error": f"Claude API Error: {e}"}
+        except Exception as e:
+            return {"error": f"Unexpected error: {e}"}
+
+
+def packed_classification_tool(response_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The tool the analyses of a pack are recorded with: a list of event_id-tagged single-event results."""
+    item_schema = {
+        **response_schema,
+        "properties": {"event_id": {"type": "STRING", "description": "event_id of the analyzed event"},
+                       **response_schema["properties"]},
+        "required": ["event_id"] + response_schema["required"],
+    }
+    return structured_output.tool(
+        PACKED_CLASSIFICATION_TOOL, "Record the classification and analysis of each event.",
+        {"type": "OBJECT", "properties": {"results": {"type": "ARRAY", "items": item_schema}}, "required": ["results"]})
+
+
+def build_packed_classification_request(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the request arguments of one classification call for several events.
+
+    The (cached) tool definition, system prompt and analysis steps are sent
+    once for the whole pack; the reply is a call to the packed tool with one
+    schema-conforming result per event, tagged with its event_id.
+    """
+    system_prompt, _, response_schema = create_api_prompt_and_schema(events[0])
+    # event_ids are sent as strings, the type the tool schema asks to echo back
+    features = [{**classification_features(evt), 'event_id': str(evt['event_id'])} for evt in events]
+    user_query = (
+        f"**PARTICLE EVENT ANALYSIS REQUEST ({len(events)} EVENTS)**\n\n"
+        f"Analyze each of these dark matter detector events independently with rigorous scientific reasoning.\n\n"
+        f"**EVENT DATA:**\n{json.dumps(features, indent=2)}\n\n"
+        f"Follow the analysis steps and record the analyses with the {PACKED_CLASSIFICATION_TOOL} tool."
+    )
+    return {
+        "max_tokens": min(PACKED_TOKENS_PER_EVENT * len(events), MAX_OUTPUT_TOKENS),
+        "temperature": 0.0,
+        "system": classification_system(system_prompt, packed=True),
+        "messages": [{"role": "user", "content": user_query}],
+        **structured_output.forced(packed_classification_tool(response_schema)),
+    }
+
+
+def parse_packed_classification_response(message: Any, events: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Extracts the per-event analyses of a packed reply, keyed by str(event_id).
+
+    Each result is validated on its own: results for unknown events,
+    duplicates and results failing the schema are dropped, as are those lost
+    to a reply cut off at max_tokens; the caller retries whichever events are
+    missing from the result.
+    """
+    tool_def = packed_classification_tool(create_api_prompt_and_schema(events[0])[2])
+    call = structured_output.tool_call(message, PACKED_CLASSIFICATION_TOOL)
+    results = call.input.get('results') if call is not None and isinstance(call.input, dict) else None
+    if not isinstance(results, list):
+        return {}
+    item_schema = tool_def['input_schema']['properties']['results']['items']
+    wanted = {str(evt['event_id']) for evt in events}
+    analyses = {}
+    for item in results:
+        # Results echoing an integer event_id are matched like string ones
+        if isinstance(item, dict) and isinstance(item.get('event_id'), int) and not isinstance(item['event_id'], bool):
+            item['event_id'] = str(item['event_id'])
+        if structured_output.validate(item, item_schema):
+            continue
+        event_id = str(item.pop('event_id'))
+        if event_id in wanted and event_id not in analyses:
+            analyses[event_id] = item
+    return analyses
+
+
+async def classify_pack_async(client: "anthropic.AsyncAnthropic", events: List[Dict[str, Any]],
+                              semaphore: asyncio.Semaphore,
+                              timeout: float = DEFAULT_TIMEOUT_S) -> List[Dict[str, Any]]:
+    """
+    Classifies several events with one packed request; returns their analyses in input order.
+
+    Cached events are answered from the cache and only the rest are packed.
+    Events missing from the reply (invalid or truncated results, or a timed
+    out request) are split into two halves that are retried
+    concurrently, down to single events, which use classify_event_api_async().
+    Packed results follow the single-event schema and are cached under the
+    single-event key.
+    """
+    if len(events) == 1:
+        return [await classify_event_api_async(client, events[0], semaphore, timeout)]
+
+    results: List[Any] = [None] * len(events)
+    pending = []
+    for i, evt in enumerate(events):
+        cache_key, cached = classification_cache_lookup(evt)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, cache_key))
+    if not pending:
+        return results
+
+    # Duplicate event_ids could not be told apart in the reply
+    if len({str(events[i]['event_id']) for i, _ in pending}) < len(pending):
+        analyses = {}
+    else:
+        async with semaphore:
+            try:
+                message = await asyncio.wait_for(
+                    llm_gateway.gateway().create_message_async(
+                        client, **build_packed_classification_request([events[i] for i, _ in pending])),
+                    timeout)
+                analyses = parse_packed_classification_response(message, [events[i] for i, _ in pending])
+            except asyncio.TimeoutError:
+                analyses = {}
+            except anthropic.APIError as e:
+                error = {"error": f"Claude API Error: {e}"}
+                for i, _ in pending:
+                    results[i] = error
+                return results
+            except Exception as e:
+                # e.g. rate_limiter.RateLimitExceeded; must not abort the other packs of the run
+                error = {"error": f"Unexpected error: {e}"}
+                for i, _ in pending:
+                    results[i] = error
+                return results
+
+    missing = []
+    for i, cache_key in pending:
+        api_analysis = analyses.get(str(events[i]['event_id']))
+        if api_analysis is None:
+            missing.append(i)
+        else:
+            results[i] = api_analysis
+            llm_cache.store(cache_key, api_analysis, 'classification')
+
+    if missing:
+        half = (len(missing) + 1) // 2
+        retries = await asyncio.gather(*(classify_pack_async(client, [events[i] for i in part], semaphore, timeout)
+                                         for part in (missing[:half], missing[half:]) if part))
+        for part, analyses_part in zip((missing[:half], missing[half:]), retries):
+            for i, api_analysis in zip(part, analyses_part):
+                results[i] = api_analysis
+    return results
+
+
+async def classify_events_async(events: List[Dict[str, Any]], concurrency: int = DEFAULT_CONCURRENCY,
+                                timeout: float = DEFAULT_TIMEOUT_S,
+                                pack_size: int = DEFAULT_PACK_SIZE,
+                                on_results: Optional[Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]] = None
+                                ) -> List[Dict[str, Any]]:
+    """
+    Classifies events concurrently; returns their analyses in input order.
+
+    Events are sent pack_size at a time (see classify_pack_async()). Each
+    result is printed as soon as it arrives, so throughput is set by the
+    allowed concurrency and the API latency rather than by fixed waits.
+    on_results(events, analyses) is called as each pack completes.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    pack_size = min(max(pack_size, 1), MAX_PACK_SIZE)
+    done = 0
+
+    async def classify(pack: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        nonlocal done
+        analyses = await classify_pack_async(client, pack, semaphore, timeout)
+        for evt, api_analysis in zip(pack, analyses):
+            done += 1
+            print(f"--- [{done}/{len(events)}] Event {evt['event_id']} (True Label: {evt['label']}) ---")
+            print_classification(api_analysis)
+        if on_results is not None:
+            on_results(pack, analyses)
+        return analyses
+
+    packs = [events[start:start + pack_size] for start in range(0, len(events), pack_size)]
+    async with llm_gateway.gateway().async_session() as client:
+        results = await asyncio.gather(*(classify(pack) for pack in packs))
+    return [api_analysis for analyses in results for api_analysis in analyses]
+
+
+def _with_s2_s1_ratio(chunks: Iterable[pd.DataFrame]) -> Iterable[pd.DataFrame]:
+    """Adds the S2/S1 ratio to chunks that lack it."""
+    for chunk in chunks:
+        if 's2_over_s1_ratio' not in chunk.columns:
+            chunk = chunk.assign(s2_over_s1_ratio=chunk['s2_area_PE'] / chunk['s1_area_PE'].replace({0: pd.NA}))
+        yield chunk
+
+
+def select_and_sample_events(events: Union[pd.DataFrame, Iterable[pd.DataFrame]], num_events: int,
+                             seed: int = event_sampler.DEFAULT_SEED) -> pd.DataFrame:
     """
     Selects a balanced sample of dark matter and background events for API testing.
+
+    `events` is a DataFrame or an iterable of DataFrame chunks (e.g.
+    dataset_io.iter_batches()), read in one pass with only the sample held in
+    memory. Half of the sample are signal candidates (non-Background events
+    with a measured S2/S1); the rest are clear backgrounds (S2/S1 above
+    BACKGROUND_MIN_S2_S1), which also make up a shortfall of signals. The
+    sample depends only on the events and the seed, not on the chunking.
     """
-    df = df.copy()
-    
-    # Calculate S2/S1 locally if missing
-    if 's2_over_s1_ratio' not in df.columns:
-        df['s2_over_s1_ratio'] = df['s2_area_PE'] / df['s1_area_PE'].replace({0: pd.NA})
+    chunks = [events] if isinstance(events, pd.DataFrame) else events
+    sampler = event_sampler.StratifiedSampler([
+        # --- 1. Signal Candidates (Non-Background) ---
+        event_sampler.Stratum('Signals', num_events // 2,
+                              [('label', '!=', 'Background'), ('s2_over_s1_ratio', 'notna')]),
+        # --- 2. True Background (Electronic Recoil) ---
+        # High S2/S1 is characteristic of background ER
+        event_sampler.Stratum('Backgrounds', None,
+                              [('label', '==', 'Background'), ('s2_over_s1_ratio', '>', BACKGROUND_MIN_S2_S1)]),
+    ], total=num_events, seed=seed)
+    for chunk in _with_s2_s1_ratio(chunks):
+        sampler.update(chunk)
 
-    # --- 1. Identify Signal Candidates (Non-Background) ---
-    signal_candidates = df[df['label'] != 'Background'].dropna(subset=['s2_over_s1_ratio'])
-    
-    # --- 2. Identify True Background (Electronic Recoil) ---
-    # Filter for clear background events (high S2/S1 is characteristic of background ER)
-    # Using a threshold > 500 to guarantee a high S2/S1 event for comparison
-    true_background = df[(df['label'] == 'Background') & (df['s2_over_s1_ratio'] > 500)].dropna(subset=['s2_over_s1_ratio'])
-
-    # --- 3. Create a Balanced Sample for API Testing ---
-    num_signal = min(num_events // 2, len(signal_candidates))
-    num_background = min(num_events - num_signal, len(true_background))
-    
-    # Sample without replacement
-    signal_sample = signal_candidates.sample(n=num_signal, random_state=42)
-    background_sample = true_background.sample(n=num_background, random_state=42)
-    
-    # Combine and shuffle for a clean test batch
-    test_sample = pd.concat([signal_sample, background_sample]).sample(frac=1, random_state=42)
-    
-    print(f"Sampling {len(test_sample)} events for API analysis (Signals: {num_signal}, Backgrounds: {num_background}).")
+    # --- 3. Balanced Sample for API Testing, shuffled ---
+    test_sample = sampler.sample()
+    counts = sampler.counts()
+    print(f"Sampling {len(test_sample)} events for API analysis "
+          f"(Signals: {counts['Signals']}, Backgrounds: {counts['Backgrounds']}).")
     return test_sample
 
 
-def run_api_pipeline(df: pd.DataFrame, num_events: int) -> None:
+def print_classification(api_analysis: Dict[str, Any]) -> None:
+    """
+    Prints the classification and every reasoning section of one API analysis.
+    """
+    if isinstance(api_analysis, dict) and 'classification' in api_analysis:
+        print(f"\n{'='*70}")
+        print(f"CLASSIFICATION: {api_analysis['classification']}")
+        print(f"CONFIDENCE: {api_analysis['confidence']:.2f}")
+        print(f"{'='*70}")
+        
+        # Print all reasoning sections
+        reasoning_sections = [
+            ('S2/S1 ANALYSIS', api_analysis.get('s2_s1_analysis')),
+            ('ENERGY ANALYSIS', api_analysis.get('energy_analysis')),
+            ('POSITION ANALYSIS', api_analysis.get('position_analysis')),
+            ('PULSE CHARACTERISTICS', api_analysis.get('pulse_characteristics')),
+            ('PHYSICS INTERPRETATION', api_analysis.get('physics_interpretation')),
+            ('COMPARISON WITH LITERATURE', api_analysis.get('comparison_with_literature')),
+            ('ALTERNATIVE INTERPRETATIONS', api_analysis.get('alternative_interpretations')),
+            ('CONFIDENCE FACTORS', api_analysis.get('confidence_factors')),
+            ('FOLLOW-UP RECOMMENDATIONS', api_analysis.get('follow_up_recommendations'))
+        ]
+        
+        for section_name, content in reasoning_sections:
+            if content:
+                print(f"\n{section_name}:")
+                print(f"{content}")
+        
+        print(f"\n{'='*70}\n")
+    else:
+        print(f"API Error or Malformed Response: {api_analysis}")
+
+
+def run_api_pipeline(events: Union[pd.DataFrame, Iterable[pd.DataFrame]], num_events: int,
+                     concurrency: int = DEFAULT_CONCURRENCY,
+                     timeout: float = DEFAULT_TIMEOUT_S, pack_size: int = DEFAULT_PACK_SIZE,
+                     use_rules: bool = True, all_events: bool = False,
+                     min_rule_confidence: float = rule_classifier.DEFAULT_MIN_CONFIDENCE,
+                     resume: bool = False, seed: int = event_sampler.DEFAULT_SEED,
+                     generate_hypotheses: bool = False, top_anomalies: int = 10,
+                     hypothesis_workers: int = DEFAULT_HYPOTHESIS_WORKERS,
+                     exact_top_anomalies: bool = False) -> List[Dict[str, Any]]:
     """
     Orchestrates the entire process: filtering, sampling, and API calling.
+
+    `events` is the event DataFrame, or with a sample (not all_events) also
+    a stream of chunks, which is sampled in one pass (see select_and_sample_events()).
+
+    The sampled events (or all of them with all_events) first go through the
+    local rule tier; only the events it escalates are classified by Claude,
+    concurrently (at most `concurrency` calls in flight, `timeout` seconds per
+    request, up to `pack_size` events per request). Every event records its
+    decision_tier.
+
+    Results are appended to RESULTS_LOG_PATH as they arrive, and RESULTS_PATH
+    is compacted from the log in sample order at the end. With resume, events
+    that already have a successful result in the log are not classified again
+    (the sample is deterministic, so a rerun with the same arguments selects
+    the same events).
+
+    With generate_hypotheses, every classified event is scored for anomalies
+    as its result arrives, and hypotheses for up to top_anomalies of them are
+    generated concurrently with the remaining classification. With
+    exact_top_anomalies they are the run's top_anomalies highest scores
+    instead, which starts them later (see HypothesisPipeline).
     """
-    test_sample = select_and_sample_events(df, num_events=num_events)
+    test_sample = events if all_events else select_and_sample_events(events, num_events=num_events, seed=seed)
+    test_sample = dataset_io.with_text_timestamps(test_sample)
     
     if test_sample.empty:
         print('No events selected for API analysis. Exiting.')
-        return
+        return []
 
-    out: List[Dict[str, Any]] = []
-    
-    for _, row in test_sample.iterrows():
-        evt = row.to_dict()
-        
+    out: List[Dict[str, Any]] = test_sample.to_dict('records')
+    for evt in out:
         # Ensure 'event_id' is present and not the pandas index
         if 'event_id' not in evt:
              evt['event_id'] = evt.get('index', 'UNKNOWN_ID')
 
-        print(f"--- Analyzing Event {evt['event_id']} (True Label: {evt['label']}) ---")
-        
+    log = results_log.ResultsLog(RESULTS_LOG_PATH)
+    if resume:
+        completed = log.completed()
+        todo = [str(evt['event_id']) not in completed for evt in out]
+        print(f"Resuming from {RESULTS_LOG_PATH}: {len(out) - sum(todo)} of {len(out)} events already classified")
+    else:
+        log.reset()
+        completed = {}
+        todo = [True] * len(out)
+
+    started = time.perf_counter()
+    pending = [evt for evt, needed in zip(out, todo) if needed]
+    escalated = pending
+    decided: List[Dict[str, Any]] = []
+    if use_rules:
+        decisions = rule_classifier.classify_events(test_sample[todo], min_confidence=min_rule_confidence)
+        escalated = []
+        for evt, decision in zip(pending, decisions.to_dict('records')):
+            evt['decision_tier'] = decision['decision_tier']
+            if decision['decision_tier'] == rule_classifier.TIER_RULES:
+                evt['api_analysis'] = rule_classifier.rule_analysis(
+                    decision['rule_classification'], decision['rule_confidence'], decision['s2_over_s1_ratio'])
+                decided.append(evt)
+            else:
+                evt['escalation_reason'] = decision['escalation_reason']
+                escalated.append(evt)
+        log.append(decided)
+        print(f"Rule tier decided {len(decided)} of {len(pending)} events "
+              f"({len(decided) / max(len(pending), 1) * 100:.1f}%); "
+              f"escalating {len(escalated)} to Claude: {decisions['escalation_reason'].value_counts().to_dict()}")
+    else:
+        for evt in pending:
+            evt['decision_tier'] = rule_classifier.TIER_LLM
+
+    # Every event of the run is submitted once, so exact-mode candidates become final as the run progresses
+    hypotheses = (HypothesisPipeline(top_n=top_anomalies, workers=hypothesis_workers, timeout=timeout,
+                                     exact=exact_top_anomalies, expected=len(out))
+                  if generate_hypotheses else None)
+
+    def log_results(pack: List[Dict[str, Any]], analyses: List[Dict[str, Any]]) -> None:
+        for evt, api_analysis in zip(pack, analyses):
+            # Append the analysis to the event data
+            evt['api_analysis'] = api_analysis
+        log.append(pack)
+        if hypotheses is not None:
+            hypotheses.submit(pack)
+
+    elapsed = 0.0
+
+    async def classify() -> None:
+        nonlocal elapsed
         # This is where the token usage occurs
-        api_analysis = classify_event_api(evt)
-        
-        # Append the analysis to the event data
-        evt['api_analysis'] = api_analysis
-        out.append(evt)
-        
-        # Print the key results directly - ENHANCED OUTPUT
-        if isinstance(api_analysis, dict) and 'classification' in api_analysis:
-            print(f"\n{'='*70}")
-            print(f"CLASSIFICATION: {api_analysis['classification']}")
-            print(f"CONFIDENCE: {api_analysis['confidence']:.2f}")
-            print(f"{'='*70}")
-            
-            # Print all reasoning sections
-            reasoning_sections = [
-                ('S2/S1 ANALYSIS', api_analysis.get('s2_s1_analysis')),
-                ('ENERGY ANALYSIS', api_analysis.get('energy_analysis')),
-                ('POSITION ANALYSIS', api_analysis.get('position_analysis')),
-                ('PULSE CHARACTERISTICS', api_analysis.get('pulse_characteristics')),
-                ('PHYSICS INTERPRETATION', api_analysis.get('physics_interpretation')),
-                ('COMPARISON WITH LITERATURE', api_analysis.get('comparison_with_literature')),
-                ('ALTERNATIVE INTERPRETATIONS', api_analysis.get('alternative_interpretations')),
-                ('CONFIDENCE FACTORS', api_analysis.get('confidence_factors')),
-                ('FOLLOW-UP RECOMMENDATIONS', api_analysis.get('follow_up_recommendations'))
-            ]
-            
-            for section_name, content in reasoning_sections:
-                if content:
-                    print(f"\n{section_name}:")
-                    print(f"{content}")
-            
-            print(f"\n{'='*70}\n")
-        else:
-            print(f"API Error or Malformed Response: {api_analysis}")
-            
-        # Wait to respect rate limits and manage costs
-        time.sleep(2) 
-
-    # Save the final results
-    output_filename = 'dataset/claude_classified_results_detailed.json'
-    with open(output_filename, 'w', encoding='utf-8') as f:
-        json.dump(out, f, indent=2, ensure_ascii=False)
-    print(f'\nPipeline complete. Detailed results saved to {output_filename}')
+        if escalated:
+            await classify_events_async(escalated, concurrency, timeout, pack_size, on_results=log_results)
+        elapsed = time.perf_counter() - started
+        print(f"Classified {len(pending)} events in {elapsed:.1f} s "
+              f"({len(pending) / max(elapsed, 1e-9):.2f} events/s)")
+
+    async def classify_and_analyze() -> None:
+        async with hypotheses:
+            # Events classified by the rules or in the resumed run are scored first
+            resumed = [completed[str(evt['event_id'])] for evt, needed in zip(out, todo) if not needed]
+            hypotheses.submit(resumed + decided)
+            await classify()
+
+    if pack_size > MAX_PACK_SIZE:
+        print(f"Pack size {pack_size} would not fit the output limit; packing {MAX_PACK_SIZE} events per request.")
+        pack_size = MAX_PACK_SIZE
+    print(f"Classifying {len(escalated)} events with up to {concurrency} concurrent API calls"
+          f"{f' of up to {pack_size} events each' if pack_size > 1 else ''}...\n")
+    try:
+        asyncio.run(classify() if hypotheses is None else classify_and_analyze())
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Completed results are kept in {RESULTS_LOG_PATH}; "
+              f"rerun with the same arguments and --resume to continue.")
+        sys.exit(130)
+    print(llm_cache.shared_cache().summary())
+    print(llm_gateway.gateway().usage_summary())
+
+    # Save the final results, compacted from the log
+    out = log.compact(RESULTS_PATH, [str(evt['event_id']) for evt in out])
+    failed = sum(not results_log.is_success(evt) for evt in out)
+    print(f'\nPipeline complete. Detailed results saved to {RESULTS_PATH}')
+    if failed:
+        print(f'{failed} events have no successful result; rerun with --resume to retry them.')
     
     return out  # Return classified events for hypothesis generation
 
 
 def main() -> None:
     args = parse_args()
-    try:
-        df = pd.read_csv(CSV)
-    except FileNotFoundError:
-        print(f'Error: {CSV} not found. Ensure the dataset is in the current directory.')
+    llm_cache.shared_cache().bypass = args.no_cache
+    dataset_path = dataset_io.find_dataset(DATASET_DIR)
+    if dataset_path is None:
+        print(f'Error: no dataset found in {DATASET_DIR}/. Run main.py to generate it.')
         sys.exit(1)
 
-    # Ensure event_id is a column for consistent tracking
-    if 'event_id' not in df.columns:
-        df = df.reset_index().rename(columns={'index': 'event_id'})
-
-    # Run classification pipeline
-    classified_events = run_api_pipeline(df, num_events=args.num_events)
-    
-    # Optionally run hypothesis generation for anomalies
-    if args.generate_hypotheses:
-        print(f"\n{'='*80}")
-        print("Starting Physics-Based Hypothesis Generation...")
-        print(f"{'='*80}\n")
-        run_hypothesis_generation(classified_events, top_n=args.top_anomalies)
+    # Only events with a measured S2/S1 can be sampled, so drop the rest at read time
+    # and restrict to the requested run period (only matching partitions are opened)
+    filters = dataset_io.period_filters(args.start, args.end)
+    if 's2_over_s1_ratio' in dataset_io.dataset_columns(dataset_path):
+        filters.append(('s2_over_s1_ratio', 'notna'))
+    if args.all_events:
+        events = dataset_io.load_dataset(dataset_path, filters=filters)
     else:
-        print("\n💡 Tip: Use --generate-hypotheses to analyze anomalous events")
-        print("   Example: python mainClassify.py --num-events 20 --generate-hypotheses --top-anomalies 5")
+        # The sample is drawn while streaming, so the dataset is never held in memory
+        events = dataset_io.iter_batches(dataset_path, filters=filters)
 
+    # Run classification pipeline, generating hypotheses for anomalies as their results arrive
+    run_api_pipeline(events, num_events=args.num_events,
+                     concurrency=args.concurrency, timeout=args.timeout,
+                     pack_size=args.pack_size, use_rules=not args.no_rules,
+                     all_events=args.all_events,
+                     min_rule_confidence=args.min_rule_confidence,
+                     resume=args.resume, seed=args.seed,
+                     generate_hypotheses=args.generate_hypotheses,
+                     top_anomalies=args.top_anomalies,
+                     hypothesis_workers=args.hypothesis_workers,
+                     exact_top_anomalies=args.exact_top_anomalies)
 
-if __name__ == '__main__':
-    main()
+    if not args.generate_hypotheses:
+        print("\n💡 Tip: Use --generate-hypotheses to analyze anomalous events")
+        print("   Example: python mainClassify.py --num-events 20 --generate-hypotheses --top-anomalies 5")
 
 
 # ==================== PHYSICS-BASED HYPOTHESIS GENERATION ====================
@@ -525,23 +933,87 @@ def identify_anomalies(classified_events: List[Dict[str, Any]], anomaly_threshol
     return anomalies
 
 
-def generate_physics_hypotheses(anomaly: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Generate 3 physics-based hypotheses for each anomalous event using Claude API.
-    """
-    
+# Static instructions of the hypothesis prompt, sent as a cached system prompt
+HYPOTHESIS_INSTRUCTIONS = f"""You are a particle physicist investigating an anomalous detector event.
+
+Provide THREE physics-based hypotheses ranked by likelihood: the most likely explanation,
+an alternative hypothesis and an exotic/novel physics explanation. Record them with the
+{HYPOTHESIS_TOOL} tool, using the Event ID from the event details as event_id."""
+
+
+def _hypothesis_schema(name: str, probability: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    properties = {
+        "name": {"type": "STRING", "description": f"Short name, e.g. \"{name}\""},
+        "probability": {"type": "STRING", "description": f"Estimated probability, e.g. \"{probability}\""},
+        **{field: {"type": "STRING", "description": description} for field, description in fields.items()},
+    }
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+
+HYPOTHESIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "event_id": {"type": "STRING", "description": "The Event ID from the event details"},
+        "anomaly_summary": {"type": "STRING", "description": "Brief description of why this is anomalous"},
+        "hypothesis_1": _hypothesis_schema("Most Likely Explanation", "60-80%", {
+            "mechanism": "Physical mechanism description",
+            "explanation": "Why this explains the anomaly",
+            "precedents": "Known precedents from experiments",
+            "verification": "How to verify this hypothesis",
+            "expected_signatures": "What else should we see if this is true",
+            "discriminating_tests": "How to distinguish from other hypotheses",
+        }),
+        "hypothesis_2": _hypothesis_schema("Alternative Hypothesis", "20-40%", {
+            "mechanism": "Different physical interpretation",
+            "explanation": "Supporting evidence for this hypothesis",
+            "differences": "How it differs from hypothesis 1",
+            "verification": "Verification method",
+            "expected_signatures": "Expected additional signatures",
+            "discriminating_tests": "Tests to distinguish this hypothesis",
+        }),
+        "hypothesis_3": _hypothesis_schema("Exotic/Novel Physics", "5-20%", {
+            "mechanism": "Unusual or unexpected explanation",
+            "explanation": "Why standard physics might not apply",
+            "implications": "Implications if true",
+            "testing": "How to test this hypothesis",
+            "expected_signatures": "Unique signatures to look for",
+            "discriminating_tests": "Critical tests needed",
+        }),
+        "immediate_actions": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Immediate follow-up actions"},
+        "data_requirements": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Data needed to decide"},
+        "literature_references": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Relevant publications"},
+        "recommended_priority": {"type": "STRING", "enum": ["high", "medium", "low"]},
+    },
+    "required": ["event_id", "anomaly_summary", "hypothesis_1", "hypothesis_2", "hypothesis_3",
+                 "immediate_actions", "data_requirements", "literature_references", "recommended_priority"],
+}
+
+
+def hypothesis_cache_lookup(anomaly: Dict[str, Any]) -> tuple:
+    """Returns (cache_key, cached hypotheses or None) for an anomaly."""
+    # The response depends on everything in the prompt except the event's identity
+    cache_features = {k: v for k, v in anomaly.items() if k != 'Event_ID'}
+    cache_features['Event_Data'] = {k: v for k, v in anomaly['Event_Data'].items() if k != 'Timestamp'}
+    return llm_cache.lookup('hypotheses', llm_gateway.gateway().model, HYPOTHESIS_PROMPT_VERSION, cache_features)
+
+
+def hypothesis_tool() -> Dict[str, Any]:
+    return structured_output.tool(HYPOTHESIS_TOOL, "Record the ranked physics hypotheses for one event.",
+                                  HYPOTHESIS_SCHEMA)
+
+
+def build_hypothesis_request(anomaly: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the messages request for an anomaly's hypotheses (the gateway adds the defaults)."""
     event = anomaly['Event_Data']
     flags = anomaly['Flags']
-    
+
     flags_description = "\n".join([
         f"- {f['type']}: {f['value']} (severity: {f['severity']})"
         for f in flags
     ])
     
-    prompt = f"""You are a particle physicist investigating an anomalous detector event.
-
-EVENT DETAILS:
-- Event ID: {event['Event_ID']}
+    prompt = f"""EVENT DETAILS:
+- Event ID: {anomaly['Event_ID']}
 - Classification: {anomaly['Classification']} (Confidence: {anomaly['Confidence']:.2f})
 - Anomaly Score: {anomaly['Anomaly_Score']:.2f}
 - Severity: {anomaly['Severity']}
@@ -559,195 +1031,299 @@ FULL EVENT DATA:
 - Quality: {event['Quality']:.2f}
 - Pile-up Flag: {event['Pile_up']}
 
-Provide THREE physics-based hypotheses ranked by likelihood. Output must be ONLY valid JSON.
-
-Required JSON structure:
-{{
-  "event_id": "{event['Event_ID']}",
-  "anomaly_summary": "Brief description of why this is anomalous",
-  "hypothesis_1": {{
-    "name": "Most Likely Explanation",
-    "probability": "60-80%",
-    "mechanism": "Physical mechanism description",
-    "explanation": "Why this explains the anomaly",
-    "precedents": "Known precedents from experiments",
-    "verification": "How to verify this hypothesis",
-    "expected_signatures": "What else should we see if this is true",
-    "discriminating_tests": "How to distinguish from other hypotheses"
-  }},
-  "hypothesis_2": {{
-    "name": "Alternative Hypothesis",
-    "probability": "20-40%",
-    "mechanism": "Different physical interpretation",
-    "explanation": "Supporting evidence for this hypothesis",
-    "differences": "How it differs from hypothesis 1",
-    "verification": "Verification method",
-    "expected_signatures": "Expected additional signatures",
-    "discriminating_tests": "Tests to distinguish this hypothesis"
-  }},
-  "hypothesis_3": {{
-    "name": "Exotic/Novel Physics",
-    "probability": "5-20%",
-    "mechanism": "Unusual or unexpected explanation",
-    "explanation": "Why standard physics might not apply",
-    "implications": "Implications if true",
-    "testing": "How to test this hypothesis",
-    "expected_signatures": "Unique signatures to look for",
-    "discriminating_tests": "Critical tests needed"
-  }},
-  "immediate_actions": ["Action 1", "Action 2", "Action 3"],
-  "data_requirements": ["Requirement 1", "Requirement 2"],
-  "literature_references": ["Reference 1", "Reference 2"],
-  "recommended_priority": "high/medium/low"
-}}
-
-CRITICAL: Return ONLY the JSON object, no markdown, no code blocks, no extra text."""
+Provide the three hypotheses for this event."""
+
+    return {
+        "max_tokens": 3500,
+        "system": llm_gateway.cacheable(HYPOTHESIS_INSTRUCTIONS),
+        "messages": [{"role": "user", "content": prompt}],
+    }
+
+
+def generate_physics_hypotheses(anomaly: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate 3 physics-based hypotheses for each anomalous event using Claude API.
+    """
+    cache_key, cached = hypothesis_cache_lookup(anomaly)
+    if cached is not None:
+        return {**cached, 'event_id': str(anomaly['Event_ID'])}
 
     try:
-        # Initialize the Anthropic client
-        client = anthropic.Anthropic(api_key=API_KEY)
-        
-        # Create the message using Claude
-        message = client.messages.create(
-            model=MODEL_NAME,
-            max_tokens=3500,
-            temperature=0.0,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        # Extract and clean the response
-        if message.content and len(message.content) > 0:
-            json_text = message.content[0].text
-            
-            # Clean the JSON text
-            json_text = json_text.strip()
-            
-            # Remove markdown code blocks if present
-            if json_text.startswith('```json'):
-                json_text = json_text[7:]
-            if json_text.startswith('```'):
-                json_text = json_text[3:]
-            if json_text.endswith('```'):
-                json_text = json_text[:-3]
-            
-            # Remove control characters
-            json_text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', json_text)
-            json_text = json_text.strip()
-            
-            # Try to parse
-            try:
-                return json.loads(json_text)
-            except json.JSONDecodeError as e:
-                # Try to extract JSON between braces
-                brace_start = json_text.find('{')
-                brace_end = json_text.rfind('}')
-                if brace_start != -1 and brace_end != -1:
-                    clean_json = json_text[brace_start:brace_end+1]
-                    try:
-                        return json.loads(clean_json)
-                    except:
-                        pass
-                
-                # Return error with partial data
-                return {
-                    "error": f"JSON parsing failed: {str(e)}",
-                    "event_id": event['Event_ID'],
-                    "anomaly_summary": "Error generating hypotheses",
-                    "raw_response": json_text[:500]
-                }
-        
-        return {"error": "Empty response from API", "event_id": event['Event_ID']}
+        # Answered through the hypothesis tool on the gateway's pooled client, within the
+        # account's rate limits; a response failing the schema is sent back for correction
+        hypotheses = llm_gateway.gateway().create_structured(hypothesis_tool(), **build_hypothesis_request(anomaly))
+        llm_cache.store(cache_key, hypotheses, 'hypotheses')
+        return hypotheses
     
+    except structured_output.StructuredOutputError as e:
+        return {"error": f"Invalid structured response: {e}", "event_id": anomaly['Event_ID']}
     except Exception as e:
-        return {"error": f"API call failed: {str(e)}", "event_id": event['Event_ID']}
+        return {"error": f"API call failed: {str(e)}", "event_id": anomaly['Event_ID']}
 
 
-def run_hypothesis_generation(classified_events: List[Dict[str, Any]], top_n: int = 10) -> None:
+async def generate_physics_hypotheses_async(client: "anthropic.AsyncAnthropic", anomaly: Dict[str, Any],
+                                            timeout: float = DEFAULT_TIMEOUT_S) -> Dict[str, Any]:
     """
-    Main pipeline for generating physics hypotheses for anomalous events.
+    Async counterpart of generate_physics_hypotheses() on a client from
+    llm_gateway.gateway().async_session(); gives up after `timeout` seconds.
     """
+    cache_key, cached = hypothesis_cache_lookup(anomaly)
+    if cached is not None:
+        return {**cached, 'event_id': str(anomaly['Event_ID'])}
+
+    try:
+        hypotheses = await asyncio.wait_for(
+            llm_gateway.gateway().create_structured_async(client, hypothesis_tool(),
+                                                          **build_hypothesis_request(anomaly)),
+            timeout)
+        llm_cache.store(cache_key, hypotheses, 'hypotheses')
+        return hypotheses
+    except asyncio.TimeoutError:
+        return {"error": f"Request timed out after {timeout:g} s", "event_id": anomaly['Event_ID']}
+    except structured_output.StructuredOutputError as e:
+        return {"error": f"Invalid structured response: {e}", "event_id": anomaly['Event_ID']}
+    except Exception as e:
+        return {"error": f"API call failed: {str(e)}", "event_id": anomaly['Event_ID']}
+
+
+def save_hypotheses(anomaly: Dict[str, Any], hypotheses: Dict[str, Any], output_dir: str = ANOMALY_DIR) -> str:
+    """Writes an event's hypotheses to its own file (atomically, as it may be watched); returns the path."""
+    filename = os.path.join(output_dir, f"event_{anomaly['Event_ID']}_hypotheses.json")
+    with open(f"{filename}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(hypotheses, f, indent=2, ensure_ascii=False)
+    os.replace(f"{filename}.tmp", filename)
+    return filename
+
+
+def print_hypotheses(idx: int, anomaly: Dict[str, Any], hypotheses: Dict[str, Any],
+                     filename: Optional[str] = None) -> None:
+    """Prints an anomaly's flags and a summary of its hypotheses (or the error)."""
     print(f"\n{'='*80}")
-    print("PHYSICS-BASED HYPOTHESIS GENERATION")
-    print(f"{'='*80}\n")
-    
-    # Identify anomalies
-    print("🔍 Identifying anomalous events...")
-    anomalies = identify_anomalies(classified_events, anomaly_threshold=0.3)
+    print(f"ANOMALY EVENT #{idx}: {anomaly['Event_ID']}")
+    print(f"Severity: {anomaly['Severity'].upper()} | Anomaly Score: {anomaly['Anomaly_Score']:.2f}")
+    print(f"{'='*80}")
     
-    print(f"✅ Found {len(anomalies)} anomalous events")
-    print(f"📊 Analyzing top {min(top_n, len(anomalies))} highest-priority anomalies...\n")
+    # Print anomaly flags
+    print(f"\n🚩 ANOMALOUS FEATURES:")
+    for flag in anomaly['Flags']:
+        print(f"   • {flag['type']}: {flag['value']} (severity: {flag['severity']})")
+
+    if 'error' in hypotheses:
+        print(f"\n❌ Error: {hypotheses.get('error', 'Unknown error')}")
+        return
+
+    # Print summary
+    print(f"\n✅ HYPOTHESIS SUMMARY:")
+    print(f"\n📌 MOST LIKELY ({hypotheses.get('hypothesis_1', {}).get('probability', 'N/A')}):")
+    print(f"   {hypotheses.get('hypothesis_1', {}).get('mechanism', 'N/A')}")
     
-    # Create output directory
-    import os
-    os.makedirs('anomaly_analysis', exist_ok=True)
+    print(f"\n📌 ALTERNATIVE ({hypotheses.get('hypothesis_2', {}).get('probability', 'N/A')}):")
+    print(f"   {hypotheses.get('hypothesis_2', {}).get('mechanism', 'N/A')}")
     
-    # Generate hypotheses for top N anomalies
-    all_hypotheses = []
+    print(f"\n📌 EXOTIC ({hypotheses.get('hypothesis_3', {}).get('probability', 'N/A')}):")
+    print(f"   {hypotheses.get('hypothesis_3', {}).get('mechanism', 'N/A')}")
     
-    for idx, anomaly in enumerate(anomalies[:top_n], 1):
+    print(f"\n🎯 IMMEDIATE ACTIONS:")
+    for action in hypotheses.get('immediate_actions', [])[:3]:
+        print(f"   • {action}")
+
+    if filename:
+        print(f"\n💾 Saved to: {filename}")
+
+
+class HypothesisPipeline:
+    """
+    Consumer half of the classification pipeline.
+
+    submit() scores classified events with identify_anomalies() as they
+    arrive and queues each anomaly at once for a pool of `workers`
+    concurrent hypothesis requests; the highest-scoring waiting anomaly goes
+    first. The top_n budget bounds the queue: it never holds more anomalies
+    than requests are left to start, and a better-scoring arrival displaces
+    the lowest waiting one. So the first hypotheses start while
+    classification is still running, and the analyzed events are the best
+    ones seen by the time a worker was free.
+
+    With exact=True the analyzed events are exactly the run's top_n instead
+    (ties to the earlier event, as in a ranked batch), at the price of a
+    late start: a candidate is queued only once it can no longer be
+    displaced, i.e. the k-th best when the `expected` events still to come
+    number at most top_n - k (or when the block is left).
+
+    Each event's hypotheses are written to output_dir as soon as they
+    complete. Use it as an async context manager inside the running event
+    loop; leaving the block waits for the queued anomalies and writes the
+    run summary:
+
+        async with HypothesisPipeline(top_n=10) as pipeline:
+            pipeline.submit(classified_events)
+    """
+
+    def __init__(self, top_n: int = 10, workers: int = DEFAULT_HYPOTHESIS_WORKERS,
+                 threshold: float = ANOMALY_THRESHOLD, timeout: float = DEFAULT_TIMEOUT_S,
+                 output_dir: str = ANOMALY_DIR, exact: bool = False, expected: Optional[int] = None):
+        self.top_n = top_n
+        self.exact = exact
+        self.expected = expected
+        self.workers = max(workers, 1)
+        self.threshold = threshold
+        self.timeout = timeout
+        self.output_dir = output_dir
+        self.events_submitted = 0
+        self.events_scored = 0
+        self.anomalies_found = 0
+        self.started = 0
+        self.completed = 0
+        self.results: List[Dict[str, Any]] = []
+        self.first_result_s: Optional[float] = None
+        # Anomalies waiting for a worker, as ((score, -seq), seq, anomaly); at most top_n - started
+        self._waiting: List[tuple] = []
+        # exact mode: min-heap of the best candidates so far, and those already released
+        self._top: List[tuple] = []
+        self._released: set = set()
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+        self._tasks: List[asyncio.Task] = []
+        self._stack = contextlib.AsyncExitStack()
+        self._client = None
+        self._t0 = 0.0
+
+    async def __aenter__(self) -> "HypothesisPipeline":
+        print(f"\n🔍 Scoring classified events for anomalies as they arrive; generating hypotheses "
+              f"for up to {self.top_n} of them with {self.workers} concurrent requests.\n")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._t0 = time.perf_counter()
+        self._client = await self._stack.enter_async_context(llm_gateway.gateway().async_session())
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    def submit(self, events: List[Dict[str, Any]]) -> None:
+        """Scores classified events and queues their anomalies within the top_n budget."""
+        # Failed results count towards `expected` but are not scored
+        self.events_submitted += len(events)
+        events = [evt for evt in events if results_log.is_success(evt)]
+        self.events_scored += len(events)
+        anomalies = identify_anomalies(events, anomaly_threshold=self.threshold)
+        self.anomalies_found += len(anomalies)
+        # identify_anomalies() sorts stably, so equal scores keep their arrival order
+        for anomaly in anomalies:
+            self._seq += 1
+            entry = ((anomaly['Anomaly_Score'], -self._seq), self._seq, anomaly)
+            if not self.exact:
+                self._enqueue(entry)
+            elif len(self._top) < self.top_n:
+                heapq.heappush(self._top, entry)
+            elif entry[0] > self._top[0][0]:
+                heapq.heapreplace(self._top, entry)
+        if self.exact and self.expected is not None:
+            self._release(max(self.expected - self.events_submitted, 0))
+
+    def _enqueue(self, entry: tuple) -> None:
+        """Adds an anomaly to the waiting list, dropping the lowest entry beyond the budget."""
+        self._waiting.append(entry)
+        if len(self._waiting) > self.top_n - self.started:
+            self._waiting.remove(min(self._waiting))
+        self._wakeup.set()
+
+    def _release(self, remaining: int) -> None:
+        """exact mode: queues the candidates that the `remaining` unseen events can no longer displace."""
+        final = sorted(self._top, reverse=True)[:max(self.top_n - remaining, 0)]
+        for entry in final:
+            if entry[1] not in self._released:
+                self._released.add(entry[1])
+                self._enqueue(entry)
+
+    async def _next(self) -> Optional[Dict[str, Any]]:
+        """The best waiting anomaly, once there is one; None when the pipeline is closing and drained."""
+        while not self._waiting:
+            if self._closing:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        entry = max(self._waiting)
+        self._waiting.remove(entry)
+        self.started += 1
+        return entry[2]
+
+    async def _worker(self) -> None:
+        while True:
+            anomaly = await self._next()
+            if anomaly is None:
+                return
+            hypotheses = await generate_physics_hypotheses_async(self._client, anomaly, self.timeout)
+            self.completed += 1
+            filename = None
+            if 'error' not in hypotheses:
+                filename = save_hypotheses(anomaly, hypotheses, self.output_dir)
+                self.results.append({'anomaly': anomaly, 'hypotheses': hypotheses})
+                if self.first_result_s is None:
+                    self.first_result_s = time.perf_counter() - self._t0
+            print_hypotheses(self.completed, anomaly, hypotheses, filename)
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                if self.exact:
+                    self._release(0)
+                self._closing = True
+                self._wakeup.set()
+                await asyncio.gather(*self._tasks)
+            else:
+                for task in self._tasks:
+                    task.cancel()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            await self._stack.aclose()
+        if exc_type is None:
+            self.write_summary()
+
+    def write_summary(self) -> None:
+        """Writes the run summary next to the per-event files and prints the totals."""
+        summary_file = os.path.join(self.output_dir, 'comprehensive_analysis.json')
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'analysis_date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'total_events_analyzed': self.events_scored,
+                'total_anomalies_found': self.anomalies_found,
+                'hypotheses_generated': len(self.results),
+                'anomalies': self.results
+            }, f, indent=2, ensure_ascii=False)
+        
         print(f"\n{'='*80}")
-        print(f"ANOMALY EVENT #{idx}: {anomaly['Event_ID']}")
-        print(f"Severity: {anomaly['Severity'].upper()} | Anomaly Score: {anomaly['Anomaly_Score']:.2f}")
+        print(f"✅ HYPOTHESIS GENERATION COMPLETE")
         print(f"{'='*80}")
-        
-        # Print anomaly flags
-        print(f"\n🚩 ANOMALOUS FEATURES:")
-        for flag in anomaly['Flags']:
-            print(f"   • {flag['type']}: {flag['value']} (severity: {flag['severity']})")
-        
-        print(f"\n🤖 Generating physics hypotheses...")
-        hypotheses = generate_physics_hypotheses(anomaly)
-        
-        if 'error' not in hypotheses:
-            # Save to individual file
-            filename = f"anomaly_analysis/event_{anomaly['Event_ID']}_hypotheses.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(hypotheses, f, indent=2, ensure_ascii=False)
-            
-            # Print summary
-            print(f"\n✅ HYPOTHESIS SUMMARY:")
-            print(f"\n📌 MOST LIKELY ({hypotheses.get('hypothesis_1', {}).get('probability', 'N/A')}):")
-            print(f"   {hypotheses.get('hypothesis_1', {}).get('mechanism', 'N/A')}")
-            
-            print(f"\n📌 ALTERNATIVE ({hypotheses.get('hypothesis_2', {}).get('probability', 'N/A')}):")
-            print(f"   {hypotheses.get('hypothesis_2', {}).get('mechanism', 'N/A')}")
-            
-            print(f"\n📌 EXOTIC ({hypotheses.get('hypothesis_3', {}).get('probability', 'N/A')}):")
-            print(f"   {hypotheses.get('hypothesis_3', {}).get('mechanism', 'N/A')}")
-            
-            print(f"\n🎯 IMMEDIATE ACTIONS:")
-            for action in hypotheses.get('immediate_actions', [])[:3]:
-                print(f"   • {action}")
-            
-            print(f"\n💾 Saved to: {filename}")
-            
-            # Add to collection
-            all_hypotheses.append({
-                'anomaly': anomaly,
-                'hypotheses': hypotheses
-            })
-        else:
-            print(f"\n❌ Error: {hypotheses.get('error', 'Unknown error')}")
-        
-        # Rate limiting
-        time.sleep(3)
-    
-    # Save comprehensive summary
-    summary_file = 'anomaly_analysis/comprehensive_analysis.json'
-    with open(summary_file, 'w', encoding='utf-8') as f:
-        json.dump({
-            'analysis_date': time.strftime('%Y-%m-%d %H:%M:%S'),
-            'total_events_analyzed': len(classified_events),
-            'total_anomalies_found': len(anomalies),
-            'hypotheses_generated': len(all_hypotheses),
-            'anomalies': all_hypotheses
-        }, f, indent=2, ensure_ascii=False)
-    
+        print(f"📊 Total anomalies identified: {self.anomalies_found} in {self.events_scored} classified events")
+        print(f"🔬 Hypotheses generated for: {len(self.results)} of {self.started} anomalies analyzed")
+        if self.first_result_s is not None:
+            print(f"⏱️  First hypothesis written {self.first_result_s:.1f} s after the pipeline started")
+        print(f"💾 Comprehensive analysis saved to: {summary_file}")
+        print(f"🗄️  {llm_cache.shared_cache().summary()}")
+        print(f"🧮 {llm_gateway.gateway().usage_summary()}")
+        print(f"📁 Individual analyses in: {self.output_dir}/ directory")
+        print(f"{'='*80}\n")
+
+
+def run_hypothesis_generation(classified_events: List[Dict[str, Any]], top_n: int = 10,
+                              workers: int = DEFAULT_HYPOTHESIS_WORKERS,
+                              timeout: float = DEFAULT_TIMEOUT_S) -> None:
+    """
+    Generates physics hypotheses for the top_n highest-scoring anomalies of
+    an already classified batch (run_api_pipeline() does this while it
+    classifies when asked to).
+    """
     print(f"\n{'='*80}")
-    print(f"✅ HYPOTHESIS GENERATION COMPLETE")
-    print(f"{'='*80}")
-    print(f"📊 Total anomalies identified: {len(anomalies)}")
-    print(f"🔬 Hypotheses generated for: {len(all_hypotheses)} events")
-    print(f"💾 Comprehensive analysis saved to: {summary_file}")
-    print(f"📁 Individual analyses in: anomaly_analysis/ directory")
+    print("PHYSICS-BASED HYPOTHESIS GENERATION")
     print(f"{'='*80}\n")
+
+    async def run() -> None:
+        async with HypothesisPipeline(top_n=top_n, workers=workers, timeout=timeout) as pipeline:
+            # The whole batch is scored before a worker runs, so the queue keeps its top_n
+            pipeline.submit(classified_events)
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""rate_limiter.py - Adaptive rate limiting shared by every Claude API call site.
+
+A RateLimiter keeps three token buckets, for requests, input tokens and
+output tokens per minute, and callers acquire from them before each request.
+Responses feed back into it:
+
+- the anthropic-ratelimit-*-limit / -remaining headers resize the buckets to
+  the account's actual quota and clamp them to what the server says is left;
+- 429 (rate limited) and 529 (overloaded) responses block every caller for
+  retry-after seconds (or an exponential backoff with jitter) and halve the
+  refill rate, which then recovers step by step as requests succeed.
+
+Transient failures (other 5xx, 408/409, dropped connections and timeouts) are
+retried by the failing caller alone, with the same backoff, as the SDK's own
+retries are turned off so every attempt goes through the limiter.
+
+The limiter is thread-safe and works from both synchronous and asyncio code.
+Limits default to the LLM_RPM / LLM_INPUT_TPM / LLM_OUTPUT_TPM environment
+variables and are replaced by the header values once the first response
+arrives.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import anthropic
+
+RETRY_STATUSES = (429, 529)
+# Besides these, every 5xx other than 529 is transient
+TRANSIENT_STATUSES = (408, 409)
+MAX_RETRIES = 6
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+
+# Refill-rate multiplier after throttling: halved per 429/529, +0.1 per success
+MIN_RATE_FACTOR = 0.1
+RATE_RECOVERY_STEP = 0.1
+
+# Quota defaults until the first response headers arrive
+DEFAULT_LIMITS = {'requests': 50, 'input_tokens': 50_000, 'output_tokens': 10_000}
+LIMIT_ENV_VARS = {'requests': 'LLM_RPM', 'input_tokens': 'LLM_INPUT_TPM', 'output_tokens': 'LLM_OUTPUT_TPM'}
+
+# Bucket -> (limit header, remaining header)
+_HEADERS = {
+    'requests': ('anthropic-ratelimit-requests-limit', 'anthropic-ratelimit-requests-remaining'),
+    'input_tokens': ('anthropic-ratelimit-input-tokens-limit', 'anthropic-ratelimit-input-tokens-remaining'),
+    'output_tokens': ('anthropic-ratelimit-output-tokens-limit', 'anthropic-ratelimit-output-tokens-remaining'),
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is still throttled after MAX_RETRIES retries."""
+
+
+class _Bucket:
+    """Token bucket holding up to `capacity` units, refilled at capacity per minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, rate_factor: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60 * rate_factor)
+        self.updated = now
+
+    def wait_time(self, amount: float, rate_factor: float) -> float:
+        """Seconds until `amount` units are available (amounts above capacity wait for a full bucket)."""
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) / (self.capacity / 60 * rate_factor)
+
+
+def configured_limits() -> Dict[str, int]:
+    """DEFAULT_LIMITS overridden by the LLM_* environment variables (read at call time, after .env is loaded)."""
+    return {name: int(os.getenv(LIMIT_ENV_VARS[name], default)) for name, default in DEFAULT_LIMITS.items()}
+
+
+def _header(headers: Optional[Mapping[str, str]], name: str) -> Optional[float]:
+    try:
+        return float(headers[name]) if headers is not None and name in headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(error: Exception) -> bool:
+    """True for failures worth retrying that are not throttling: server errors, timeouts, lost connections."""
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUSES or (status >= 500 and status not in RETRY_STATUSES)
+    # APITimeoutError is a subclass
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter for retry number `attempt` (from 0)."""
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * random.uniform(1.0, 1.5)
+
+
+def _text_length(content: Any) -> int:
+    """Characters of text in a string or a list of content blocks."""
+    if isinstance(content, list):
+        return sum(len(str(block.get('text', ''))) if isinstance(block, dict) else len(str(block))
+                   for block in content)
+    return len(str(content))
+
+
+def estimate_input_tokens(request: Dict[str, Any]) -> int:
+    """Rough input token count of a messages request (about 4 characters per token)."""
+    chars = _text_length(request.get('system', '')) + len(str(request.get('tools', '')))
+    for message in request.get('messages', []):
+        chars += _text_length(message.get('content', ''))
+    return chars // 4 + 1
+
+
+class RateLimiter:
+    """Requests / input tokens / output tokens per minute limiter with server feedback."""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self._lock = threading.Lock()
+        self._buckets = {name: _Bucket(capacity) for name, capacity in {**configured_limits(), **(limits or {})}.items()}
+        self._rate_factor = 1.0
+        self._blocked_until = 0.0
+        # Output tokens are only known afterwards; reserve the running average
+        self._output_estimate = 500.0
+        self.stats = {'requests': 0, 'throttled': 0, 'retried': 0, 'waited_s': 0.0}
+
+    def _reserve(self, input_tokens: int) -> Tuple[float, float]:
+        """Takes capacity for one request if available; returns (wait seconds, output reservation)."""
+        with self._lock:
+            now = time.monotonic()
+            amounts = {'requests': 1, 'input_tokens': input_tokens, 'output_tokens': self._output_estimate}
+            for bucket in self._buckets.values():
+                bucket.refill(now, self._rate_factor)
+            wait = max([self._blocked_until - now] +
+                       [self._buckets[name].wait_time(amount, self._rate_factor) for name, amount in amounts.items()])
+            if wait > 0:
+                return wait, 0.0
+            for name, amount in amounts.items():
+                self._buckets[name].level -= amount
+            self.stats['requests'] += 1
+            return 0.0, amounts['output_tokens']
+
+    def acquire(self, input_tokens: int = 0) -> float:
+        """Blocks until a request of `input_tokens` fits the limits; returns the output tokens reserved."""
+        while True:
+            wait, reserved = self._reserve(input_tokens)
+            if wait <= 0:
+                return reserved
+            self.stats['waited_s'] += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, input_tokens: int = 0) -> float:
+        """acquire() for asyncio code: waits without blocking the event loop."""
+        while True:
+            wait, reserved = self._reserve(input_tokens)
+            if wait <= 0:
+                return reserved
+            self.stats['waited_s'] += wait
+            await asyncio.sleep(wait)
+
+    def record(self, status: int, headers: Optional[Mapping[str, str]] = None,
+               output_tokens: Optional[int] = None, reserved_output: float = 0.0,
+               attempt: int = 0) -> Optional[float]:
+        """
+        Feeds one response back into the limiter.
+
+        Returns the delay before retrying for 429/529 responses, None otherwise.
+        """
+        with self._lock:
+            for name, (limit_header, remaining_header) in _HEADERS.items():
+                bucket = self._buckets[name]
+                limit = _header(headers, limit_header)
+                if limit:
+                    bucket.level += limit - bucket.capacity
+                    bucket.capacity = limit
+                remaining = _header(headers, remaining_header)
+                if remaining is not None:
+                    bucket.level = min(bucket.level, remaining)
+
+            # Settle the output reservation against the real count (nothing for failed requests)
+            used = output_tokens if output_tokens is not None and status < 400 else 0
+            self._buckets['output_tokens'].level += reserved_output - used
+            if output_tokens is not None and status < 400:
+                self._output_estimate = 0.8 * self._output_estimate + 0.2 * output_tokens
+
+            if status in RETRY_STATUSES:
+                self.stats['throttled'] += 1
+                self._rate_factor = max(MIN_RATE_FACTOR, self._rate_factor / 2)
+                delay = _header(headers, 'retry-after')
+                # Jitter spreads out the callers released together
+                delay = backoff_delay(attempt) if delay is None else delay * random.uniform(1.0, 1.5)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                return delay
+
+            if status < 400:
+                self._rate_factor = min(1.0, self._rate_factor + RATE_RECOVERY_STEP)
+            return None
+
+    def _settle(self, status: int, headers, output_tokens: Optional[int], reserved: float,
+                attempt: int) -> Optional[float]:
+        delay = self.record(status, headers, output_tokens, reserved, attempt)
+        if delay is not None and attempt >= MAX_RETRIES:
+            raise RateLimitExceeded(f"Still throttled (HTTP {status}) after {MAX_RETRIES} retries")
+        return delay
+
+    def _failed(self, error: Exception, reserved: float, attempt: int) -> Optional[float]:
+        """
+        Handles a request that raised. Returns the delay before retrying a
+        transient failure, or None when the error should be raised (not
+        transient, or out of retries). Throttling goes through _settle().
+        """
+        status = getattr(error, 'status_code', None)
+        if status in RETRY_STATUSES:
+            return self._settle(status, getattr(getattr(error, 'response', None), 'headers', None),
+                                None, reserved, attempt)
+        # Give back the output reservation of a request that produced nothing
+        self.record(status if isinstance(status, int) else 599, None, None, reserved, attempt)
+        if not is_transient(error) or attempt >= MAX_RETRIES:
+            return None
+        with self._lock:
+            self.stats['retried'] += 1
+        return backoff_delay(attempt)
+
+    def create_message(self, client: Any, **request) -> Any:
+        """
+        client.messages.create(**request) through the limiter, retrying 429/529
+        responses and transient failures.
+        """
+        input_tokens = estimate_input_tokens(request)
+        for attempt in range(MAX_RETRIES + 1):
+            reserved = self.acquire(input_tokens)
+            try:
+                raw = client.messages.with_raw_response.create(**request)
+            except Exception as e:
+                delay = self._failed(e, reserved, attempt)
+                if delay is None:
+                    raise
+                if getattr(e, 'status_code', None) not in RETRY_STATUSES:
+                    self.stats['waited_s'] += delay
+                    time.sleep(delay)
+                continue
+            message = raw.parse()
+            self._settle(raw.status_code, raw.headers, getattr(getattr(message, 'usage', None), 'output_tokens', None),
+                         reserved, attempt)
+            return message
+
+    async def create_message_async(self, client: Any, **request) -> Any:
+        """create_message() for an AsyncAnthropic client."""
+        input_tokens = estimate_input_tokens(request)
+        for attempt in range(MAX_RETRIES + 1):
+            reserved = await self.acquire_async(input_tokens)
+            try:
+                raw = await client.messages.with_raw_response.create(**request)
+            except Exception as e:
+                delay = self._failed(e, reserved, attempt)
+                if delay is None:
+                    raise
+                if getattr(e, 'status_code', None) not in RETRY_STATUSES:
+                    self.stats['waited_s'] += delay
+                    await asyncio.sleep(delay)
+                continue
+            message = raw.parse()
+            self._settle(raw.status_code, raw.headers, getattr(getattr(message, 'usage', None), 'output_tokens', None),
+                         reserved, attempt)
+            return message
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> RateLimiter:
+    """Returns the process-wide limiter every call site goes through."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
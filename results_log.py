@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""results_log.py - Append-only log of classification results.
+
+Each classified event is appended to a JSONL log (one record per line,
+flushed and fsynced) as soon as its result arrives, so a crash, Ctrl-C or API
+outage loses at most the requests in flight. A resumed run reads the log and
+skips the events that already have a successful result; failed ones are
+retried. The final results file is compacted from the log (last record per
+event_id, in the requested order) and swapped in atomically, so readers
+never see a partial file.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List
+
+
+def is_success(record: Dict[str, Any]) -> bool:
+    """True for a record whose analysis is not an error."""
+    analysis = record.get('api_analysis')
+    return isinstance(analysis, dict) and 'error' not in analysis
+
+
+class ResultsLog:
+    """JSONL log of per-event result records, keyed by event_id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Starts an empty log."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, 'w', encoding='utf-8'):
+            pass
+
+    def _repair(self) -> None:
+        """Drops a partial last line left by a crash mid-write."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def records(self) -> Dict[str, Dict[str, Any]]:
+        """Last logged record per event_id."""
+        if not os.path.exists(self.path):
+            return {}
+        records = {}
+        with self._lock:
+            self._repair()
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[str(record.get('event_id'))] = record
+        return records
+
+    def completed(self) -> Dict[str, Dict[str, Any]]:
+        """Records of the events with a successful result (what a resumed run can skip)."""
+        return {event_id: record for event_id, record in self.records().items() if is_success(record)}
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Appends records and makes them durable before returning."""
+        lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
+        if not lines:
+            return
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self, json_path: str, order: List[str]) -> List[Dict[str, Any]]:
+        """
+        Writes the logged records of the event_ids in `order` to json_path
+        atomically (temporary file + rename); returns them.
+        """
+        records = self.records()
+        results = [records[event_id] for event_id in order if event_id in records]
+        tmp_path = f"{json_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, json_path)
+        return results
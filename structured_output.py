@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""structured_output.py - Schema-enforced responses through tool use.
+
+Instead of asking for JSON in free text and repairing it, a request offers a
+single tool whose input_schema is the response schema and forces the model to
+call it. The tool input arrives already parsed; validate() checks it against
+the schema (types, required fields, enums and numeric bounds), and a failure
+is reported back to the model as an error tool result for a targeted retry
+(see LLMGateway.create_structured()).
+
+Schemas may use the upper-case type names of the original prompt schemas
+("OBJECT", "STRING", ...); json_schema() converts them to JSON Schema.
+"""
+from typing import Any, Dict, List, Optional
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+}
+
+
+class StructuredOutputError(Exception):
+    """Raised when the model does not return a schema-conforming tool call."""
+
+
+def json_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a copy of `schema` with JSON Schema (lower-case) type names."""
+    converted = {}
+    for key, value in schema.items():
+        if key == 'type' and isinstance(value, str):
+            converted[key] = value.lower()
+        elif key == 'properties':
+            converted[key] = {name: json_schema(prop) for name, prop in value.items()}
+        elif key == 'items' and isinstance(value, dict):
+            converted[key] = json_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+
+def tool(name: str, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """A tool definition whose input is the response schema (the top level must be an object)."""
+    return {"name": name, "description": description, "input_schema": json_schema(schema)}
+
+
+def forced(tool_def: Dict[str, Any]) -> Dict[str, Any]:
+    """Request arguments offering only `tool_def` and requiring the model to call it."""
+    return {"tools": [tool_def], "tool_choice": {"type": "tool", "name": tool_def["name"]}}
+
+
+def validate(instance: Any, schema: Dict[str, Any], path: str = '$') -> List[str]:
+    """Returns the ways `instance` violates `schema` (empty if it conforms)."""
+    expected = str(schema.get('type', '')).lower()
+    python_type = _TYPES.get(expected)
+    if python_type is not None:
+        if not isinstance(instance, python_type) or (isinstance(instance, bool) and expected != 'boolean'):
+            return [f"{path}: expected {expected}, got {type(instance).__name__}"]
+    errors = []
+    if 'enum' in schema and instance not in schema['enum']:
+        errors.append(f"{path}: {instance!r} is not one of {schema['enum']}")
+    if isinstance(instance, (int, float)) and not isinstance(instance, bool):
+        if 'minimum' in schema and instance < schema['minimum']:
+            errors.append(f"{path}: {instance} is below the minimum {schema['minimum']}")
+        if 'maximum' in schema and instance > schema['maximum']:
+            errors.append(f"{path}: {instance} is above the maximum {schema['maximum']}")
+    if isinstance(instance, dict):
+        errors += [f"{path}: missing required field '{name}'"
+                   for name in schema.get('required', []) if name not in instance]
+        for name, prop in schema.get('properties', {}).items():
+            if name in instance:
+                errors += validate(instance[name], prop, f"{path}.{name}")
+    if isinstance(instance, list) and isinstance(schema.get('items'), dict):
+        for i, item in enumerate(instance):
+            errors += validate(item, schema['items'], f"{path}[{i}]")
+    return errors
+
+
+def tool_call(message: Any, name: str) -> Optional[Any]:
+    """The first tool_use block of `message` calling `name`, or None."""
+    for block in message.content or []:
+        if getattr(block, 'type', None) == 'tool_use' and block.name == name:
+            return block
+    return None
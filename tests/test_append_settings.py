@@ -0,0 +1,45 @@
+"""Append mode keeps the class mixture, sampling plan and detector of the dataset."""
+import tempfile
+import unittest
+
+import dataset_io
+import main
+
+
+class TestAppendSettings(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output = self._tmp.name
+        main.generate_dataset(n_events=4000, seed=3, output=self.output, formats=('parquet',),
+                              enrichment={'wimp_NR': 5}, detector_params={'radius_mm': 300})
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_plain_append_inherits_the_sampling_plan_and_detector(self):
+        before = dataset_io.read_metadata(self.output)
+        result = main.generate_dataset(n_events=4000, output=self.output, append=True)
+        new = result.events
+        self.assertGreater((new['label'] == 'WIMP-like').mean(), 0.12)
+        self.assertLessEqual(new['position_x_mm'].pow(2).add(new['position_y_mm'].pow(2)).pow(0.5).max(), 300)
+        after = result.metadata
+        self.assertEqual(after['generation']['sampling'], before['generation']['sampling'])
+        self.assertEqual(after['generation']['class_fractions'], before['generation']['class_fractions'])
+        self.assertEqual(after['physics_parameters'], before['physics_parameters'])
+
+    def test_matching_values_are_accepted(self):
+        main.generate_dataset(n_events=100, output=self.output, append=True,
+                              enrichment={'wimp_NR': 5}, detector_params={'radius_mm': 300},
+                              class_fractions=main.DEFAULT_CLASS_FRACTIONS)
+
+    def test_conflicting_values_raise(self):
+        for conflict in ({'enrichment': {'wimp_NR': 2}}, {'class_targets': {'wimp_NR': 50}},
+                         {'detector_params': {'radius_mm': 500}},
+                         {'class_fractions': {**main.DEFAULT_CLASS_FRACTIONS, 'wimp_NR': 0.5}}):
+            with self.subTest(conflict=conflict), self.assertRaises(ValueError):
+                main.generate_dataset(n_events=100, output=self.output, append=True, **conflict)
+        self.assertEqual(dataset_io.read_metadata(self.output)['total_events'], 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Coincidence groups across chunk boundaries and across appended batches."""
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import coincidence
+import dataset_io
+import main
+
+
+def _events(offsets_us):
+    times = main.RUN_START + np.asarray(offsets_us, dtype=np.int64).astype('timedelta64[us]')
+    return pd.DataFrame({'event_id': np.arange(len(offsets_us)), 'timestamp': times})
+
+
+class TestFindCoincidences(unittest.TestCase):
+    def test_chains_events_closer_than_the_window(self):
+        events = _events([0, 500, 1400, 5000, 9000, 9999])
+        group, pile_up = coincidence.find_coincidences(events['timestamp'], window_us=1000)
+        self.assertEqual(group.tolist(), [0, 0, 0, 1, 2, 2])
+        self.assertEqual(pile_up.tolist(), [1, 1, 1, 0, 1, 1])
+
+    def test_groups_are_numbered_in_time_order(self):
+        events = _events([9000, 0, 5000])
+        group, _ = coincidence.find_coincidences(events['timestamp'], window_us=1000, first_group=10)
+        self.assertEqual(group.tolist(), [12, 10, 11])
+
+
+class TestCoincidenceSweep(unittest.TestCase):
+    def test_chunked_sweep_matches_a_single_pass(self):
+        rng = np.random.default_rng(3)
+        offsets = np.cumsum(rng.exponential(800, size=2000)).astype(np.int64)
+        whole = coincidence.apply_coincidences(_events(offsets), window_us=1000)
+        # Cut between members of a group as well as between groups
+        cuts = [0, 1, 7, 250, 251, 999, 1500, 2000]
+        chunks = [_events(offsets).iloc[a:b] for a, b in zip(cuts[:-1], cuts[1:])]
+        sweep = coincidence.CoincidenceSweep(window_us=1000)
+        swept = pd.concat([c for c in sweep.process(chunks) if c is not None], ignore_index=True)
+        swept = swept.sort_values('event_id').reset_index(drop=True)
+        self.assertGreater(whole['pile_up_flag'].sum(), 0)
+        pd.testing.assert_frame_equal(swept, whole)
+        self.assertEqual(sweep.next_group, whole['coincidence_group'].max() + 1)
+
+    def test_group_spanning_several_chunks(self):
+        offsets = [0, 600, 1200, 1800, 2400, 10000]
+        chunks = [_events(offsets).iloc[i:i + 1] for i in range(len(offsets))]
+        swept = pd.concat([c for c in coincidence.CoincidenceSweep(1000).process(chunks) if c is not None])
+        self.assertEqual(swept.sort_values('event_id')['coincidence_group'].tolist(), [0, 0, 0, 0, 0, 1])
+
+
+class TestAppendContinuity(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _load(self):
+        events = dataset_io.load_dataset(dataset_io.find_dataset(self.output))
+        return events.sort_values('event_id').reset_index(drop=True)
+
+    def _check_continuous(self, events, total):
+        self.assertEqual(events['event_id'].tolist(), list(range(total)))
+        self.assertTrue(events['timestamp'].is_monotonic_increasing)
+        groups = events['coincidence_group'].to_numpy()
+        self.assertEqual(groups[0], 0)
+        self.assertTrue(np.all(np.diff(groups) >= 0))
+        self.assertTrue(np.all(np.diff(groups) <= 1))
+
+    def test_append_continues_ids_groups_and_time(self):
+        main.generate_dataset(n_events=1500, seed=5, output=self.output, formats=('parquet',))
+        main.generate_dataset(n_events=700, output=self.output, append=True)
+        events = self._load()
+        self._check_continuous(events, 2200)
+        metadata = dataset_io.read_metadata(self.output)
+        self.assertEqual(metadata['total_events'], 2200)
+        self.assertEqual(metadata['generation']['coincidence']['num_groups'],
+                         events['coincidence_group'].max() + 1)
+
+    def test_streamed_append_without_group_count(self):
+        main.generate_dataset(n_events=1500, seed=5, output=self.output, formats=('parquet',), chunk_size=500)
+        # Metadata written before the group count was recorded
+        path = os.path.join(self.output, dataset_io.METADATA_NAME)
+        with open(path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        del metadata['generation']['coincidence']['num_groups']
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        main.generate_dataset(n_events=600, output=self.output, append=True, chunk_size=300)
+        self._check_continuous(self._load(), 2100)
+
+
+if __name__ == '__main__':
+    unittest.main()
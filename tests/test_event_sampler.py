@@ -0,0 +1,69 @@
+"""StratifiedSampler: order and chunking independence, quotas."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import event_sampler
+from event_sampler import Stratum
+
+
+def _events(n=5000, seed=1):
+    rng = np.random.default_rng(seed)
+    labels = rng.choice(['Background', 'WIMP-like', 'Axion-like'], size=n, p=[0.9, 0.07, 0.03])
+    return pd.DataFrame({'event_id': np.arange(n), 'label': labels, 'value': rng.random(n)})
+
+
+def _chunks(events, size):
+    return [events.iloc[start:start + size] for start in range(0, len(events), size)]
+
+
+STRATA = [Stratum('signal', 40, [('label', '!=', 'Background')]),
+          Stratum('background', 40, [('label', '==', 'Background')])]
+
+
+class TestStratifiedSampler(unittest.TestCase):
+    def test_sample_does_not_depend_on_order_or_chunking(self):
+        events = _events()
+        reference = event_sampler.stratified_sample(_chunks(events, 5000), STRATA)
+        shuffled = events.sample(frac=1, random_state=9)
+        for chunk_size in (7, 37, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                sample = event_sampler.stratified_sample(_chunks(shuffled, chunk_size), STRATA)
+                pd.testing.assert_frame_equal(sample, reference)
+
+    def test_seed_changes_the_sample(self):
+        events = _events()
+        first = event_sampler.stratified_sample(_chunks(events, 500), STRATA, seed=1)
+        second = event_sampler.stratified_sample(_chunks(events, 500), STRATA, seed=2)
+        self.assertNotEqual(set(first['event_id']), set(second['event_id']))
+
+    def test_quotas_and_filters(self):
+        sample = event_sampler.stratified_sample(_chunks(_events(), 700), STRATA)
+        self.assertEqual((sample['label'] != 'Background').sum(), 40)
+        self.assertEqual((sample['label'] == 'Background').sum(), 40)
+        self.assertFalse(sample['event_id'].duplicated().any())
+
+    def test_open_quota_tops_up_a_short_stratum(self):
+        events = _events()
+        rare = int((events['label'] == 'Axion-like').sum())
+        strata = [Stratum('axion', 1000, [('label', '==', 'Axion-like')]),
+                  Stratum('rest', None, [('label', '!=', 'Axion-like')])]
+        sampler = event_sampler.StratifiedSampler(strata, total=1200)
+        for chunk in _chunks(events, 999):
+            sampler.update(chunk)
+        self.assertEqual(sampler.counts(), {'axion': rare, 'rest': 1200 - rare})
+        self.assertEqual(len(sampler.sample()), 1200)
+
+    def test_open_quota_needs_a_total(self):
+        with self.assertRaises(ValueError):
+            event_sampler.StratifiedSampler([Stratum('all', None)])
+
+    def test_keys_are_uniform(self):
+        keys = event_sampler.sample_keys(np.arange(100_000))
+        self.assertTrue(np.all((keys >= 0) & (keys < 1)))
+        self.assertAlmostEqual(keys.mean(), 0.5, delta=0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
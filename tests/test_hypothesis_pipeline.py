@@ -0,0 +1,90 @@
+"""HypothesisPipeline: streaming within the top_n budget, and the exact top-N mode."""
+import asyncio
+import contextlib
+import os
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+try:
+    import dotenv  # noqa: F401  (mainClassify loads its settings with python-dotenv)
+except ImportError:
+    mainClassify = None
+else:
+    os.environ.setdefault('CLAUDE_API_KEY', 'test-key')
+    import llm_cache
+    import llm_gateway
+    import mainClassify
+
+
+def _classified(n, seed=1):
+    rng = random.Random(seed)
+    return [{'event_id': i,
+             'api_analysis': {'classification': rng.choice(['WIMP-like (NR)', 'Novel Anomaly', 'Background (ER)']),
+                              'confidence': rng.random()},
+             's2_over_s1_ratio': rng.uniform(1, 8), 'recoil_energy_keV': rng.uniform(0, 120),
+             'event_quality': rng.random(), 'pile_up_flag': int(rng.random() < 0.1)} for i in range(n)]
+
+
+@contextlib.asynccontextmanager
+async def _session():
+    yield None
+
+
+@unittest.skipIf(mainClassify is None, 'python-dotenv is not installed')
+class TestHypothesisPipeline(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.started = []
+        self.batches_submitted = 0
+
+        async def generate(client, anomaly, timeout):
+            self.started.append((anomaly['Event_ID'], self.batches_submitted))
+            await asyncio.sleep(0.005)
+            return {'error': 'not generated in tests'}
+
+        gateway = SimpleNamespace(async_session=_session, usage_summary=lambda: '')
+        cache = llm_cache.LLMCache(os.path.join(self._tmp.name, 'cache.sqlite'))
+        for patcher in (mock.patch.object(llm_gateway, 'gateway', return_value=gateway),
+                        mock.patch.object(llm_cache, '_shared_cache', cache),
+                        mock.patch.object(mainClassify, 'generate_physics_hypotheses_async', generate),
+                        mock.patch.object(mainClassify, 'print_hypotheses'),
+                        mock.patch('builtins.print')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.events = _classified(300)
+        ranked = mainClassify.identify_anomalies(self.events, mainClassify.ANOMALY_THRESHOLD)
+        self.top = {anomaly['Event_ID'] for anomaly in ranked[:10]}
+
+    def run_stream(self, **options):
+        async def stream():
+            async with mainClassify.HypothesisPipeline(top_n=10, output_dir=self._tmp.name, **options) as pipeline:
+                for start in range(0, len(self.events), 6):
+                    pipeline.submit(self.events[start:start + 6])
+                    self.batches_submitted += 1
+                    await asyncio.sleep(0.002)
+        asyncio.run(stream())
+        return {event_id for event_id, _ in self.started}
+
+    def test_hypotheses_start_while_classification_runs(self):
+        analyzed = self.run_stream()
+        self.assertEqual(len(analyzed), 10)
+        self.assertLessEqual(self.started[0][1], 1)
+
+    def test_exact_mode_analyzes_the_run_top_n(self):
+        analyzed = self.run_stream(exact=True, expected=len(self.events))
+        self.assertEqual(analyzed, self.top)
+
+    def test_one_batch_gets_its_top_n(self):
+        async def batch():
+            async with mainClassify.HypothesisPipeline(top_n=10, output_dir=self._tmp.name) as pipeline:
+                pipeline.submit(self.events)
+        asyncio.run(batch())
+        self.assertEqual({event_id for event_id, _ in self.started}, self.top)
+
+
+if __name__ == '__main__':
+    unittest.main()
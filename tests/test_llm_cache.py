@@ -0,0 +1,67 @@
+"""Cache keys and the SQLite response cache."""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import llm_cache
+
+FEATURES = {'recoil_energy_keV': 12.5, 's1_area_PE': 25.3, 's2_area_PE': 85.7, 'pile_up_flag': 0}
+
+
+class TestCacheKey(unittest.TestCase):
+    def key(self, features=FEATURES, kind='classification', model='model-a', version=1):
+        return llm_cache.cache_key(kind, model, version, features)
+
+    def test_same_event_from_any_source_gives_the_same_key(self):
+        from_parquet = {'s2_area_PE': np.float32(85.7), 'pile_up_flag': np.uint8(0),
+                        's1_area_PE': np.float64(25.3), 'recoil_energy_keV': 12.500000001}
+        self.assertEqual(self.key(from_parquet), self.key())
+
+    def test_missing_values_normalize_to_none(self):
+        self.assertEqual(self.key({**FEATURES, 's1_area_PE': float('nan')}),
+                         self.key({**FEATURES, 's1_area_PE': None}))
+
+    def test_everything_that_changes_the_response_changes_the_key(self):
+        base = self.key()
+        self.assertNotEqual(self.key(kind='hypotheses'), base)
+        self.assertNotEqual(self.key(model='model-b'), base)
+        self.assertNotEqual(self.key(version=2), base)
+        self.assertNotEqual(self.key({**FEATURES, 's2_area_PE': 85.8}), base)
+
+    def test_key_ignores_feature_order(self):
+        self.assertEqual(self.key(dict(reversed(list(FEATURES.items())))), self.key())
+
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_round_trip_and_bypass(self):
+        cache = llm_cache.LLMCache(self.path)
+        cache.put('k', {'classification': 'WIMP-like (NR)'})
+        self.assertEqual(cache.get('k'), {'classification': 'WIMP-like (NR)'})
+        self.assertIsNone(cache.get('other'))
+        cache.bypass = True
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = llm_cache.LLMCache(self.path, max_entries=2)
+        cache.put('a', {'n': 1})
+        cache.put('b', {'n': 2})
+        cache.get('a')
+        cache.put('c', {'n': 3})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Packed classification requests: result matching and split-and-retry."""
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+try:
+    import dotenv  # noqa: F401  (mainClassify loads its settings with python-dotenv)
+except ImportError:
+    mainClassify = None
+else:
+    os.environ.setdefault('CLAUDE_API_KEY', 'test-key')
+    import llm_cache
+    import llm_gateway
+    import mainClassify
+
+
+def _analysis(event_id):
+    """A schema-conforming single-event analysis that names its event."""
+    schema = mainClassify.create_api_prompt_and_schema({'event_id': event_id})[2]
+    analysis = {field: f"event {event_id}" for field in schema['required']}
+    analysis.update(classification='WIMP-like (NR)', confidence=0.8)
+    return analysis
+
+
+class _Gateway:
+    """Stands in for llm_gateway.LLMGateway; packed replies only cover the events in `answered`."""
+
+    model = 'test-model'
+
+    def __init__(self, answered, echo=str):
+        self.answered = set(answered)
+        self.echo = echo
+        self.packs = []
+        self.singles = []
+
+    async def create_message_async(self, client, **request):
+        events = [evt['event_id'] for evt in json.loads(
+            request['messages'][0]['content'].split('**EVENT DATA:**\n')[1].split('\n\nFollow')[0])]
+        self.packs.append(events)
+        results = [{'event_id': self.echo(event_id), **_analysis(event_id)}
+                   for event_id in events if int(event_id) in self.answered]
+        call = SimpleNamespace(type='tool_use', name=mainClassify.PACKED_CLASSIFICATION_TOOL,
+                               input={'results': results})
+        return SimpleNamespace(content=[call])
+
+    async def create_structured_async(self, client, tool_def, **request):
+        event_id = int(request['messages'][0]['content'].split('"event_id": ')[1].split(',')[0])
+        self.singles.append(event_id)
+        return _analysis(event_id)
+
+
+@unittest.skipIf(mainClassify is None, 'python-dotenv is not installed')
+class TestPackedClassification(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        cache = llm_cache.LLMCache(os.path.join(self._tmp.name, 'cache.sqlite'), bypass=True)
+        patcher = mock.patch.object(llm_cache, '_shared_cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.events = [{'event_id': i, 's1_area_PE': 10.0 + i, 's2_area_PE': 30.0 + i} for i in range(8)]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def classify(self, gateway, events=None):
+        with mock.patch.object(llm_gateway, 'gateway', return_value=gateway):
+            return asyncio.run(mainClassify.classify_pack_async(None, events or self.events, asyncio.Semaphore(4)))
+
+    def assert_matched(self, results):
+        for evt, analysis in zip(self.events, results):
+            self.assertNotIn('error', analysis)
+            self.assertEqual(analysis['s2_s1_analysis'], f"event {evt['event_id']}")
+
+    def test_complete_reply_needs_one_request(self):
+        gateway = _Gateway(answered=range(8))
+        self.assert_matched(self.classify(gateway))
+        self.assertEqual(gateway.packs, [[str(i) for i in range(8)]])
+        self.assertEqual(gateway.singles, [])
+
+    def test_missing_events_are_split_and_retried(self):
+        # Every pack reply covers only events 0 and 5
+        gateway = _Gateway(answered={0, 5})
+        results = self.classify(gateway)
+        self.assert_matched(results)
+        self.assertEqual(gateway.packs[0], [str(i) for i in range(8)])
+        # The 6 missing events go out as halves of 3, then down to single events
+        self.assertIn(['1', '2', '3'], gateway.packs)
+        self.assertIn(['4', '6', '7'], gateway.packs)
+        self.assertEqual(sorted(gateway.singles), [1, 2, 3, 4, 6, 7])
+
+    def test_integer_event_ids_in_the_reply_are_matched(self):
+        gateway = _Gateway(answered=range(8), echo=int)
+        self.assert_matched(self.classify(gateway))
+        self.assertEqual(len(gateway.packs), 1)
+
+    def test_unexpected_failure_gives_every_event_an_error(self):
+        gateway = _Gateway(answered=range(8))
+        gateway.create_message_async = mock.AsyncMock(side_effect=RuntimeError('boom'))
+        results = self.classify(gateway)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all('boom' in analysis['error'] for analysis in results))
+
+    def test_pack_reply_fits_the_output_limit(self):
+        request = mainClassify.build_packed_classification_request(self.events[:mainClassify.MAX_PACK_SIZE])
+        self.assertLessEqual(request['max_tokens'], mainClassify.MAX_OUTPUT_TOKENS)
+        self.assertGreaterEqual(request['max_tokens'],
+                                mainClassify.PACKED_TOKENS_PER_EVENT * mainClassify.MAX_PACK_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
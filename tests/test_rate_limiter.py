@@ -0,0 +1,134 @@
+"""RateLimiter feedback from 429/529 responses and rate limit headers."""
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import anthropic
+
+import rate_limiter
+
+LIMITS = {'requests': 1000, 'input_tokens': 1_000_000, 'output_tokens': 1_000_000}
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class _Raw:
+    def __init__(self, headers=None, output_tokens=10):
+        self.status_code = 200
+        self.headers = headers or {}
+        self._message = SimpleNamespace(usage=SimpleNamespace(output_tokens=output_tokens))
+
+    def parse(self):
+        return self._message
+
+
+class _Client:
+    """Stands in for anthropic.Anthropic: replays `outcomes` (exceptions are raised)."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.messages = SimpleNamespace(with_raw_response=SimpleNamespace(create=self._create))
+
+    def _create(self, **request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+REQUEST = {'model': 'test', 'max_tokens': 100, 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+
+class TestThrottling(unittest.TestCase):
+    def test_429_waits_for_retry_after_and_retries(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        client = _Client([_StatusError(429, {'retry-after': '0.05'}), _Raw()])
+        started = time.monotonic()
+        message = limiter.create_message(client, **REQUEST)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(message.usage.output_tokens, 10)
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(limiter.stats['throttled'], 1)
+
+    def test_throttling_halves_the_rate_and_success_restores_it(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        limiter.record(429, {'retry-after': '0'})
+        limiter.record(529, {'retry-after': '0'})
+        self.assertAlmostEqual(limiter._rate_factor, 0.25)
+        for _ in range(10):
+            limiter.record(200)
+        self.assertEqual(limiter._rate_factor, 1.0)
+
+    def test_gives_up_after_max_retries(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        client = _Client([_StatusError(429, {'retry-after': '0'})] * (rate_limiter.MAX_RETRIES + 1))
+        with self.assertRaises(rate_limiter.RateLimitExceeded):
+            limiter.create_message(client, **REQUEST)
+        self.assertEqual(client.calls, rate_limiter.MAX_RETRIES + 1)
+
+    def test_client_errors_are_raised_without_retry(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        client = _Client([_StatusError(400)])
+        with self.assertRaises(_StatusError):
+            limiter.create_message(client, **REQUEST)
+        self.assertEqual(client.calls, 1)
+
+    def test_throttled_requests_return_their_output_reservation(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        bucket = limiter._buckets['output_tokens']
+        client = _Client([_StatusError(429, {'retry-after': '0'}), _Raw(output_tokens=0)])
+        limiter.create_message(client, **REQUEST)
+        self.assertAlmostEqual(bucket.level, bucket.capacity, delta=1)
+
+
+@mock.patch.object(rate_limiter, 'BACKOFF_BASE_S', 0.001)
+class TestTransientFailures(unittest.TestCase):
+    def test_server_errors_and_lost_connections_are_retried(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        # The request is only kept for reporting
+        client = _Client([_StatusError(500), anthropic.APIConnectionError(request=None), _StatusError(408), _Raw()])
+        limiter.create_message(client, **REQUEST)
+        self.assertEqual(client.calls, 4)
+        self.assertEqual(limiter.stats['retried'], 3)
+        # Not throttling: the other callers keep their full rate
+        self.assertEqual(limiter.stats['throttled'], 0)
+        self.assertEqual(limiter._rate_factor, 1.0)
+
+    def test_persistent_server_error_is_raised(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        client = _Client([_StatusError(503)] * (rate_limiter.MAX_RETRIES + 1))
+        with self.assertRaises(_StatusError):
+            limiter.create_message(client, **REQUEST)
+        self.assertEqual(client.calls, rate_limiter.MAX_RETRIES + 1)
+
+    def test_failed_attempts_return_their_output_reservation(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        bucket = limiter._buckets['output_tokens']
+        limiter.create_message(_Client([_StatusError(502), _Raw(output_tokens=0)]), **REQUEST)
+        self.assertAlmostEqual(bucket.level, bucket.capacity, delta=1)
+
+
+class TestHeaders(unittest.TestCase):
+    def test_headers_resize_and_clamp_the_buckets(self):
+        limiter = rate_limiter.RateLimiter(LIMITS)
+        limiter.record(200, {'anthropic-ratelimit-requests-limit': '50',
+                             'anthropic-ratelimit-requests-remaining': '3'})
+        self.assertEqual(limiter._buckets['requests'].capacity, 50)
+        self.assertEqual(limiter._buckets['requests'].level, 3)
+
+    def test_environment_sets_the_initial_limits(self):
+        with mock.patch.dict('os.environ', {'LLM_RPM': '7'}):
+            limiter = rate_limiter.RateLimiter()
+        self.assertEqual(limiter._buckets['requests'].capacity, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
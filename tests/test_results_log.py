@@ -0,0 +1,63 @@
+"""ResultsLog: what a resumed run skips, crash repair and compaction."""
+import json
+import os
+import tempfile
+import unittest
+
+import results_log
+
+OK = {'classification': 'WIMP-like (NR)', 'confidence': 0.9}
+FAILED = {'error': 'Claude API Error: overloaded'}
+
+
+class TestResultsLog(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'results.log.jsonl')
+        self.log = results_log.ResultsLog(self.path)
+        self.log.reset()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_resume_skips_only_successful_events(self):
+        self.log.append([{'event_id': 1, 'api_analysis': OK}, {'event_id': 2, 'api_analysis': FAILED}])
+        self.assertEqual(set(self.log.completed()), {'1'})
+
+    def test_last_record_of_an_event_wins(self):
+        self.log.append([{'event_id': 2, 'api_analysis': FAILED}])
+        # A resumed run retried event 2
+        self.log.append([{'event_id': 2, 'api_analysis': OK}])
+        self.assertEqual(self.log.records()['2']['api_analysis'], OK)
+        self.assertEqual(set(self.log.completed()), {'2'})
+
+    def test_partial_last_line_is_dropped(self):
+        self.log.append([{'event_id': 1, 'api_analysis': OK}])
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"event_id": 2, "api_analy')  # killed mid-write
+        self.assertEqual(set(self.log.records()), {'1'})
+        # The repaired log takes new records on a line of their own
+        self.log.append([{'event_id': 2, 'api_analysis': OK}])
+        self.assertEqual(set(self.log.completed()), {'1', '2'})
+
+    def test_missing_log_has_no_records(self):
+        os.remove(self.path)
+        self.assertEqual(self.log.completed(), {})
+
+    def test_compact_writes_the_requested_order(self):
+        self.log.append([{'event_id': i, 'api_analysis': OK} for i in (3, 1, 2)])
+        json_path = os.path.join(self._tmp.name, 'results.json')
+        results = self.log.compact(json_path, ['1', '2', '3', '4'])
+        with open(json_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), results)
+        self.assertEqual([r['event_id'] for r in results], [1, 2, 3])
+        self.assertFalse(os.path.exists(f"{json_path}.tmp"))
+
+    def test_is_success(self):
+        self.assertTrue(results_log.is_success({'api_analysis': OK}))
+        self.assertFalse(results_log.is_success({'api_analysis': FAILED}))
+        self.assertFalse(results_log.is_success({'event_id': 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+"""Rule tier: band decisions and the S2/S1 ratio reported with them."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import rule_classifier
+
+
+class TestClassifyEvents(unittest.TestCase):
+    def test_ratio_is_derived_from_the_pulse_areas_when_not_given(self):
+        events = pd.DataFrame({'s1_area_PE': [10.0, 0.0, None], 's2_area_PE': [30.0, 50.0, 40.0]})
+        decisions = rule_classifier.classify_events(events)
+        np.testing.assert_allclose(decisions['s2_over_s1_ratio'], [3.0, np.nan, np.nan])
+        self.assertEqual(decisions['rule_classification'][0], 'WIMP-like (NR)')
+        self.assertEqual(decisions['escalation_reason'].tolist()[1:], ['missing_signal'] * 2)
+
+    def test_rule_analysis_quotes_the_ratio_used(self):
+        events = pd.DataFrame({'s1_area_PE': [10.0], 's2_area_PE': [200.0], 's2_over_s1_ratio': [20.0]})
+        decision = rule_classifier.classify_events(events).to_dict('records')[0]
+        self.assertEqual(decision['decision_tier'], rule_classifier.TIER_RULES)
+        analysis = rule_classifier.rule_analysis(decision['rule_classification'], decision['rule_confidence'],
+                                                 decision['s2_over_s1_ratio'])
+        self.assertIn('S2/S1 = 20', analysis['s2_s1_analysis'])
+
+
+if __name__ == '__main__':
+    unittest.main()
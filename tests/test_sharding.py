@@ -0,0 +1,34 @@
+"""Sharded generation must not depend on how the shards are scheduled."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import main
+
+
+class TestShardDeterminism(unittest.TestCase):
+    def test_worker_count_does_not_change_the_events(self):
+        serial = main.generate_dataset(n_events=3000, seed=7, num_shards=3, workers=1).events
+        parallel = main.generate_dataset(n_events=3000, seed=7, num_shards=3, workers=3).events
+        pd.testing.assert_frame_equal(serial, parallel)
+
+    def test_same_seed_repeats_and_other_seed_differs(self):
+        first = main.generate_dataset(n_events=1000, seed=7, num_shards=2).events
+        again = main.generate_dataset(n_events=1000, seed=7, num_shards=2).events
+        other = main.generate_dataset(n_events=1000, seed=8, num_shards=2).events
+        pd.testing.assert_frame_equal(first, again)
+        self.assertFalse(np.allclose(first['s1_area_PE'].fillna(0), other['s1_area_PE'].fillna(0)))
+
+    def test_shards_draw_independent_streams(self):
+        draws = [np.random.Generator(np.random.PCG64(main.shard_seed(7, i))).random(4) for i in range(3)]
+        self.assertFalse(np.allclose(draws[0], draws[1]))
+        self.assertFalse(np.allclose(draws[1], draws[2]))
+
+    def test_event_ids_are_numbered_across_shards(self):
+        events = main.generate_dataset(n_events=1001, seed=7, num_shards=4).events
+        self.assertEqual(events['event_id'].tolist(), list(range(1001)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -36,6 +36,7 @@ from mainClassify import (
     select_and_sample_events,
     create_api_prompt_and_schema
 )
+import dataset_io
 
 # Import anomaly detection system
 anomaly_sys_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'anomaly_detection_system')
@@ -65,6 +66,14 @@ CORS(app)  # Enable CORS for React frontend
 UPLOAD_FOLDER = 'temp_uploads'
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_EXTENSIONS = {'csv', 'json'}
+DATASET_DIR = 'dataset'
+
+# Raw-dataset columns used by /api/dataset/statistics
+STATISTICS_COLUMNS = [
+    'event_id', 'label', 'recoil_energy_keV', 's1_area_PE', 's2_area_PE',
+    's1_light_yield', 's2_charge_yield', 's2_over_s1_ratio',
+    'position_x_mm', 'position_y_mm', 'position_z_mm', 'drift_time_us', 'timestamp'
+]
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -476,27 +485,33 @@ def process_batch_classification():
 def load_dataset():
     """
     Load the synthetic dataset for webapp display
+    Optional query parameters start/end (e.g. ?start=2024-03-01&end=2024-04-01)
+    restrict it to a run period.
     """
     try:
         # Load from the dataset folder
-        csv_path = os.path.join('dataset', 'dark_matter_synthetic_dataset.csv')
+        dataset_path = dataset_io.find_dataset(DATASET_DIR)
         
-        if not os.path.exists(csv_path):
+        if dataset_path is None:
             return jsonify({'error': 'Dataset not found. Please generate dataset first.'}), 404
         
-        df = pd.read_csv(csv_path)
+        # Only the two summary columns are read in full; the preview reads 10 rows
+        period = dataset_io.period_filters(request.args.get('start'), request.args.get('end'))
+        df = dataset_io.load_dataset(dataset_path, columns=['label', 'recoil_energy_keV'], filters=period)
+        preview = dataset_io.with_text_timestamps(
+            dataset_io.load_dataset(dataset_path, filters=period, limit=10))
         
         # Convert to webapp format
         dataset_info = {
             'totalEvents': len(df),
-            'columns': list(df.columns),
+            'columns': dataset_io.dataset_columns(dataset_path),
             'classificationLabels': df['label'].unique().tolist() if 'label' in df.columns else [],
-            'eventTypes': df['label'].value_counts().to_dict() if 'label' in df.columns else {},
+            'eventTypes': {k: v for k, v in df['label'].value_counts().to_dict().items() if v > 0} if 'label' in df.columns else {},
             'energyRange': {
                 'min': float(df['recoil_energy_keV'].min()) if 'recoil_energy_keV' in df.columns else 0,
                 'max': float(df['recoil_energy_keV'].max()) if 'recoil_energy_keV' in df.columns else 0
             },
-            'preview': clean_nan_values(df.head(10).to_dict('records'))
+            'preview': clean_nan_values(preview.astype(object).to_dict('records'))
         }
         
         # Clean NaN values before returning
@@ -513,6 +528,32 @@ def load_dataset():
             'error': f'Failed to load dataset: {str(e)}'
         }), 500
 
+@app.route('/api/dataset/events/<int:event_id>', methods=['GET'])
+def get_dataset_event(event_id):
+    """
+    Look up a single event by event_id (uses the Parquet event index when present)
+    """
+    try:
+        dataset_path = dataset_io.find_dataset(DATASET_DIR)
+        
+        if dataset_path is None:
+            return jsonify({'error': 'Dataset not found. Please generate dataset first.'}), 404
+        
+        events = dataset_io.with_text_timestamps(dataset_io.get_events(dataset_path, [event_id]))
+        if events.empty:
+            return jsonify({'success': False, 'error': f'Event {event_id} not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'event': clean_nan_values(events.astype(object).to_dict('records')[0])
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to load event: {str(e)}'
+        }), 500
+
 @app.route('/api/dataset/statistics', methods=['GET'])
 def get_dataset_statistics():
     """
@@ -533,25 +574,19 @@ def get_dataset_statistics():
             # If we have very few analyzed events, supplement with raw data for better visualization
             if len(classified_data) < 50:
                 print(f"⚠️  Only {len(classified_data)} analyzed events, supplementing with raw data for better visualization")
-                csv_path = os.path.join('dataset', 'dark_matter_synthetic_dataset.csv')
-                if os.path.exists(csv_path):
-                    df_raw = pd.read_csv(csv_path)
+                dataset_path = dataset_io.find_dataset(DATASET_DIR)
+                if dataset_path is not None:
                     # Use analyzed data where available, raw data for the rest
-                    analyzed_ids = [item.get('event_id') for item in classified_data]
+                    analyzed_ids = [item.get('event_id') for item in classified_data
+                                    if item.get('event_id') is not None]
                     
-                    # Check which column name is used in raw data for event IDs
-                    id_column = None
-                    for col in ['event_id', 'Event_ID', 'id', 'ID']:
-                        if col in df_raw.columns:
-                            id_column = col
-                            break
-                    
-                    # Filter out already analyzed events if we found the ID column
-                    if id_column:
-                        df_supplement = df_raw[~df_raw[id_column].isin(analyzed_ids)].head(500)
-                    else:
-                        # If no ID column found, just take first 500 events
-                        df_supplement = df_raw.head(500)
+                    # Skip already analyzed events and stop reading after 500 rows
+                    df_supplement = dataset_io.with_text_timestamps(dataset_io.load_dataset(
+                        dataset_path,
+                        columns=STATISTICS_COLUMNS,
+                        filters=[('event_id', 'not in', analyzed_ids)],
+                        limit=500,
+                    ))
                     
                     # Convert analyzed data to DataFrame
                     df_analyzed_data = []
@@ -636,12 +671,12 @@ def get_dataset_statistics():
         else:
             # Fallback to raw dataset if analyzed data not available
             print("⚠️  No analyzed data found, falling back to raw dataset")
-            csv_path = os.path.join('dataset', 'dark_matter_synthetic_dataset.csv')
+            dataset_path = dataset_io.find_dataset(DATASET_DIR)
             
-            if not os.path.exists(csv_path):
+            if dataset_path is None:
                 return jsonify({'error': 'No dataset found. Please generate or analyze dataset first.'}), 404
             
-            df = pd.read_csv(csv_path)
+            df = dataset_io.with_text_timestamps(dataset_io.load_dataset(dataset_path, columns=STATISTICS_COLUMNS))
             
             # Handle column name variations
             if 's1_area_PE' not in df.columns and 's1_light_yield' in df.columns:
@@ -983,20 +1018,17 @@ def analyze_dataset_for_anomalies():
             }), 503
         
         # Load the dataset
-        dataset_path = os.path.join(os.path.dirname(__file__), 'dataset', 'dark_matter_synthetic_dataset.csv')
+        dataset_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATASET_DIR)
+        dataset_path = dataset_io.find_dataset(dataset_dir)
         
-        print(f"Looking for dataset at: {dataset_path}")
+        print(f"Looking for dataset in: {dataset_dir}")
         
-        if not os.path.exists(dataset_path):
+        if dataset_path is None:
             return jsonify({
                 'success': False,
-                'error': f'Dataset file not found at: {dataset_path}'
+                'error': f'Dataset file not found in: {dataset_dir}'
             }), 404
         
-        print("Loading dataset...")
-        df = pd.read_csv(dataset_path)
-        print(f"Loaded {len(df)} events from dataset")
-        
         # Get parameters
         data = request.json or {}
         max_events = data.get('max_events', 100)  # Limit for performance
@@ -1005,8 +1037,9 @@ def analyze_dataset_for_anomalies():
         
         print(f"Analysis parameters: max_events={max_events}, use_claude={use_claude}, threshold={threshold}")
         
-        # Analyze subset of dataset
-        df_subset = df.head(max_events)
+        # Analyze subset of dataset; only the first max_events rows are read
+        print("Loading dataset...")
+        df_subset = dataset_io.with_text_timestamps(dataset_io.load_dataset(dataset_path, limit=max_events))
         print(f"Analyzing {len(df_subset)} events...")
         
         # Run anomaly detection
@@ -1115,6 +1148,7 @@ if __name__ == '__main__':
     print("  POST /api/classify/batch")
     print("  POST /api/classify/batch/process")
     print("  GET  /api/dataset/load")
+    print("  GET  /api/dataset/events/<event_id>")
     print("  GET  /api/dataset/statistics")
     print("  POST /api/anomaly/detect")
     print("  POST /api/anomaly/classify")